@@ -6,8 +6,10 @@
 """
 
 from .argo_types.primitives import Backoff as Backoff
+from .argo_types.primitives import Resources as Resources
 from .argo_types.primitives import RetryStrategy as RetryStrategy
 from .nodes.foreach import Foreach as Foreach
+from .nodes.lazy import LazyTask as LazyTask
 from .nodes.step import StepNode
 from .nodes.when import When as When
 from .trigger_condition import Condition as Condition
@@ -17,8 +19,10 @@ __all__ = [
     "Workflow",
     "Foreach",
     "When",
+    "LazyTask",
     "StepNode",
     "RetryStrategy",
     "Backoff",
+    "Resources",
     "Condition",
 ]
@@ -15,13 +15,14 @@ class Metadata(BaseModel):
     generateName: str | None = None
     name: str | None = None
     namespace: str = "argo-workflows"
+    labels: dict[str, str] | None = None
 
 
 class Parameter(BaseModel):
     name: str
     value: Any = None
     default: Any = None
-    valueFrom: dict[str, str] | None = None
+    valueFrom: dict[str, Any] | None = None
 
 
 class TTLStrategy(BaseModel):
@@ -50,8 +51,28 @@ class RetryStrategy(BaseModel):
     retryPolicy: RetryPolicy = "Always"
 
 
+class Resources(BaseModel):
+    """
+    Class for providing resource requests and limits, e.g.
+    `Resources(requests={"cpu": "500m", "memory": "1Gi"}, limits={"memory": "2Gi", "ephemeral-storage": "10Gi"})`.
+    """
+
+    requests: dict[str, str] | None = None
+    limits: dict[str, str] | None = None
+
+    def merge(self, other: Resources | None) -> Resources:
+        """Return a copy where requests and limits are overwritten per key by `other`."""
+        if other is None:
+            return self.model_copy(deep=True)
+        return Resources(
+            requests={**(self.requests or {}), **(other.requests or {})} or None,
+            limits={**(self.limits or {}), **(other.limits or {})} or None,
+        )
+
+
 class TemplateRef(BaseModel):
     name: str
+    template: str | None = None
 
 
 class SecretRef(BaseModel):
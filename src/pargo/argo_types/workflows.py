@@ -9,6 +9,7 @@ from .primitives import (
     Parameter,
     PodGC,
     PodMetadata,
+    Resources,
     RetryStrategy,
     SecretRef,
     TemplateRef,
@@ -25,6 +26,8 @@ class Task(BaseModel):
     when: str | None = None
     withItems: list[Any] | str | None = None
     withParam: Any = None
+    withSequence: dict[str, str] | None = None
+    templateRef: TemplateRef | None = None
     arguments: ParameterMap = None
 
 
@@ -50,6 +53,33 @@ class Script(BaseModel):
     env: list[Parameter] | None = None
     terminationMessagePolicy: str = "FallbackToLogsOnError"
     imagePullPolicy: str | None = None
+    resources: Resources | None = None
+    volumeMounts: list[VolumeMount] | None = None
+
+
+class EmptyDir(BaseModel):
+    medium: str | None = None
+    sizeLimit: str | None = None
+
+
+class Volume(BaseModel):
+    name: str
+    emptyDir: EmptyDir | None = None
+
+
+class VolumeMount(BaseModel):
+    name: str
+    mountPath: str
+
+
+class Cache(BaseModel):
+    configMap: dict[str, str]
+
+
+class Memoize(BaseModel):
+    key: str
+    maxAge: str
+    cache: Cache
 
 
 class ScriptTemplate(BaseModel):
@@ -60,6 +90,9 @@ class ScriptTemplate(BaseModel):
     serviceAccountName: str = "argo-service-account"
     parallelism: int | None = None
     retryStrategy: RetryStrategy | None = None
+    activeDeadlineSeconds: int | None = None
+    memoize: Memoize | None = None
+    volumes: list[Volume] | None = None
 
 
 class Resource(BaseModel):
@@ -88,6 +121,7 @@ class WorkflowSpec(BaseModel):
     podGC: PodGC | None = None
     parallelism: int | None = None
     podMetadata: None | PodMetadata = None
+    workflowMetadata: None | PodMetadata = None
 
 
 class WorkflowResource(BaseModel):
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from copy import deepcopy
+from hashlib import sha256
+from json import dumps, loads
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel, Field, PrivateAttr
+
+from .nodes.chain import StepChain
+from .nodes.foreach import Foreach, Sequence
+from .nodes.memoize import task_hash
+from .nodes.node import Node
+from .nodes.run import pargo_path
+from .nodes.step import StepNode
+from .nodes.when import When
+
+
+def node_hash(node: Node) -> str | None:
+    """
+    Hash of the code and configuration of a node that determine its result for given
+    inputs. None for nodes whose result cannot be cached, like WorkflowNodes.
+    """
+    if isinstance(node, (StepNode, StepChain)):
+        parts = [node.code_hash]
+    elif isinstance(node, When):
+        parts = [task_hash(node.task, node.task_name, node.task_module)]
+        parts += [b.code_hash if b else "" for b in (node._then, node._otherwise)]
+    elif isinstance(node, Foreach):
+        if callable(node.task):
+            parts = [task_hash(node.task, node.task_name, node.task_module)]
+        elif isinstance(node.task, Sequence):
+            parts = [node.task.model_dump_json()]
+        else:
+            parts = [dumps(node.task)]
+        parts += [node.item_name, node._then_node().code_hash]
+    else:
+        return None
+    return sha256("\n".join([type(node).__name__, *parts]).encode()).hexdigest()[:16]
+
+
+class RunCache(BaseModel):
+    """
+    Results of local node runs keyed by the node code and its input data, kept in
+    memory and in `path`. Reusing a cache across runs re-executes only nodes whose
+    code or inputs changed.
+    """
+
+    path: Path = Field(description="Directory of the cached results")
+    hits: list[str] = Field(default=[], description="Nodes served from the cache")
+    misses: list[str] = Field(default=[], description="Nodes executed")
+    _memory: dict[str, Any] = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def new(cls, name: str) -> RunCache:
+        """Cache of the workflow `name` in `<PARGO_DIR>/<name>/cache`."""
+        return cls(path=pargo_path() / name / "cache")
+
+    def key(self, node: Node, data: dict[str, Any]) -> str | None:
+        """Key of a node run with `data`. None when the node cannot be cached."""
+        code = node_hash(node)
+        if code is None:
+            return None
+        inputs = sha256(dumps(data, sort_keys=True, default=str).encode())
+        return f"{code}-{inputs.hexdigest()[:16]}"
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        if key not in self._memory:
+            file = self.path / f"{key}.json"
+            if not file.exists():
+                return None
+            self._memory[key] = loads(file.read_text())
+        return deepcopy(self._memory[key])
+
+    def put(self, key: str, data: dict[str, Any]):
+        self._memory[key] = deepcopy(data)
+        self.path.mkdir(exist_ok=True, parents=True)
+        (self.path / f"{key}.json").write_text(dumps(data))
@@ -1,16 +1,42 @@
+import sys
 from argparse import ArgumentParser
-from json import JSONDecodeError, loads
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from importlib import reload
+from json import JSONDecodeError, dumps, loads
+from linecache import checkcache
+from multiprocessing import get_context
 from pathlib import Path
+from time import monotonic, sleep
+from typing import Any
 
-from pargo import Workflow
+from loguru import logger
 
+from pargo import Foreach, When, Workflow
+from pargo.cache import RunCache
+from pargo.emulator import Emulator
+from pargo.estimate import estimate
+from pargo.nodes.chain import StepChain
+from pargo.nodes.lazy import lazy_imports
+from pargo.nodes.step import StepNode
+from pargo.nodes.workflow import WorkflowNode
+from pargo.trigger_graph import TriggerGraph
 
-def load_workflows(path: Path) -> dict[str, Workflow]:
-    """Executes a Python file and returns Workflows."""
+
+def load_workflows(
+    path: Path, lazy: bool = False, eager: list[str] | None = None
+) -> dict[str, Workflow]:
+    """
+    Executes a Python file and returns Workflows. With `lazy`, modules imported by
+    the file are stubbed and their tasks are LazyTasks, except for modules already
+    imported, the standard library and the packages in `eager`.
+    """
 
     module_globals: dict[str, object] = {"__file__": str(path.resolve())}
     code = path.read_text()
-    exec(compile(code, str(path), "exec"), module_globals)
+    with lazy_imports(eager) if lazy else nullcontext():
+        exec(compile(code, str(path), "exec"), module_globals)
 
     workflows = {w.name: w for w in module_globals.values() if isinstance(w, Workflow)}
 
@@ -19,6 +45,147 @@ def load_workflows(path: Path) -> dict[str, Workflow]:
     return workflows
 
 
+def select_workflow(
+    workflows: dict[str, Workflow], name: str | None, path: Path
+) -> Workflow:
+    """Workflow `name`, or the last workflow defined in the file."""
+    if name:
+        if name not in workflows:
+            raise RuntimeError(f"No workflow named '{name}' in {path}")
+        return workflows[name]
+    return next(reversed(workflows.values()))
+
+
+def task_modules(workflow: Workflow) -> set[str]:
+    """Names of the modules defining the tasks of a workflow and its child workflows."""
+    modules, tasks = set(), []
+    for node in workflow.plan():
+        if isinstance(node, StepNode):
+            tasks.append(node.task)
+        elif isinstance(node, StepChain):
+            tasks.extend(step.task for step in node.task)
+        elif isinstance(node, When):
+            tasks.append(node.task)
+            tasks.extend(b.task for b in (node._then, node._otherwise) if b)
+        elif isinstance(node, Foreach):
+            if callable(node.task):
+                tasks.append(node.task)
+            tasks.extend(step.task for step in node._then)
+        elif isinstance(node, WorkflowNode):
+            modules = modules.union(*(task_modules(child) for child in node.task))
+    return modules | {task.__module__ for task in tasks}
+
+
+def _mtime(path: Path) -> float | None:
+    return path.stat().st_mtime if path.exists() else None
+
+
+def watch(
+    path: Path,
+    name: str | None = None,
+    parameters: dict[str, Any] | None = None,
+    interval: float = 1.0,
+    max_runs: int | None = None,
+):
+    """
+    Run a workflow whenever the file defining it or the modules of its tasks change.
+    Changed modules are reloaded in the running interpreter, and only nodes whose
+    code or inputs changed are executed again, the others reuse the cached results.
+    """
+    cache: RunCache | None = None
+    modules: dict[Path, str] = {}
+    mtimes: dict[Path, float | None] = {}
+    runs = 0
+    while max_runs is None or runs < max_runs:
+        changed = [file for file, mtime in mtimes.items() if _mtime(file) != mtime]
+        if mtimes and not changed:
+            sleep(interval)
+            continue
+        for file in changed:
+            if file in modules and modules[file] in sys.modules:
+                logger.info(f"Reloading {modules[file]}")
+                reload(sys.modules[modules[file]])
+        checkcache()
+
+        try:
+            wf = select_workflow(load_workflows(path), name, path)
+            modules = {
+                Path(sys.modules[m].__file__): m
+                for m in task_modules(wf)
+                if getattr(sys.modules.get(m), "__file__", None)
+            }
+            cache = cache or RunCache.new(wf.name)
+            cache.hits.clear()
+            cache.misses.clear()
+            wf.run(parameters, cache=cache)
+            logger.info(
+                f"Executed {cache.misses or 'nothing'}, reused {len(cache.hits)} cached node(s)"
+            )
+        except Exception:  # noqa: BLE001 - keep watching after errors in user code
+            logger.exception(f"Run of {path} failed")
+        mtimes = {file: _mtime(file) for file in [path, *modules]}
+        runs += 1
+        logger.info(f"Watching {len(mtimes)} file(s) for changes")
+
+
+def _backfill_run(
+    path: Path, name: str, parameters: dict[str, Any], run_id: str
+) -> tuple[str, float, str | None]:
+    start = monotonic()
+    try:
+        select_workflow(load_workflows(path), name, path).run(parameters, run_id=run_id)
+    except Exception as e:  # noqa: BLE001 - failed runs are reported in the summary
+        return "Failed", monotonic() - start, f"{type(e).__name__}: {e}"
+    return "Succeeded", monotonic() - start, None
+
+
+def backfill(
+    path: Path,
+    start: datetime,
+    end: datetime,
+    name: str | None = None,
+    workers: int | None = None,
+    rerun: bool = False,
+) -> list[dict[str, Any]]:
+    """
+    Run a workflow locally for each of its scheduled times from `start`, inclusive,
+    to `end`, exclusive, on up to `workers` processes. Each run has its own state
+    directory `<PARGO_DIR>/<name>/backfill-<time>`, and runs that already succeeded
+    are skipped unless `rerun`, so an interrupted backfill resumes where it stopped.
+    Returns the status, duration and error of each run.
+    """
+    wf = select_workflow(load_workflows(path), name, path)
+    report, futures = [], []
+    with ProcessPoolExecutor(workers, mp_context=get_context("spawn")) as pool:
+        for tick in wf.ticks(start, end):
+            run_id = f"backfill-{tick:%Y%m%dT%H%M%S}"
+            entry = {"time": tick.isoformat(), "run_id": run_id}
+            status = wf.run_path(run_id) / "status.json"
+            if (
+                not rerun
+                and status.exists()
+                and loads(status.read_text()) == "Succeeded"
+            ):
+                report.append({**entry, "status": "Skipped", "seconds": 0.0})
+                continue
+            parameters = wf.scheduled_parameters(tick)
+            future = pool.submit(_backfill_run, path, wf.name, parameters, run_id)
+            futures.append((entry, future))
+            report.append(entry)
+        for entry, future in futures:
+            entry["status"], seconds, error = future.result()
+            entry["seconds"] = round(seconds, 3)
+            if error:
+                entry["error"] = error
+                logger.error(f"Run {entry['run_id']} failed: {error}")
+    return report
+
+
+def _parse_time(text: str) -> datetime:
+    time = datetime.fromisoformat(text)
+    return time if time.tzinfo else time.replace(tzinfo=timezone.utc)
+
+
 def cli():
     parser = ArgumentParser(prog="pargo", description="Pargo CLI")
     subparsers = parser.add_subparsers(dest="command", required=True)
@@ -37,6 +204,21 @@ def cli():
         "--name",
         help="Name of the workflow to run. Defaults to last workflow defined in file.",
     )
+    run_parser.add_argument(
+        "--run-id",
+        help="Id of the run. State is written to PARGO_DIR/<name>/<run-id>. Defaults to a new unique id.",
+    )
+    run_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running: rerun on changes to the file or task modules, executing only nodes whose code or inputs changed.",
+    )
+    run_parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Seconds between checks for changes with --watch. Defaults to 1.",
+    )
 
     gen_parser = subparsers.add_parser("generate", help="Generate YAML manifest(s)")
     gen_parser.add_argument(
@@ -52,27 +234,260 @@ def cli():
         "--name",
         help="Name of the workflow to generate. Defaults to last workflow defined in file.",
     )
+    gen_parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Generate manifests for all workflows in the file.",
+    )
+    gen_parser.add_argument(
+        "--apply-sizing",
+        action="store_true",
+        help="Apply resources recommended from the metrics of local runs and --argo-run.",
+    )
+    gen_parser.add_argument(
+        "--headroom",
+        type=float,
+        default=1.25,
+        help="Headroom factor of recommended resources. Defaults to 1.25.",
+    )
+    gen_parser.add_argument(
+        "--argo-run",
+        type=Path,
+        action="append",
+        default=[],
+        help="JSON of an Argo workflow run, e.g. from `argo get <name> -o json`, whose pod metrics are used as well. Can be repeated.",
+    )
+    gen_parser.add_argument(
+        "--lazy",
+        action="store_true",
+        help="Do not import the task modules. Tasks are referenced by name, and their signatures are read from the source files.",
+    )
+    gen_parser.add_argument(
+        "--eager-import",
+        action="append",
+        default=[],
+        help="Package to import normally with --lazy, e.g. one defining shared workflows. Can be repeated.",
+    )
+
+    sizing_parser = subparsers.add_parser(
+        "sizing", help="Recommend resources from the metrics of local and Argo runs"
+    )
+    sizing_parser.add_argument(
+        "path", type=Path, help="Path to a Python file defining a Workflow"
+    )
+    sizing_parser.add_argument(
+        "--name",
+        help="Name of the workflow. Defaults to last workflow defined in file.",
+    )
+    sizing_parser.add_argument(
+        "--headroom",
+        type=float,
+        default=1.25,
+        help="Headroom factor of recommended resources. Defaults to 1.25.",
+    )
+    sizing_parser.add_argument(
+        "--argo-run",
+        type=Path,
+        action="append",
+        default=[],
+        help="JSON of an Argo workflow run, e.g. from `argo get <name> -o json`, whose pod metrics are used as well. Can be repeated.",
+    )
+
+    estimate_parser = subparsers.add_parser(
+        "estimate",
+        help="Estimate pods, concurrency and payload sizes before submitting",
+    )
+    estimate_parser.add_argument(
+        "path", type=Path, help="Path to a Python file defining a Workflow"
+    )
+    estimate_parser.add_argument(
+        "--name",
+        help="Name of the workflow. Defaults to last workflow defined in file.",
+    )
+    estimate_parser.add_argument(
+        "--execute",
+        action="store_true",
+        help="Run steps, Foreach producers and a sample of items locally to extrapolate runtimes and payloads.",
+    )
+    estimate_parser.add_argument(
+        "--sample",
+        type=int,
+        default=3,
+        help="Number of Foreach items to run with --execute. Defaults to 3.",
+    )
+
+    explain_parser = subparsers.add_parser(
+        "explain",
+        help="Show the stages of a workflow and the keys each node reads and writes",
+    )
+    explain_parser.add_argument(
+        "path", type=Path, help="Path to a Python file defining a Workflow"
+    )
+    explain_parser.add_argument(
+        "--name",
+        help="Name of the workflow. Defaults to last workflow defined in file.",
+    )
+
+    emulate_parser = subparsers.add_parser(
+        "emulate", help="Run the generated manifest with a local Argo emulator"
+    )
+    emulate_parser.add_argument(
+        "path", type=Path, help="Path to a Python file defining a Workflow"
+    )
+    emulate_parser.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        help="Override workflow parameters (format key=value). Can be repeated.",
+    )
+    emulate_parser.add_argument(
+        "--name",
+        help="Name of the workflow to emulate. Defaults to last workflow defined in file.",
+    )
+    emulate_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Maximum number of pods running at the same time. Defaults to the number of CPUs.",
+    )
+
+    backfill_parser = subparsers.add_parser(
+        "backfill", help="Run a scheduled workflow locally for past scheduled times"
+    )
+    backfill_parser.add_argument(
+        "path", type=Path, help="Path to a Python file defining a Workflow"
+    )
+    backfill_parser.add_argument(
+        "--from",
+        dest="start",
+        type=_parse_time,
+        required=True,
+        help="First time to backfill, inclusive, in ISO 8601. Defaults to UTC.",
+    )
+    backfill_parser.add_argument(
+        "--to",
+        dest="end",
+        type=_parse_time,
+        required=True,
+        help="Last time to backfill, exclusive, in ISO 8601. Defaults to UTC.",
+    )
+    backfill_parser.add_argument(
+        "--name",
+        help="Name of the workflow. Defaults to last workflow defined in file.",
+    )
+    backfill_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Maximum number of runs at the same time. Defaults to the number of CPUs.",
+    )
+    backfill_parser.add_argument(
+        "--rerun",
+        action="store_true",
+        help="Also run scheduled times whose backfill run already succeeded.",
+    )
+
+    graph_parser = subparsers.add_parser(
+        "run-graph",
+        help="Run workflows locally with the workflows they trigger through trigger_on",
+    )
+    graph_parser.add_argument(
+        "paths", type=Path, nargs="+", help="Paths to Python files defining Workflows"
+    )
+    graph_parser.add_argument(
+        "--root",
+        action="append",
+        help="Workflow to start. Can be repeated. Defaults to the workflows that trigger others without being triggered.",
+    )
+    graph_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Maximum number of workflows running at the same time. Defaults to the number of CPUs.",
+    )
 
     args = parser.parse_args()
 
-    workflows = load_workflows(args.path)
-    if args.name:
-        if args.name not in workflows:
-            raise RuntimeError(f"No workflow named '{args.name}' in {args.path}")
-        wf = workflows[args.name]
+    if args.command == "run" and args.watch:
+        return watch(args.path, args.name, _parse_params(args.param), args.interval)
+
+    if args.command == "backfill":
+        report = backfill(
+            args.path, args.start, args.end, args.name, args.workers, args.rerun
+        )
+        for entry in report:
+            print(
+                f"{entry['time']:26} {entry['status']:10} {entry['seconds']:>9.3f}s "
+                f"{entry.get('error', '')}".rstrip()
+            )
+        counts = {
+            s: sum(e["status"] == s for e in report)
+            for s in ("Succeeded", "Failed", "Skipped")
+        }
+        print(", ".join(f"{n} {s.lower()}" for s, n in counts.items()))
+        if counts["Failed"]:
+            sys.exit(1)
+        return
+
+    if args.command == "run-graph":
+        workflows = {}
+        for path in args.paths:
+            workflows.update(load_workflows(path))
+        report = TriggerGraph.of(list(workflows.values())).run(args.root, args.workers)
+        for entry in report:
+            print(
+                f"{entry['workflow']:30} {entry['run_id']:26} {entry['status']:10} "
+                f"{entry['seconds']:>9.3f}s {entry.get('error', '')}".rstrip()
+            )
+        failed = sum(e["status"] == "Failed" for e in report)
+        print(f"{len(report) - failed} succeeded, {failed} failed")
+        if failed:
+            sys.exit(1)
+        return
+
+    if args.command == "generate":
+        workflows = load_workflows(args.path, args.lazy, args.eager_import)
     else:
-        wf = next(reversed(workflows.values()))
+        workflows = load_workflows(args.path)
+    wf = select_workflow(workflows, args.name, args.path)
 
+    argo_runs = [loads(p.read_text()) for p in getattr(args, "argo_run", [])]
     if args.command == "run":
-        params = {}
-        for key_value in args.param:
-            if "=" not in key_value:
-                raise ValueError(f"Expected key=value, got {key_value}")
-            key, val = key_value.split("=", 1)
-            params[key] = _parse_value(val)
-        wf.run(params)
+        wf.run(_parse_params(args.param), run_id=args.run_id)
     elif args.command == "generate":
-        wf.to_yaml(args.outdir)
+        for target in workflows.values() if args.all else [wf]:
+            sizing = (
+                target.recommend_resources(args.headroom, argo_runs)
+                if args.apply_sizing
+                else None
+            )
+            target.to_yaml(args.outdir, sizing=sizing)
+        # Sensor groups are shared, so they are written from all workflows in the file
+        Workflow.to_yaml_sensor_groups(list(workflows.values()), args.outdir)
+    elif args.command == "sizing":
+        for name, resources in wf.recommend_resources(args.headroom, argo_runs).items():
+            print(f"{name}: {resources.model_dump_json(exclude_none=True)}")
+    elif args.command == "estimate":
+        print(estimate(wf, execute=args.execute, sample=args.sample))
+    elif args.command == "explain":
+        print(wf.explain())
+    elif args.command == "emulate":
+        templates = {w.name: w.to_argo() for w in workflows.values()}
+        config_maps = [c for w in workflows.values() for c in w.config_maps()]
+        emulator = Emulator(
+            templates[wf.name],
+            workers=args.workers,
+            workflow_templates=templates,
+            config_maps=config_maps,
+        )
+        print(dumps(emulator.run(_parse_params(args.param))))
+
+
+def _parse_params(key_values: list[str]) -> dict:
+    params = {}
+    for key_value in key_values:
+        if "=" not in key_value:
+            raise ValueError(f"Expected key=value, got {key_value}")
+        key, val = key_value.split("=", 1)
+        params[key] = _parse_value(val)
+    return params
 
 
 def _parse_value(val: str):
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import ast
+from collections.abc import Callable
+from inspect import Parameter, getsource, signature
+from textwrap import dedent
+from typing import TYPE_CHECKING, Any, get_type_hints, is_typeddict
+
+from loguru import logger
+
+from .nodes.chain import StepChain
+from .nodes.foreach import Foreach
+from .nodes.lazy import LazyTask
+from .nodes.node import Node
+from .nodes.run import read_keys
+from .nodes.step import StepNode
+from .nodes.when import When
+from .nodes.workflow import WorkflowNode
+
+if TYPE_CHECKING:
+    from .workflow import Workflow
+
+
+class DataflowError(ValueError):
+    """Raised when a task requires inputs that no parameter or earlier step provides."""
+
+
+def required_inputs(task: Callable) -> set[str]:
+    """Names of the arguments of `task` without defaults."""
+    try:
+        parameters = signature(task).parameters.values()
+    except (TypeError, ValueError):
+        return set()
+    return {
+        p.name
+        for p in parameters
+        if p.default is Parameter.empty
+        and p.kind not in (Parameter.VAR_POSITIONAL, Parameter.VAR_KEYWORD)
+    }
+
+
+def produced_keys(task: Callable) -> set[str] | None:
+    """
+    Keys `task` declares it returns, from a TypedDict return annotation or, without
+    annotation, from returned dict literals. None when the keys cannot be known.
+    """
+    if isinstance(task, LazyTask):
+        return _lazy_produced_keys(task)
+    try:
+        hints = get_type_hints(task)
+    except (NameError, TypeError, AttributeError):
+        hints = getattr(task, "__annotations__", {})
+    if "return" in hints:
+        annotation = hints["return"]
+        if annotation is None or annotation is type(None):
+            return set()
+        if is_typeddict(annotation):
+            return set(get_type_hints(annotation))
+        return None
+    return _returned_keys(task)
+
+
+def _lazy_produced_keys(task: LazyTask) -> set[str] | None:
+    """`produced_keys` from the syntax tree, resolving TypedDicts of the same module."""
+    func = task.definition
+    if func is None:
+        return None
+    if func.returns is None:
+        return _dict_keys(func)
+    if isinstance(func.returns, ast.Constant) and func.returns.value is None:
+        return set()
+    if isinstance(func.returns, ast.Name):
+        for node in task.module_tree.body:
+            if (
+                isinstance(node, ast.ClassDef)
+                and node.name == func.returns.id
+                and any(getattr(b, "id", None) == "TypedDict" for b in node.bases)
+            ):
+                return {
+                    n.target.id
+                    for n in node.body
+                    if isinstance(n, ast.AnnAssign) and isinstance(n.target, ast.Name)
+                }
+    return None
+
+
+def _returned_keys(task: Callable) -> set[str] | None:
+    try:
+        tree = ast.parse(dedent(getsource(task)))
+    except (OSError, TypeError, SyntaxError):
+        return None
+    func = tree.body[0]
+    if not isinstance(func, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return None
+    return _dict_keys(func)
+
+
+def _dict_keys(func: ast.FunctionDef | ast.AsyncFunctionDef) -> set[str] | None:
+    """Keys of the dict literals returned by a function. None for other returns."""
+    keys: set[str] = set()
+    nodes = list(func.body)
+    while nodes:
+        node = nodes.pop()
+        if isinstance(
+            node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+        ):
+            continue
+        if isinstance(node, ast.Return) and node.value is not None:
+            value = node.value
+            if isinstance(value, ast.Constant) and value.value is None:
+                continue
+            if not isinstance(value, ast.Dict) or not all(
+                isinstance(k, ast.Constant) and isinstance(k.value, str)
+                for k in value.keys
+            ):
+                return None
+            keys.update(k.value for k in value.keys)
+        nodes.extend(ast.iter_child_nodes(node))
+    return keys
+
+
+def _check_task(
+    task: Callable, where: str, available: set[str] | None, problems: list[str]
+):
+    if available is None:
+        return
+    missing = required_inputs(task) - available
+    if missing:
+        problems.append(
+            f"{where}: `{task.__name__}` requires {sorted(missing)}, "
+            f"but only {sorted(available)} are available"
+        )
+
+
+def _check_steps(
+    steps: list[StepNode],
+    prefix: str,
+    available: set[str] | None,
+    problems: list[str],
+) -> set[str] | None:
+    for step in steps:
+        _check_task(step.task, f"{prefix}-{step.argo_name}", available, problems)
+        produced = produced_keys(step.task)
+        available = (
+            None if available is None or produced is None else available | produced
+        )
+    return available
+
+
+def _check_node(
+    node: Node, prefix: str, available: set[str] | None, problems: list[str]
+) -> set[str] | None:
+    if isinstance(node, StepNode):
+        return _check_steps([node], prefix, available, problems)
+    if isinstance(node, StepChain):
+        return _check_steps(node.task, prefix, available, problems)
+    if isinstance(node, When):
+        prefix = f"{prefix}-{node.argo_name}"
+        _check_task(node.task, f"{prefix}-{node.task_name}", available, problems)
+        outputs = [
+            _check_steps([branch], f"{prefix}-{name}", available, problems)
+            for name, branch in (("then", node._then), ("otherwise", node._otherwise))
+            if branch is not None
+        ]
+        if available is None or None in outputs:
+            return None
+        return available.union(*outputs)
+    if isinstance(node, Foreach):
+        prefix = f"{prefix}-{node.argo_name}"
+        if callable(node.task):
+            _check_task(node.task, f"{prefix}-{node.task_name}", available, problems)
+        count = getattr(node.task, "count", None)
+        if isinstance(count, str) and available is not None and count not in available:
+            problems.append(
+                f"{prefix}: sequence count `{count}` is not available in {sorted(available)}"
+            )
+        then = node._then_node()
+        steps = then.task if isinstance(then, StepChain) else [then]
+        item_available = None if available is None else available | {node.item_name}
+        output = _check_steps(steps, prefix, item_available, problems)
+        return None if output is None else output - ({node.item_name} - available)
+    if isinstance(node, WorkflowNode) and node.inline:
+        for workflow in node.task:
+            missing = set(workflow.parameters) - (available or set())
+            if available is not None and missing:
+                problems.append(
+                    f"{prefix}-{node.argo_name}-{workflow.name}: workflow "
+                    f"`{workflow.name}` requires {sorted(missing)}, "
+                    f"but only {sorted(available)} are available"
+                )
+            output = _workflow_keys(workflow)
+            available = (
+                None if available is None or output is None else available | output
+            )
+        return available
+    return available
+
+
+def _workflow_keys(workflow: Workflow) -> set[str] | None:
+    """Keys of the final data of a workflow. None when unknown."""
+    available: set[str] | None = set(workflow.parameters)
+    for ind, node in enumerate(workflow.plan()):
+        # Problems within the workflow are reported when it is validated itself
+        available = _check_node(node, f"step-{ind}", available, [])
+    return available
+
+
+def _union(sets: list[set[str] | None]) -> set[str] | None:
+    return None if None in sets else set().union(*sets)
+
+
+def node_reads(node: Node) -> set[str] | None:
+    """Keys of the data a node reads. None when it may read any key."""
+    if isinstance(node, (StepNode, StepChain)):
+        return node.reads
+    if isinstance(node, When):
+        branches = [b.reads for b in (node._then, node._otherwise) if b is not None]
+        return _union([read_keys(node.task), *branches])
+    if isinstance(node, Foreach):
+        then = node._then_node().reads
+        reads = [None if then is None else then - {node.item_name}]
+        if callable(node.task):
+            reads.append(read_keys(node.task))
+        count = getattr(node.task, "count", None)
+        if isinstance(count, str):
+            reads.append({count})
+        return _union(reads)
+    if isinstance(node, WorkflowNode) and node.inline:
+        return set().union(*(w.parameters for w in node.task))
+    return None
+
+
+def node_writes(node: Node) -> set[str] | None:
+    """Keys of the data a node writes. None when unknown."""
+    if isinstance(node, StepNode):
+        return produced_keys(node.task)
+    if isinstance(node, StepChain):
+        return _union([produced_keys(step.task) for step in node.task])
+    if isinstance(node, When):
+        branches = [node._then, node._otherwise]
+        return _union([produced_keys(b.task) for b in branches if b is not None])
+    if isinstance(node, Foreach):
+        return node_writes(node._then_node())
+    if isinstance(node, WorkflowNode) and node.inline:
+        return _union([_workflow_keys(w) for w in node.task])
+    return None
+
+
+def stages(nodes: list[Node]) -> list[list[int]]:
+    """
+    Group consecutive nodes into stages of independent nodes that can run in parallel.
+    A node depends on an earlier node of its stage that writes a key it reads or
+    writes, or that reads a key it writes. Nodes with unknown reads or writes depend
+    on, and are depended on by, all other nodes. Stages keep the order of the nodes.
+    Returns the indices of the nodes per stage.
+    """
+    reads = [node_reads(node) for node in nodes]
+    writes = [node_writes(node) for node in nodes]
+
+    def depends(j: int, i: int) -> bool:
+        if None in (reads[i], writes[i], reads[j], writes[j]):
+            return True
+        return bool(writes[i] & (reads[j] | writes[j]) or writes[j] & reads[i])
+
+    result: list[list[int]] = []
+    for j in range(len(nodes)):
+        if result and not any(depends(j, i) for i in result[-1]):
+            result[-1].append(j)
+        else:
+            result.append([j])
+    return result
+
+
+def combine(outputs: list[dict[str, Any]], writes: list[set[str]]) -> dict[str, Any]:
+    """
+    Data after a stage of parallel nodes, from their outputs and the keys they
+    write. Nodes of a stage write disjoint keys, and the keys of the first output
+    not written by the others are carried over.
+    """
+    others = set().union(*writes[1:])
+    data = {k: v for k, v in outputs[0].items() if k not in others}
+    for output, keys in zip(outputs[1:], writes[1:]):
+        data.update((k, v) for k, v in output.items() if k in keys)
+    return data
+
+
+def validate_dataflow(
+    parameters: dict[str, Any], nodes: list[Node], strict: bool = True
+):
+    """
+    Check statically that the arguments of every task are satisfied by the workflow
+    parameters, the Foreach item and the keys earlier steps declare they produce.
+    Checking stops at the first step whose output keys cannot be known. Problems
+    raise a DataflowError when `strict`, and are logged as a warning otherwise.
+    """
+    available: set[str] | None = set(parameters)
+    problems: list[str] = []
+    for ind, node in enumerate(nodes):
+        available = _check_node(node, f"step-{ind}", available, problems)
+    if not problems:
+        return
+    message = "Unsatisfied task inputs:\n" + "\n".join(problems)
+    if strict:
+        raise DataflowError(message)
+    logger.warning(message)
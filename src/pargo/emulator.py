@@ -0,0 +1,791 @@
+from __future__ import annotations
+
+import re
+import subprocess
+import sys
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack
+from hashlib import sha256
+from json import JSONDecodeError, dumps, loads
+from os import cpu_count, environ, pathsep
+from pathlib import Path
+from threading import BoundedSemaphore, Lock
+from typing import Any, ClassVar
+from uuid import uuid4
+
+from loguru import logger
+from pydantic import BaseModel
+from yaml import safe_load
+
+from .argo_types.config_map import ConfigMap
+from .argo_types.primitives import Metadata
+from .argo_types.workflows import WorkflowResource
+from .nodes.payload import decode
+from .nodes.run import new_run_id, pargo_path
+
+
+class EmulationError(RuntimeError):
+    """Raised when a node of an emulated workflow fails or a template cannot be interpreted."""
+
+
+# Expressions: the subset of expr-lang and sprig used by Argo templates
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<number>\d+(?:\.\d+)?)
+        |(?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+        |(?P<name>[A-Za-z_][A-Za-z0-9_]*)
+        |(?P<op>==|!=|<=|>=|&&|\|\||[!<>?:.\[\](),+\-*/%])
+    )""",
+    re.VERBOSE,
+)
+
+
+def _tokenize(expression: str) -> list[tuple[str, Any]]:
+    tokens, pos = [], 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = _TOKEN.match(expression, pos)
+        if not match or match.end() == pos:
+            raise EmulationError(f"Cannot parse expression at {expression[pos:]!r}")
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "number":
+            value = float(value) if "." in value else int(value)
+        elif kind == "string":
+            value = (
+                loads(value)
+                if value[0] == '"'
+                else loads('"' + value[1:-1].replace('"', '\\"') + '"')
+            )
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    """Recursive descent parser producing a tree of tuples, evaluated lazily."""
+
+    _BINARY: ClassVar[list[list[str]]] = [
+        ["||"],
+        ["&&"],
+        ["==", "!=", "<", ">", "<=", ">="],
+        ["+", "-"],
+        ["*", "/", "%"],
+    ]
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+
+    def peek(self, value: str | None = None):
+        if self.pos >= len(self.tokens):
+            return None
+        kind, token = self.tokens[self.pos]
+        if value is None or (kind == "op" and token == value):
+            return self.tokens[self.pos]
+        return None
+
+    def take(self, value: str | None = None):
+        token = self.peek(value)
+        if token is None:
+            raise EmulationError(
+                f"Expected {value or 'a value'} in {self.expression!r}"
+            )
+        self.pos += 1
+        return token
+
+    def parse(self):
+        tree = self.ternary()
+        if self.pos != len(self.tokens):
+            raise EmulationError(
+                f"Unexpected {self.tokens[self.pos][1]!r} in {self.expression!r}"
+            )
+        return tree
+
+    def ternary(self):
+        condition = self.binary(0)
+        if self.peek("?"):
+            self.take("?")
+            then = self.ternary()
+            self.take(":")
+            return ("?", condition, then, self.ternary())
+        return condition
+
+    def binary(self, level: int):
+        if level == len(self._BINARY):
+            return self.unary()
+        left = self.binary(level + 1)
+        while True:
+            op = next((o for o in self._BINARY[level] if self.peek(o)), None)
+            if op is None:
+                return left
+            self.take(op)
+            left = (op, left, self.binary(level + 1))
+
+    def unary(self):
+        if self.peek("!"):
+            self.take("!")
+            return ("!", self.unary())
+        if self.peek("-"):
+            self.take("-")
+            return ("neg", self.unary())
+        return self.postfix()
+
+    def postfix(self):
+        tree = self.primary()
+        while True:
+            if self.peek("."):
+                self.take(".")
+                tree = ("get", tree, ("const", self.take()[1]))
+            elif self.peek("["):
+                self.take("[")
+                tree = ("get", tree, self.ternary())
+                self.take("]")
+            elif self.peek("("):
+                self.take("(")
+                tree = ("call", tree, self.arguments(")"))
+            else:
+                return tree
+
+    def arguments(self, end: str):
+        args = []
+        while not self.peek(end):
+            args.append(self.ternary())
+            if not self.peek(end):
+                self.take(",")
+        self.take(end)
+        return args
+
+    def primary(self):
+        kind, value = self.take()
+        if kind in ("number", "string"):
+            return ("const", value)
+        if kind == "name":
+            constants = {"true": True, "false": False, "nil": None}
+            return (
+                ("const", constants[value]) if value in constants else ("name", value)
+            )
+        if value == "(":
+            tree = self.ternary()
+            self.take(")")
+            return tree
+        if value == "[":
+            return ("list", self.arguments("]"))
+        raise EmulationError(f"Unexpected {value!r} in {self.expression!r}")
+
+
+def _evaluate(tree, scope: dict[str, Any]):
+    op = tree[0]
+    if op == "const":
+        return tree[1]
+    if op == "name":
+        if tree[1] not in scope:
+            raise EmulationError(f"Unknown variable {tree[1]!r}")
+        return scope[tree[1]]
+    if op == "list":
+        return [_evaluate(t, scope) for t in tree[1]]
+    if op == "get":
+        obj, key = _evaluate(tree[1], scope), _evaluate(tree[2], scope)
+        try:
+            return obj[key]
+        except (KeyError, IndexError, TypeError):
+            raise EmulationError(f"Cannot resolve {key!r}") from None
+    if op == "call":
+        func = _evaluate(tree[1], scope)
+        return func(*(_evaluate(t, scope) for t in tree[2]))
+    if op == "?":
+        branch = tree[2] if _evaluate(tree[1], scope) else tree[3]
+        return _evaluate(branch, scope)
+    if op == "!":
+        return not _evaluate(tree[1], scope)
+    if op == "neg":
+        return -_evaluate(tree[1], scope)
+    if op == "&&":
+        return bool(_evaluate(tree[1], scope)) and bool(_evaluate(tree[2], scope))
+    if op == "||":
+        return bool(_evaluate(tree[1], scope)) or bool(_evaluate(tree[2], scope))
+    left, right = _evaluate(tree[1], scope), _evaluate(tree[2], scope)
+    return {
+        "==": lambda: left == right,
+        "!=": lambda: left != right,
+        "<": lambda: left < right,
+        ">": lambda: left > right,
+        "<=": lambda: left <= right,
+        ">=": lambda: left >= right,
+        "+": lambda: left + right,
+        "-": lambda: left - right,
+        "*": lambda: left * right,
+        "/": lambda: left / right,
+        "%": lambda: left % right,
+    }[op]()
+
+
+SPRIG: dict[str, Callable] = {
+    "replace": lambda old, new, s: s.replace(old, new),
+    "trunc": lambda n, s: s[:n] if n >= 0 else s[n:],
+    "sha256sum": lambda s: sha256(s.encode()).hexdigest(),
+    "lower": lambda s: s.lower(),
+    "upper": lambda s: s.upper(),
+    "trim": lambda s: s.strip(),
+    "default": lambda default, value=None: value if value else default,
+    "toJson": lambda v: dumps(v),
+    "toString": lambda v: v if isinstance(v, str) else _format(v),
+    "atoi": lambda s: int(s),
+    "join": lambda sep, values: sep.join(str(v) for v in values),
+    "pick": lambda d, *keys: {k: v for k, v in d.items() if k in keys},
+    "omit": lambda d, *keys: {k: v for k, v in d.items() if k not in keys},
+    "mergeOverwrite": lambda *ds: {k: v for d in ds for k, v in d.items()},
+}
+"""Sprig functions available as `sprig.<name>` in expressions."""
+
+BUILTINS: dict[str, Any] = {
+    "sprig": SPRIG,
+    "toJSON": lambda v: dumps(v),
+    "fromJSON": lambda s: loads(s),
+    "string": lambda v: v if isinstance(v, str) else _format(v),
+    "int": lambda v: int(v),
+    "len": lambda v: len(v),
+    "asInt": lambda v: int(v),
+    "asFloat": lambda v: float(v),
+    "jsonpath": lambda s, path: _jsonpath(loads(s), path),
+}
+
+
+def _jsonpath(value: Any, path: str) -> Any:
+    """Value at a `$.key.key` path, the subset of JSONPath used by the templates."""
+    for key in path.removeprefix("$").strip(".").split("."):
+        if key:
+            value = value[int(key)] if isinstance(value, list) else value[key]
+    return value
+
+
+def evaluate(expression: str, scope: dict[str, Any]) -> Any:
+    """Evaluate an Argo expression with the variables in `scope`."""
+    return _evaluate(_Parser(expression).parse(), {**BUILTINS, **scope})
+
+
+def _format(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (dict, list)):
+        return dumps(value)
+    return str(value)
+
+
+_TAG = re.compile(r"\{\{(.+?)\}\}")
+
+
+def render(text: str, scope: dict[str, Any]) -> str:
+    """Substitute `{{variable}}` and `{{=expression}}` tags like Argo."""
+
+    def substitute(match: re.Match) -> str:
+        tag = match.group(1).strip()
+        if tag.startswith("="):
+            return _format(evaluate(tag[1:], scope))
+        value: Any = scope
+        for part in tag.split("."):
+            if not isinstance(value, dict) or part not in value:
+                raise EmulationError(f"Unresolved variable {{{{{tag}}}}}")
+            value = value[part]
+        return _format(value)
+
+    return _TAG.sub(substitute, text)
+
+
+# Engine
+
+
+class NodeStatus(BaseModel):
+    """Status of an emulated node, like the node status of an Argo workflow."""
+
+    name: str
+    template: str | None = None
+    phase: str
+    outputs: dict[str, str] = {}
+    message: str | None = None
+
+
+_DEPENDS = re.compile(
+    r"([A-Za-z0-9][A-Za-z0-9-]*)(?:\.(Succeeded|Failed|Errored|Skipped|Omitted|Daemoned|AnySucceeded|AllFailed))?"
+)
+
+
+def _parse_json(value: str) -> Any:
+    try:
+        return loads(value)
+    except (JSONDecodeError, TypeError):
+        return value
+
+
+def _decode(value: str) -> Any:
+    """Final data of the workflow, decompressed when compressed."""
+    try:
+        return decode(value)
+    except (JSONDecodeError, TypeError):
+        return value
+
+
+class Emulator:
+    """
+    Local engine interpreting a generated Argo workflow: steps, DAGs with `depends`,
+    `withParam`/`withItems`, `when`, output `valueFrom` paths and expressions,
+    retries, `activeDeadlineSeconds`, `parallelism` and `templateRef`s to the given
+    `workflow_templates`. Script templates run as subprocesses with the same
+    environment and files as in a pod, `/tmp` being mapped to a directory per pod.
+    Memoization, secrets and backoff durations are not emulated.
+    """
+
+    def __init__(
+        self,
+        manifest: WorkflowResource | dict[str, Any],
+        workdir: Path | None = None,
+        workers: int | None = None,
+        workflow_templates: dict[str, WorkflowResource | dict[str, Any]] | None = None,
+        config_maps: list[ConfigMap] | None = None,
+    ):
+        if isinstance(manifest, WorkflowResource):
+            manifest = manifest.model_dump(exclude_none=True)
+        self.manifest = manifest
+        self.name = manifest["metadata"].get("name") or "workflow"
+        self.templates = {t["name"]: t for t in manifest["spec"]["templates"]}
+        self.workdir = workdir or pargo_path() / self.name / new_run_id() / "emulator"
+        self.workers = workers or cpu_count() or 1
+        self.workflow_templates = workflow_templates or {}
+        self.config_maps = {c.metadata.name: c.data for c in config_maps or []}
+        self.nodes: list[NodeStatus] = []
+        self._pods = BoundedSemaphore(self.workers)
+        parallelism = manifest["spec"].get("parallelism")
+        self._parallelism = BoundedSemaphore(parallelism) if parallelism else None
+        self._template_locks: dict[str, BoundedSemaphore] = {}
+        self._lock = Lock()
+        self._pod_count = 0
+        self._referenced: dict[str, Emulator] = {}
+
+    @classmethod
+    def from_yaml(cls, path: Path, **kwargs) -> Emulator:
+        """Emulator of a manifest written by `Workflow.to_yaml`."""
+        return cls(safe_load(Path(path).read_text()), **kwargs)
+
+    def run(self, parameters: dict[str, Any] | None = None) -> dict[str, Any]:
+        """Run the workflow and return the outputs of its last step."""
+        spec = self.manifest["spec"]
+        arguments = {
+            p["name"]: str(p.get("value", p.get("default")))
+            for p in (spec.get("arguments") or {}).get("parameters", [])
+        }
+        for key, value in (parameters or {}).items():
+            if key in arguments:
+                arguments[key] = dumps(value)
+        self.workflow = {
+            "name": f"{self.name}-{uuid4().hex[:5]}",
+            "uid": str(uuid4()),
+            "parameters": arguments,
+        }
+        logger.info(f"Emulating {self.workflow['name']} in {self.workdir}")
+
+        status = self._execute(spec["entrypoint"], {}, self.workflow["name"])
+        if status.phase != "Succeeded":
+            raise EmulationError(f"Workflow {self.name} failed: {status.message}")
+        if "outputs" in status.outputs:
+            return _decode(status.outputs["outputs"])
+        entry = self.templates[spec["entrypoint"]]
+        last = [s for s in self.nodes if s.name.startswith(status.name + ".")]
+        if entry.get("steps"):
+            final = entry["steps"][-1][0]["name"]
+            last = [s for s in last if s.name == f"{status.name}.{final}"]
+        outputs = last[-1].outputs.get("outputs") if last else None
+        return _decode(outputs) if outputs else {}
+
+    def _record(self, status: NodeStatus) -> NodeStatus:
+        with self._lock:
+            self.nodes.append(status)
+        return status
+
+    def _execute(
+        self, template_name: str, arguments: dict[str, str], node_name: str
+    ) -> NodeStatus:
+        if template_name not in self.templates:
+            raise EmulationError(f"Template {template_name!r} not found")
+        template = self.templates[template_name]
+        inputs = {}
+        for p in (template.get("inputs") or {}).get("parameters", []):
+            if p["name"] in arguments:
+                inputs[p["name"]] = arguments[p["name"]]
+            elif "configMapKeyRef" in p.get("valueFrom", {}):
+                ref = p["valueFrom"]["configMapKeyRef"]
+                try:
+                    inputs[p["name"]] = self.config_maps[ref["name"]][ref["key"]]
+                except KeyError:
+                    raise EmulationError(
+                        f"ConfigMap {ref['name']!r} is not available to the emulator"
+                    ) from None
+            elif "default" in p:
+                inputs[p["name"]] = render(
+                    str(p["default"]), {"workflow": self.workflow}
+                )
+            else:
+                raise EmulationError(f"Missing input {p['name']!r} of {template_name}")
+        scope = {"workflow": self.workflow, "inputs": {"parameters": inputs}}
+
+        if "script" in template:
+            status = self._script(template, scope, node_name)
+        elif "steps" in template:
+            status = self._steps(template, scope, node_name)
+        elif "dag" in template:
+            status = self._dag(template, scope, node_name)
+        elif "resource" in template:
+            status = self._resource(template, node_name)
+        else:
+            raise EmulationError(f"Unsupported template {template_name!r}")
+        return self._record(status)
+
+    def _outputs(self, template: dict, scope: dict, read: Callable[[str], str | None]):
+        outputs = {}
+        for p in (template.get("outputs") or {}).get("parameters", []):
+            value_from = p.get("valueFrom", {})
+            if "expression" in value_from:
+                value = _format(evaluate(value_from["expression"], scope))
+            elif "path" in value_from:
+                value = read(value_from["path"])
+                if value is None:
+                    value = value_from.get("default")
+                if value is None:
+                    raise EmulationError(
+                        f"Output {p['name']!r} not found at {value_from['path']}"
+                    )
+            else:
+                value = render(str(p.get("value", "")), scope)
+            outputs[p["name"]] = value
+        return outputs
+
+    def _script(self, template: dict, scope: dict, node_name: str) -> NodeStatus:
+        name = template["name"]
+        script = template["script"]
+        retry = template.get("retryStrategy") or {}
+        attempts = 1 + int(retry.get("limit", 0)) if retry else 1
+        if template.get("parallelism"):
+            with self._lock:
+                lock = self._template_locks.setdefault(
+                    name, BoundedSemaphore(template["parallelism"])
+                )
+        else:
+            lock = None
+
+        for attempt in range(attempts):
+            with self._lock:
+                self._pod_count += 1
+                pod_dir = self.workdir / f"{self._pod_count:05d}-{name}"
+            pod_dir.mkdir(parents=True, exist_ok=True)
+
+            def local(path: str, pod_dir: Path = pod_dir) -> Path:
+                return (
+                    pod_dir / path[len("/tmp/") :]
+                    if path.startswith("/tmp")
+                    else Path(path)
+                )
+
+            env = dict(environ)
+            env["PYTHONPATH"] = pathsep.join(p for p in sys.path if p)
+            for var in script.get("env", []):
+                value = render(str(var.get("value", "")), scope)
+                env[var["name"]] = str(pod_dir) if value == "/tmp" else value
+            if script.get("envFrom"):
+                logger.warning(f"{name}: secrets are not available in the emulator")
+
+            source_path = pod_dir / "script"
+            source_path.write_text(script["source"])
+            command = list(script.get("command", ["python"]))
+            if command[0] == "python":
+                command[0] = sys.executable
+
+            with ExitStack() as stack:
+                for semaphore in (lock, self._parallelism, self._pods):
+                    if semaphore is not None:
+                        stack.enter_context(semaphore)
+                logger.info(f"Pod {node_name} ({name}) started")
+                try:
+                    result = subprocess.run(
+                        [*command, str(source_path)],
+                        env=env,
+                        capture_output=True,
+                        text=True,
+                        timeout=template.get("activeDeadlineSeconds"),
+                        check=False,
+                    )
+                except subprocess.TimeoutExpired as e:
+                    output = [
+                        s.decode() if isinstance(s, bytes) else s or ""
+                        for s in (e.stdout, e.stderr)
+                    ]
+                    result = subprocess.CompletedProcess(
+                        e.cmd,
+                        -9,
+                        output[0],
+                        output[1] + "\nPod was active longer than the deadline",
+                    )
+            (pod_dir / "main.log").write_text(result.stdout + result.stderr)
+            if result.returncode == 0:
+                break
+            logger.warning(f"Pod {node_name} failed (attempt {attempt + 1}/{attempts})")
+        else:
+            tail = "\n".join(result.stderr.strip().splitlines()[-20:])
+            return NodeStatus(
+                name=node_name, template=name, phase="Failed", message=tail
+            )
+
+        def read(path: str) -> str | None:
+            file = local(path)
+            return file.read_text() if file.exists() else None
+
+        outputs = self._outputs(template, scope, read)
+        return NodeStatus(
+            name=node_name, template=name, phase="Succeeded", outputs=outputs
+        )
+
+    def _expand(self, task: dict, scope: dict) -> list[tuple[str, dict]] | None:
+        """Items of a task with `withParam` or `withItems`, None for a single task."""
+        if task.get("withParam") is not None:
+            items = task["withParam"]
+            if isinstance(items, str):
+                items = loads(render(items, scope))
+        elif task.get("withItems") is not None:
+            items = task["withItems"]
+        elif task.get("withSequence") is not None:
+            sequence = {
+                k: int(render(str(v), scope)) for k, v in task["withSequence"].items()
+            }
+            start = sequence.get("start", 0)
+            end = (
+                sequence["end"] + 1 if "end" in sequence else start + sequence["count"]
+            )
+            items = [str(i) for i in range(start, end)]
+        else:
+            return None
+        return [
+            (f"{task['name']}({i}:{_format(item)})", item)
+            for i, item in enumerate(items)
+        ]
+
+    def _run_task(self, task: dict, scope: dict, node_name: str) -> NodeStatus:
+        """Run a step or DAG task, expanding items and aggregating their outputs."""
+
+        def arguments(item_scope: dict) -> dict[str, str]:
+            return {
+                p["name"]: render(str(p.get("value", "")), item_scope)
+                for p in (task.get("arguments") or {}).get("parameters", [])
+            }
+
+        execute, template = self._executor(task)
+        items = self._expand(task, scope)
+        if items is None:
+            status = execute(template, arguments(scope), f"{node_name}.{task['name']}")
+            return status.model_copy(update={"name": task["name"]})
+        if not items:
+            return NodeStatus(name=task["name"], phase="Skipped", message="empty items")
+
+        with ThreadPoolExecutor(max_workers=min(len(items), self.workers)) as pool:
+            futures = [
+                pool.submit(
+                    execute,
+                    template,
+                    arguments({**scope, "item": _format(item)}),
+                    f"{node_name}.{child}",
+                )
+                for child, item in items
+            ]
+            children = [f.result() for f in futures]
+        failed = [c for c in children if c.phase != "Succeeded"]
+        aggregated = {}
+        for key in children[0].outputs if children else []:
+            aggregated[key] = dumps([_parse_json(c.outputs[key]) for c in children])
+        return NodeStatus(
+            name=task["name"],
+            template=template,
+            phase="Failed" if failed else "Succeeded",
+            outputs=aggregated,
+            message=failed[0].message if failed else None,
+        )
+
+    def _executor(self, task: dict) -> tuple[Callable, str]:
+        """
+        Function executing the template of a task, and the template name. Templates
+        referenced with `templateRef` run within the referenced WorkflowTemplate,
+        as part of this workflow.
+        """
+        if "templateRef" not in task:
+            return self._execute, task["template"]
+        ref = task["templateRef"]
+        if ref["name"] not in self.workflow_templates:
+            raise EmulationError(
+                f"WorkflowTemplate {ref['name']!r} is not available to the emulator"
+            )
+        with self._lock:
+            child = self._referenced.get(ref["name"])
+            if child is None:
+                child = Emulator(
+                    self.workflow_templates[ref["name"]],
+                    workdir=self.workdir / ref["name"],
+                    workers=self.workers,
+                    workflow_templates=self.workflow_templates,
+                )
+                child.config_maps = self.config_maps
+                child.workflow = self.workflow
+                child.nodes = self.nodes
+                child._pods = self._pods
+                child._parallelism = self._parallelism
+                child._lock = self._lock
+                self._referenced[ref["name"]] = child
+        return child._execute, ref["template"]
+
+    @staticmethod
+    def _scope_entry(status: NodeStatus) -> dict[str, Any]:
+        return {
+            "status": status.phase,
+            "outputs": {
+                "parameters": status.outputs,
+                "result": status.outputs.get("outputs"),
+            },
+        }
+
+    def _steps(self, template: dict, scope: dict, node_name: str) -> NodeStatus:
+        scope = {**scope, "steps": {}}
+        for group in template["steps"]:
+            runnable, skipped = [], []
+            for task in group:
+                when = task.get("when")
+                if when and not evaluate(render(when, scope), {}):
+                    skipped.append(task)
+                else:
+                    runnable.append(task)
+            with ThreadPoolExecutor(
+                max_workers=max(min(len(runnable), self.workers), 1)
+            ) as pool:
+                statuses = list(
+                    pool.map(lambda t: self._run_task(t, scope, node_name), runnable)
+                )
+            statuses += [NodeStatus(name=t["name"], phase="Skipped") for t in skipped]
+            for status in statuses:
+                scope["steps"][status.name] = self._scope_entry(status)
+            failed = [s for s in statuses if s.phase == "Failed"]
+            if failed:
+                return NodeStatus(
+                    name=node_name,
+                    template=template["name"],
+                    phase="Failed",
+                    message=failed[0].message,
+                )
+        outputs = self._outputs(template, scope, lambda path: None)
+        return NodeStatus(
+            name=node_name,
+            template=template["name"],
+            phase="Succeeded",
+            outputs=outputs,
+        )
+
+    def _dag(self, template: dict, scope: dict, node_name: str) -> NodeStatus:
+        scope = {**scope, "tasks": {}}
+        tasks = {t["name"]: t for t in template["dag"]["tasks"]}
+        done: dict[str, NodeStatus] = {}
+        running: dict[Future, str] = {}
+
+        def dependencies(task: dict) -> list[str]:
+            return [
+                m.group(1)
+                for m in _DEPENDS.finditer(task.get("depends") or "")
+                if m.group(1) in tasks
+            ]
+
+        def satisfied(task: dict) -> bool:
+            def check(match: re.Match) -> str:
+                name, state = match.group(1), match.group(2)
+                if name not in tasks:
+                    return match.group(0)
+                phase = done[name].phase
+                if state is None:
+                    ok = phase in ("Succeeded", "Skipped", "Daemoned")
+                elif state == "AnySucceeded":
+                    ok = phase == "Succeeded"
+                elif state == "AllFailed":
+                    ok = phase == "Failed"
+                else:
+                    ok = phase == state
+                return "true" if ok else "false"
+
+            depends = task.get("depends")
+            return not depends or bool(evaluate(_DEPENDS.sub(check, depends), {}))
+
+        with ThreadPoolExecutor(
+            max_workers=max(min(len(tasks), self.workers), 1)
+        ) as pool:
+            while len(done) < len(tasks):
+                for name, task in tasks.items():
+                    if name in done or name in running.values():
+                        continue
+                    if not all(d in done for d in dependencies(task)):
+                        continue
+                    if not satisfied(task):
+                        done[name] = NodeStatus(name=name, phase="Omitted")
+                        scope["tasks"][name] = self._scope_entry(done[name])
+                    elif task.get("when") and not evaluate(
+                        render(task["when"], scope), {}
+                    ):
+                        done[name] = NodeStatus(name=name, phase="Skipped")
+                        scope["tasks"][name] = self._scope_entry(done[name])
+                    else:
+                        running[
+                            pool.submit(self._run_task, task, dict(scope), node_name)
+                        ] = name
+                if not running:
+                    if len(done) < len(tasks):
+                        raise EmulationError(
+                            f"Unresolvable dependencies in {template['name']}"
+                        )
+                    break
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    status = future.result()
+                    done[running.pop(future)] = status
+                    scope["tasks"][status.name] = self._scope_entry(status)
+
+        failed = [s for s in done.values() if s.phase == "Failed"]
+        if failed:
+            return NodeStatus(
+                name=node_name,
+                template=template["name"],
+                phase="Failed",
+                message=failed[0].message,
+            )
+        outputs = self._outputs(template, scope, lambda path: None)
+        return NodeStatus(
+            name=node_name,
+            template=template["name"],
+            phase="Succeeded",
+            outputs=outputs,
+        )
+
+    def _resource(self, template: dict, node_name: str) -> NodeStatus:
+        manifest = safe_load(template["resource"]["manifest"])
+        ref = (manifest.get("spec", {}).get("workflowTemplateRef") or {}).get("name")
+        if ref not in self.workflow_templates:
+            raise EmulationError(
+                f"WorkflowTemplate {ref!r} is not available to the emulator"
+            )
+        child = Emulator(
+            self.workflow_templates[ref],
+            workdir=self.workdir / ref,
+            workers=self.workers,
+            workflow_templates=self.workflow_templates,
+            config_maps=[
+                ConfigMap(metadata=Metadata(name=name), data=data)
+                for name, data in self.config_maps.items()
+            ],
+        )
+        child.run()
+        return NodeStatus(name=node_name, template=template["name"], phase="Succeeded")
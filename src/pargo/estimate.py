@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+from json import dumps
+from math import ceil
+from random import Random
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+from pydantic import BaseModel, Field
+
+from .nodes.foreach import MAX_CONFIG_MAP_BYTES, Foreach, Sequence
+from .nodes.node import Node
+from .nodes.run import merge_foreach, run_foreach, shard
+from .nodes.when import When
+from .nodes.workflow import WorkflowNode
+
+if TYPE_CHECKING:
+    from .workflow import Workflow
+
+MAX_PARAMETER_BYTES = 128 * 1024
+"""Parameters reach pods as environment variables, limited to 128 KiB each by Linux."""
+
+MAX_OBJECT_BYTES = 1536 * 1024
+"""Default etcd request limit, which bounds the workflow object with its inline lists and node outputs."""
+
+MAX_FANOUT = 5000
+"""Fan-out above which a Foreach is flagged, as the controller and API server slow down."""
+
+
+class NodeEstimate(BaseModel):
+    """Estimate of a single node of the workflow."""
+
+    name: str = Field(description="Name of the node template")
+    pods: int | None = Field(description="Number of pods. None when unknown.")
+    max_concurrent: int | None = Field(
+        description="Maximum number of pods running at the same time"
+    )
+    input_bytes: int = Field(description="Size of the data passed to the node")
+    output_bytes: int | None = Field(
+        description="Size of the data passed on from the node, for Foreach the aggregated item outputs"
+    )
+    items: int | None = Field(default=None, description="Number of Foreach items")
+    seconds: float | None = Field(
+        default=None, description="Extrapolated wall time, when executed"
+    )
+
+
+class Estimate(BaseModel):
+    """Dry-run estimate of the pods, concurrency and payloads of a workflow."""
+
+    workflow: str
+    nodes: list[NodeEstimate] = []
+    warnings: list[str] = []
+
+    @property
+    def pods(self) -> int | None:
+        pods = [n.pods for n in self.nodes]
+        return None if None in pods else sum(pods)
+
+    @property
+    def max_concurrent(self) -> int | None:
+        concurrent = [n.max_concurrent for n in self.nodes]
+        return None if None in concurrent else max(concurrent, default=0)
+
+    @property
+    def seconds(self) -> float | None:
+        seconds = [n.seconds for n in self.nodes]
+        return None if None in seconds else sum(seconds)
+
+    def __str__(self):
+        def fmt(value):
+            return "?" if value is None else str(value)
+
+        lines = [
+            f"{'node':40} {'pods':>7} {'conc':>6} {'in':>10} {'out':>10} {'secs':>8}"
+        ]
+        for n in self.nodes:
+            seconds = None if n.seconds is None else f"{n.seconds:.2f}"
+            lines.append(
+                f"{n.name:40} {fmt(n.pods):>7} {fmt(n.max_concurrent):>6} "
+                f"{n.input_bytes:>10} {fmt(n.output_bytes):>10} {fmt(seconds):>8}"
+            )
+        seconds = None if self.seconds is None else f"{self.seconds:.2f}"
+        lines.append(
+            f"{'total':40} {fmt(self.pods):>7} {fmt(self.max_concurrent):>6} "
+            f"{'':>10} {'':>10} {fmt(seconds):>8}"
+        )
+        lines.extend(f"WARNING: {w}" for w in self.warnings)
+        return "\n".join(lines)
+
+
+def _limit(*limits: int | None) -> int | None:
+    limits = [limit for limit in limits if limit]
+    return min(limits) if limits else None
+
+
+def _size(data: Any) -> int:
+    return len(dumps(data).encode())
+
+
+def _timed(func, *args, **kwargs):
+    start = perf_counter()
+    result = func(*args, **kwargs)
+    return result, perf_counter() - start
+
+
+def _estimate_foreach(
+    node: Foreach,
+    name: str,
+    data: dict[str, Any],
+    parallelism: int | None,
+    execute: bool,
+    sample: int,
+    warnings: list[str],
+) -> tuple[NodeEstimate, dict[str, Any]]:
+    then = node._then_node()
+    producer_seconds = 0.0
+    items: list[Any] | None = None
+    if isinstance(node.task, list):
+        items = node.task
+        inline = _size([dumps(item) for item in items])
+        offloaded = node._offloaded_items() is not None
+        if offloaded and inline > MAX_CONFIG_MAP_BYTES:
+            warnings.append(
+                f"{name}: offloaded list of {inline} bytes exceeds the ConfigMap limit of {MAX_CONFIG_MAP_BYTES} bytes"
+            )
+        elif not offloaded and inline > MAX_OBJECT_BYTES:
+            warnings.append(
+                f"{name}: inline list of {inline} bytes exceeds the etcd limit of {MAX_OBJECT_BYTES} bytes"
+            )
+    elif isinstance(node.task, Sequence):
+        items = node.task.items(data)
+    elif execute:
+        items, producer_seconds = _timed(
+            run_foreach, node.task_name, node.task_module, data
+        )
+        produced = _size([dumps(item) for item in items])
+        if produced > MAX_PARAMETER_BYTES:
+            warnings.append(
+                f"{name}: producer output of {produced} bytes exceeds the parameter limit of {MAX_PARAMETER_BYTES} bytes"
+            )
+
+    input_bytes = _size(data)
+    if items is None:
+        warnings.append(f"{name}: number of items unknown without --execute")
+        return NodeEstimate(
+            name=name,
+            pods=None,
+            max_concurrent=None,
+            input_bytes=input_bytes,
+            output_bytes=None,
+        ), data
+
+    units = shard(items, node.shard_size) if node.shard_size else items
+    if len(units) > MAX_FANOUT:
+        warnings.append(
+            f"{name}: fan-out of {len(units)} pods exceeds {MAX_FANOUT}, consider shard_size"
+        )
+    concurrent = _limit(len(units), then.parallelism, parallelism) or 1
+    pods = len(units) + 1 + (1 if callable(node.task) else 0)
+    if node.merge_group_size:
+        level = units
+        while len(level) > 1:
+            level = shard(level, node.merge_group_size)
+            pods += len(level)
+
+    seconds = None
+    output_bytes = len(units) * input_bytes
+    if execute and items:
+        picked = Random(0).sample(items, min(sample, len(items)))
+        results, durations = [], []
+        for item in picked:
+            result, duration = _timed(then.run, data, {node.item_name: item})
+            results.append(result)
+            durations.append(duration)
+        per_item = sum(durations) / len(durations)
+        per_unit = per_item * len(items) / len(units)
+        output_bytes = ceil(sum(_size(r) for r in results) / len(results)) * len(units)
+        seconds = producer_seconds + ceil(len(units) / concurrent) * per_unit
+        data = merge_foreach(results)
+
+    if output_bytes > MAX_PARAMETER_BYTES:
+        warnings.append(
+            f"{name}: merge input of ~{output_bytes} bytes exceeds the parameter limit of {MAX_PARAMETER_BYTES} bytes"
+        )
+    return NodeEstimate(
+        name=name,
+        pods=pods,
+        max_concurrent=concurrent,
+        input_bytes=input_bytes,
+        output_bytes=output_bytes,
+        items=len(items),
+        seconds=seconds,
+    ), data
+
+
+def _estimate_node(
+    node: Node,
+    name: str,
+    data: dict[str, Any],
+    parallelism: int | None,
+    execute: bool,
+    sample: int,
+    warnings: list[str],
+) -> tuple[NodeEstimate, dict[str, Any]]:
+    if isinstance(node, Foreach):
+        return _estimate_foreach(
+            node, name, data, parallelism, execute, sample, warnings
+        )
+
+    if isinstance(node, WorkflowNode):
+        children = [estimate(w, execute=execute, sample=sample) for w in node.task]
+        for child in children:
+            warnings.extend(f"{child.workflow}: {w}" for w in child.warnings)
+        pods = [c.pods for c in children]
+        concurrent = [c.max_concurrent for c in children]
+        seconds = [c.seconds for c in children]
+        return NodeEstimate(
+            name=name,
+            pods=None if None in pods else len(children) + sum(pods),
+            max_concurrent=None if None in concurrent else sum(concurrent),
+            input_bytes=_size(data),
+            output_bytes=_size(data),
+            seconds=None if None in seconds else max(seconds, default=0.0),
+        ), data
+
+    seconds = None
+    input_bytes = _size(data)
+    if execute:
+        data, seconds = _timed(node.run, data)
+    pods = 2 if isinstance(node, When) else 1
+    return NodeEstimate(
+        name=name,
+        pods=pods,
+        max_concurrent=1,
+        input_bytes=input_bytes,
+        output_bytes=_size(data) if execute else input_bytes,
+        seconds=seconds,
+    ), data
+
+
+def estimate(workflow: Workflow, execute: bool = False, sample: int = 3) -> Estimate:
+    """
+    Estimate pods, concurrency under `parallelism` and payload sizes per node without
+    submitting. With `execute`, Foreach producers and a `sample` of items run locally,
+    and runtimes and payloads are extrapolated. Otherwise payloads are lower bounds
+    from the parameters.
+    """
+    result = Estimate(workflow=workflow.name)
+    data = dict(workflow.parameters)
+    for ind, node in enumerate(workflow.plan()):
+        name = f"step-{ind}-{node.argo_name}"
+        node_estimate, data = _estimate_node(
+            node, name, data, workflow.parallelism, execute, sample, result.warnings
+        )
+        if node_estimate.input_bytes > MAX_PARAMETER_BYTES:
+            result.warnings.append(
+                f"{name}: input of {node_estimate.input_bytes} bytes exceeds the parameter limit of {MAX_PARAMETER_BYTES} bytes"
+            )
+        result.nodes.append(node_estimate)
+    return result
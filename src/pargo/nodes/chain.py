@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+from hashlib import sha256
+from typing import Any
+
+from pydantic import Field
+
+from ..argo_types.workflows import Resources, RetryStrategy
+from .memoize import memoize
+from .node import Node
+from .run import RunContext, measure, run_steps
+from .step import StepNode
+from .worker_template import merge_resources, worker_template
+
+
+class StepChain(Node):
+    """Class for a chain of worker tasks executed in sequence within a single pod."""
+
+    task: list[StepNode] = Field(description="StepNodes to execute in sequence")
+
+    @property
+    def argo_name(self):
+        """Argo friendly name of the chain."""
+        return "-".join(step.argo_name for step in self.task)
+
+    @property
+    def tasks(self):
+        """List of (task_name, task_module) to run."""
+        return [(step.task_name, step.task_module) for step in self.task]
+
+    @property
+    def reads(self) -> set[str] | None:
+        """Keys of the data any task reads. None when one reads all."""
+        reads = [step.reads for step in self.task]
+        return None if None in reads else set().union(*reads)
+
+    @property
+    def image(self):
+        return self._shared("image")
+
+    @property
+    def secrets(self):
+        return self._shared("secrets")
+
+    @property
+    def resources(self):
+        return self._shared("resources")
+
+    @property
+    def parallelism(self):
+        return next((s.parallelism for s in self.task if s.parallelism), None)
+
+    @property
+    def retry(self):
+        return next((s.retry for s in self.task if s.retry is not None), None)
+
+    @property
+    def cache(self):
+        return all(step.cache for step in self.task)
+
+    @property
+    def cache_max_age(self):
+        return self._shared("cache_max_age")
+
+    @property
+    def code_hash(self):
+        """Hash of the code of all tasks."""
+        hashes = "".join(step.code_hash for step in self.task)
+        return sha256(hashes.encode()).hexdigest()[:16]
+
+    def _shared(self, attr: str):
+        values = [getattr(step, attr) for step in self.task]
+        if any(v != values[0] for v in values):
+            raise ValueError(
+                f"Steps {[s.task_name for s in self.task]} run in the same pod and must share {attr}."
+            )
+        return values[0]
+
+    def run(
+        self,
+        data: dict[str, Any],
+        item: dict[str, Any] | None = None,
+        context: RunContext | None = None,
+    ):
+        """Run the chain locally"""
+        with measure(context):
+            return run_steps(self.tasks, data, item or {})
+
+    def get_templates(
+        self,
+        step_counter: int,
+        default_image: str,
+        image_pull_policy: str,
+        default_secrets: list[str] | None,
+        default_parameters: dict[str, Any],
+        default_retry: int | RetryStrategy | None,
+        default_resources: Resources | None = None,
+    ):
+        """Returns a single item list with a ScriptTemplate running all steps @private"""
+        template_name = f"step-{step_counter}-{self.argo_name}"
+        tasks = ", ".join(f'("{name}", "{module}")' for name, module in self.tasks)
+        script_source = (
+            f"from {run_steps.__module__} import run_steps\nrun_steps([{tasks}])"
+        )
+
+        template = worker_template(
+            template_name=template_name,
+            script_source=script_source,
+            parameters=default_parameters,
+            image=self.image or default_image,
+            image_pull_policy=image_pull_policy,
+            secrets=self.secrets or default_secrets,
+            parallelism=self.parallelism,
+            outpath="/tmp/data.json",
+            retry=self.retry or default_retry,
+            memoize=memoize(self.code_hash, self.cache_max_age) if self.cache else None,
+            resources=merge_resources(default_resources, self.resources),
+        )
+
+        return [template]
+
+
+def fuse_steps(nodes: list[Node]) -> list[Node]:
+    """
+    Merge consecutive StepNodes that share image, secrets, resources, parallelism,
+    retry and cache settings into StepChains, so that they execute in a single pod.
+    """
+
+    def key(node: StepNode):
+        return (
+            node.image,
+            node.secrets,
+            node.resources,
+            node.parallelism,
+            node.retry,
+            node.cache,
+            node.cache_max_age,
+        )
+
+    groups: list[list[Node]] = []
+    for node in nodes:
+        last = groups[-1] if groups else None
+        if (
+            last
+            and isinstance(node, StepNode)
+            and isinstance(last[0], StepNode)
+            and key(node) == key(last[0])
+        ):
+            last.append(node)
+        else:
+            groups.append([node])
+    return [StepChain(task=group) if len(group) > 1 else group[0] for group in groups]
@@ -1,33 +1,92 @@
 from __future__ import annotations
 
+from hashlib import sha256
 from json import dumps
+from math import ceil
 from typing import Any, Callable
 
 from loguru import logger
-from pydantic import Field
+from pydantic import BaseModel, Field, PrivateAttr
 
+from ..argo_types.config_map import ConfigMap
+from ..argo_types.primitives import Metadata
 from ..argo_types.workflows import (
     DAGTemplate,
+    EmptyDir,
     Parameter,
+    Resources,
     RetryStrategy,
     Task,
+    Volume,
+    VolumeMount,
 )
+from ..tracing import span
+from .chain import StepChain
 from .import_path import import_path
+from .memoize import memoize, task_hash
 from .node import Node
-from .run import merge_foreach, run_foreach
+from .run import (
+    PARTIAL,
+    RunContext,
+    measure,
+    merge_foreach,
+    merge_partial,
+    run_foreach,
+    run_items,
+    run_shard,
+    shard,
+    tree,
+)
 from .step import StepNode, StepTask
-from .worker_template import worker_template
+from .worker_template import merge_resources, rename_template, worker_template
 
 ForeachTask = Callable[..., list[Any]]
 
+MAX_CONFIG_MAP_BYTES = 1024 * 1024
+"""Maximum size of a ConfigMap holding an offloaded Foreach list, limited by etcd."""
+
+
+class Sequence(BaseModel):
+    """Integer items `start, start + step, ...` rendered to `withSequence` on Argo."""
+
+    count: int | str = Field(
+        description="Number of items, or the name of a parameter holding it."
+    )
+    start: int = Field(default=0, description="First item")
+    step: int = Field(default=1, description="Difference between items")
+
+    @classmethod
+    def of(cls, r: range) -> Sequence:
+        return cls(count=len(r), start=r.start, step=r.step)
+
+    def items(self, data: dict[str, Any]) -> range:
+        """Lazy range of the items, resolving the count from `data`."""
+        count = int(data[self.count]) if isinstance(self.count, str) else self.count
+        return range(self.start, self.start + count * self.step, self.step)
+
+    def with_sequence(self) -> dict[str, str]:
+        """withSequence of the items, before applying `step`."""
+        if isinstance(self.count, str):
+            count = f"{{{{=jsonpath(inputs.parameters.inputs, '$.{self.count}')}}}}"
+        else:
+            count = str(self.count)
+        start = str(self.start) if self.step == 1 else "0"
+        return {"count": count, "start": start}
+
+    def item(self) -> str:
+        """Item argument of the tasks, mapping sequence indices when `step` is not 1."""
+        if self.step == 1:
+            return "{{item}}"
+        return f"{{{{=asInt(item) * {self.step} + {self.start}}}}}"
+
 
 class Foreach(Node):
     """
     Class for executing steps for each item.
     """
 
-    task: ForeachTask | list[Any] = Field(
-        description="Callable that returns a list or a list to iterate over."
+    task: ForeachTask | list[Any] | Sequence = Field(
+        description="Callable that returns a list, a list or a range to iterate over."
     )
     item_name: str = Field(
         default="item",
@@ -42,16 +101,92 @@ class Foreach(Node):
     retry: int | RetryStrategy | None = Field(
         default=None, description="Overwrite workflow retry for the ForeachTask"
     )
-    _then: StepNode | None = None
-    _prev: str = "foreach"
+    resources: Resources | None = Field(
+        default=None,
+        description="Overwrite workflow resource requests and limits for the ForeachTask. Merged per key with the workflow defaults.",
+    )
+    cache: bool = Field(
+        default=False,
+        description="Memoize the ForeachTask on Argo. The cache key is derived from the task code and inputs.",
+    )
+    cache_max_age: str | None = Field(
+        default=None,
+        description="Maximum age of cached results, e.g. '24h'. Default (None) is one year, since Argo requires a maximum age.",
+    )
+    shard_size: int | None = Field(
+        default=None,
+        description="Process items in shards of this size, one pod per shard, on a process pool within the pod. Shard results are merged in-pod before the global merge.",
+    )
+    processes: int | None = Field(
+        default=None,
+        description="Size of the process pool for a shard. Default (None) derives it from the CPU request, or the available CPUs.",
+    )
+    shm_size: str | None = Field(
+        default="1Gi",
+        description="Size of the memory backed `/dev/shm` mounted in shard pods. None disables the mount.",
+    )
+    merge_group_size: int | None = Field(
+        default=None,
+        description="Merge item outputs in a tree of merge tasks, each combining at most this many outputs. The depth grows with the number of items. Default (None) merges all outputs in one task.",
+    )
+    project_inputs: bool = Field(
+        default=True,
+        description="Pass item pods only the keys their tasks read, instead of all data. The merge restores the other keys. Has no effect when a task takes **kwargs.",
+    )
+    offload_size: int | None = Field(
+        default=64 * 1024,
+        description="Store literal lists larger than this many bytes in a ConfigMap referenced by the manifest, instead of inline. None keeps lists inline.",
+    )
+    idempotent: bool = Field(
+        default=False,
+        description="The tasks of the items can run more than once for the same item without side effects. Required by `speculative_percentile` and `item_timeout`.",
+    )
+    speculative_percentile: float | None = Field(
+        default=None,
+        description="Run the items locally on a process pool of `processes`, starting a second attempt of an item that runs longer than `speculative_factor` times this percentile, e.g. 90, of the durations of completed items. The first result is kept and the other attempt is terminated.",
+    )
+    speculative_factor: float = Field(
+        default=2.0,
+        description="Multiple of the `speculative_percentile` duration beyond which an item is re-executed.",
+    )
+    item_timeout: int | None = Field(
+        default=None,
+        description="Seconds after which the pod of an item, or of a shard with `shard_size`, is stopped and retried on Argo, the counterpart of `speculative_percentile`. Retries follow `retry`, with at least one retry.",
+    )
+    _then: list[StepNode] = PrivateAttr(default_factory=list)
 
     def __init__(
         self,
-        task: ForeachTask | Callable | list[Any],
+        task: ForeachTask | Callable | list[Any] | range | Sequence,
         item_name: str = "item",
         **kwargs,
     ):
+        if isinstance(task, range):
+            task = Sequence.of(task)
         super().__init__(task=task, item_name=item_name, **kwargs)
+        if (
+            self.speculative_percentile is not None or self.item_timeout
+        ) and not self.idempotent:
+            raise ValueError(
+                "speculative_percentile and item_timeout re-execute items and require idempotent=True."
+            )
+
+    @classmethod
+    def sequence(
+        cls,
+        count: int | str,
+        start: int = 0,
+        step: int = 1,
+        item_name: str = "item",
+        **kwargs,
+    ) -> Foreach:
+        """
+        Iterate over `count` integers from `start`. `count` can be the name of a
+        parameter. The manifest has constant size regardless of the count.
+        """
+        return cls(
+            Sequence(count=count, start=start, step=step), item_name=item_name, **kwargs
+        )
 
     @property
     def task_name(self):
@@ -71,31 +206,65 @@ class Foreach(Node):
         else:
             return import_path(self.task)
 
+    def _memoize(self):
+        if not self.cache:
+            return None
+        code_hash = task_hash(self.task, self.task_name, self.task_module)
+        return memoize(code_hash, self.cache_max_age)
+
     def then(self, task: StepTask, **kwargs) -> Foreach:
-        """Set the task to execute for each item."""
-        if self._prev != "foreach":
-            raise RuntimeError(".then(...) must follow Foreach(...) ")
-        self._then = StepNode(task=task, **kwargs)
-        self._prev = "then"
+        """
+        Add a task to execute for each item. Repeated calls build a chain of tasks
+        that runs in sequence for each item within a single pod, passing the data
+        in memory. Only the result of the last task is merged.
+        """
+        self._then.append(StepNode(task=task, **kwargs))
         return self
 
-    def run(self, data: dict[str, Any]):
+    def _then_node(self) -> StepNode | StepChain:
+        if not self._then:
+            raise RuntimeError("Foreach(...) must be followed by .then(...)")
+        if len(self._then) == 1:
+            return self._then[0]
+        return StepChain(task=self._then)
+
+    def run(self, data: dict[str, Any], context: RunContext | None = None):
         """Run the Foreach-block locally"""
         logger.info("Running foreach loop")
 
         if callable(self.task):
-            items = run_foreach(self.task_name, self.task_module, data)
+            producer = self.task_name.lower().replace("_", "-")
+            with measure(context.sub(producer) if context else None):
+                items = run_foreach(self.task_name, self.task_module, data)
+        elif isinstance(self.task, Sequence):
+            items = self.task.items(data)
         elif isinstance(self.task, list):
             items = self.task
 
+        then = self._then_node()
+        item_context = context.sub(then.argo_name) if context else None
         results = []
+        if (self.processes or self.speculative_percentile is not None) and items:
+            with measure(item_context), span("items", processes=self.processes):
+                results = run_items(
+                    then.tasks,
+                    data,
+                    items,
+                    self.item_name,
+                    self.processes,
+                    self.speculative_percentile,
+                    self.speculative_factor,
+                )
+            items = []
         for i, item in enumerate(items):
             logger.info(f"Processing item {i}: {item}")
-            result = self._then.run(data, {self.item_name: item})
+            with span("item", index=i):
+                result = then.run(data, {self.item_name: item}, context=item_context)
             results.append(result)
 
         if results:
-            data = merge_foreach(results)
+            with measure(context.sub("merge") if context else None), span("merge"):
+                data = merge_foreach(results)
 
         logger.info("Foreach loop finished")
         return data
@@ -108,17 +277,28 @@ class Foreach(Node):
         default_secrets: list[str] | None,
         default_parameters: dict[str, Any],
         default_retry: int | RetryStrategy | None,
+        default_resources: Resources | None = None,
     ):
         """Returns a list with the configured templates (DAGTemplate and ScriptTemplates). @private"""
         block_name = f"step-{step_counter}-{self.argo_name}"
-        then_name = block_name + "-" + self._then.argo_name
+        then = self._then_node()
+        then_name = block_name + "-" + then.argo_name
+        if (self.shard_size or self.merge_group_size) and isinstance(
+            self.task, Sequence
+        ):
+            raise ValueError(
+                "Foreach over a range does not support shard_size or merge_group_size."
+            )
         merge_name = block_name + "-merge"
 
         templates = [self._get_dag(block_name, default_parameters)]
 
         if callable(self.task):
             foreach_name = block_name + "-" + self.task_name.lower().replace("_", "-")
-            script_source = f'from {run_foreach.__module__} import run_foreach\nrun_foreach("{self.task_name}", "{self.task_module}")'
+            options = f", shard_size={self.shard_size}" if self.shard_size else ""
+            if self.merge_group_size:
+                options += f", merge_group_size={self.merge_group_size}"
+            script_source = f'from {run_foreach.__module__} import run_foreach\nrun_foreach("{self.task_name}", "{self.task_module}"{options})'
             template = worker_template(
                 template_name=foreach_name,
                 script_source=script_source,
@@ -129,25 +309,50 @@ class Foreach(Node):
                 parallelism=None,
                 outpath="/tmp/foreach.json",
                 retry=self.retry or default_retry,
+                memoize=self._memoize(),
+                resources=merge_resources(default_resources, self.resources),
             )
             templates.append(template)
 
-        template = self._then.get_templates(
-            step_counter=step_counter,
-            default_image=default_image,
-            image_pull_policy=image_pull_policy,
-            default_secrets=default_secrets,
-            default_parameters=default_parameters,
-            default_retry=self.retry or default_retry,
-        )
-        template[0].name = then_name
-        template[0].script.env.append(
-            Parameter(
-                name="PARGO_ITEM",
-                value=f'{{"{self.item_name}": "{{{{inputs.parameters.item}}}}"}}',
+        if self.shard_size:
+            template = [
+                self._shard_template(
+                    then,
+                    then_name,
+                    default_image,
+                    image_pull_policy,
+                    default_secrets,
+                    default_parameters,
+                    self.retry or default_retry,
+                    default_resources,
+                )
+            ]
+        else:
+            template = then.get_templates(
+                step_counter=step_counter,
+                default_image=default_image,
+                image_pull_policy=image_pull_policy,
+                default_secrets=default_secrets,
+                default_parameters=default_parameters,
+                default_retry=self.retry or default_retry,
+                default_resources=default_resources,
+            )
+            rename_template(template[0], then_name)
+            template[0].script.env.append(
+                Parameter(
+                    name="PARGO_ITEM",
+                    value=f'{{"{self.item_name}": {{{{inputs.parameters.item}}}}}}',
+                )
             )
-        )
         template[0].inputs["parameters"].append(Parameter(name="item"))
+        if self.item_timeout:
+            template[0].activeDeadlineSeconds = self.item_timeout
+            strategy = template[0].retryStrategy or RetryStrategy(limit=1)
+            template[0].retryStrategy = strategy.model_copy(
+                update={"limit": max(strategy.limit, 1)}
+            )
+        if then.cache:
+            template[0].memoize = memoize(then.code_hash, then.cache_max_age, item=True)
         templates.extend(template)
 
         script_source = (
@@ -163,13 +368,143 @@ class Foreach(Node):
             parallelism=None,
             outpath="/tmp/data.json",
             retry=None,
+            resources=default_resources,
         )
+        if self._reads() is not None:
+            template.inputs["parameters"].append(Parameter(name="state"))
+            template.script.env.append(
+                Parameter(name="PARGO_STATE", value="{{inputs.parameters.state}}")
+            )
         templates.append(template)
 
+        if self.merge_group_size:
+            templates.append(self._get_tree_dag(block_name))
+            script_source = (
+                f"from {merge_partial.__module__} import merge_partial\nmerge_partial()"
+            )
+            template = worker_template(
+                template_name=block_name + "-merge-partial",
+                script_source=script_source,
+                parameters=default_parameters,
+                image=default_image,
+                image_pull_policy=image_pull_policy,
+                secrets=self.secrets or default_secrets,
+                parallelism=None,
+                outpath="/tmp/data.json",
+                retry=None,
+                resources=default_resources,
+            )
+            templates.append(template)
+
         return templates
 
+    def _shard_template(
+        self,
+        then: StepNode | StepChain,
+        then_name: str,
+        default_image: str,
+        image_pull_policy: str,
+        default_secrets: list[str] | None,
+        default_parameters: dict[str, Any],
+        default_retry: int | RetryStrategy | None,
+        default_resources: Resources | None,
+    ):
+        """ScriptTemplate running the tasks for a shard of items on a process pool."""
+        resources = merge_resources(default_resources, then.resources)
+        tasks = ", ".join(f'("{name}", "{module}")' for name, module in then.tasks)
+        processes = self.processes or cpu_request(resources)
+        script_source = (
+            f"from {run_shard.__module__} import run_shard\n"
+            f'run_shard([{tasks}], "{self.item_name}", processes={processes})'
+        )
+        template = worker_template(
+            template_name=then_name,
+            script_source=script_source,
+            parameters=default_parameters,
+            image=then.image or default_image,
+            image_pull_policy=image_pull_policy,
+            secrets=then.secrets or default_secrets,
+            parallelism=then.parallelism,
+            outpath="/tmp/data.json",
+            retry=then.retry or default_retry,
+            resources=resources,
+        )
+        template.script.env.append(
+            Parameter(name="PARGO_SHARD", value="{{inputs.parameters.item}}")
+        )
+        if self.shm_size:
+            template.volumes = [
+                Volume(
+                    name="dshm",
+                    emptyDir=EmptyDir(medium="Memory", sizeLimit=self.shm_size),
+                )
+            ]
+            template.script.volumeMounts = [
+                VolumeMount(name="dshm", mountPath="/dev/shm")
+            ]
+        return template
+
+    def _reads(self) -> set[str] | None:
+        """Keys passed to item pods. None when they get all data."""
+        if not self.project_inputs:
+            return None
+        reads = self._then_node().reads
+        return None if reads is None else reads - {self.item_name}
+
+    def _item_inputs(self) -> str:
+        """Inputs of the item pods, projected to the keys their tasks read."""
+        reads = self._reads()
+        if reads is None:
+            return "{{inputs.parameters.inputs}}"
+        keys = "".join(f', "{k}"' for k in sorted(reads))
+        return f"{{{{=toJSON(sprig.pick(fromJSON(inputs.parameters.inputs){keys}))}}}}"
+
+    def _merge_parameters(self, outputs: str) -> list[Parameter]:
+        """Arguments of the merge, with the carried state for projected inputs."""
+        parameters = [Parameter(name="inputs", value=outputs)]
+        if self._reads() is not None:
+            parameters.append(
+                Parameter(name="state", value="{{inputs.parameters.inputs}}")
+            )
+        return parameters
+
+    def _units(self) -> list[Any]:
+        """Items of a literal list as passed to the item tasks."""
+        if self.shard_size:
+            return shard(self.task, self.shard_size)
+        return [dumps(task) for task in self.task]
+
+    def _items_json(self) -> str:
+        """withParam of a literal list, nested for a tree merge."""
+        if self.merge_group_size:
+            return dumps(tree(self._units(), self.merge_group_size)[1])
+        return dumps(self._units())
+
+    def _offloaded_items(self) -> str | None:
+        """JSON of a literal list above `offload_size`, None when kept inline."""
+        if not isinstance(self.task, list) or self.offload_size is None:
+            return None
+        items = self._items_json()
+        return items if len(items.encode()) > self.offload_size else None
+
+    def config_map(self) -> ConfigMap | None:
+        """
+        ConfigMap holding a literal list above `offload_size`, named by its content.
+        Must be applied before the workflow is submitted.
+        """
+        items = self._offloaded_items()
+        if items is None:
+            return None
+        size = len(items.encode())
+        if size > MAX_CONFIG_MAP_BYTES:
+            raise ValueError(
+                f"Foreach list of {size} bytes exceeds the ConfigMap limit of {MAX_CONFIG_MAP_BYTES} bytes. Use a task producing the items instead."
+            )
+        name = f"pargo-items-{sha256(items.encode()).hexdigest()[:16]}"
+        return ConfigMap(metadata=Metadata(name=name), data={"items": items})
+
     def _get_dag(self, block_name: str, default_parameters: dict[str, Any]):
-        then_name = block_name + "-" + self._then.argo_name
+        then_name = block_name + "-" + self._then_node().argo_name
         merge_name = block_name + "-merge"
         default = ",".join(
             f'"{k}": {{{{workflow.parameters.{k}}}}}' for k in default_parameters
@@ -212,19 +547,75 @@ class Foreach(Node):
                 )
             )
             with_param = f"{{{{tasks.{foreach_name}.outputs.parameters.outputs}}}}"
+        elif config_map := self.config_map():
+            dag_template.inputs["parameters"].append(
+                Parameter(
+                    name="items",
+                    valueFrom={
+                        "configMapKeyRef": {
+                            "name": config_map.metadata.name,
+                            "key": "items",
+                        }
+                    },
+                )
+            )
+            with_param = "{{inputs.parameters.items}}"
         elif isinstance(self.task, list):
-            with_param = dumps([dumps(task) for task in self.task])
+            with_param = self._items_json()
         else:
             with_param = None
+        with_sequence = None
+        item = "{{item}}"
+        if isinstance(self.task, Sequence):
+            with_sequence = self.task.with_sequence()
+            item = self.task.item()
+
+        if self.merge_group_size:
+            tree_name = block_name + "-tree"
+            if callable(self.task):
+                produced = f"tasks['{foreach_name}'].outputs.parameters.outputs"
+                items = f"{{{{=toJSON(jsonpath({produced}, '$.items'))}}}}"
+                depth = f"{{{{=jsonpath({produced}, '$.depth')}}}}"
+            else:
+                items = with_param
+                depth = str(tree(self._units(), self.merge_group_size)[0])
+            parameters = [
+                Parameter(name="inputs", value=self._item_inputs()),
+                Parameter(name="items", value=items),
+                Parameter(name="depth", value=depth),
+            ]
+            dag_template.dag["tasks"].append(
+                Task(
+                    name=tree_name,
+                    template=tree_name,
+                    arguments={"parameters": parameters},
+                    when=f"{depth} > 0",
+                    depends=f"{foreach_name}.Succeeded"
+                    if callable(self.task)
+                    else None,
+                )
+            )
+            parameters = self._merge_parameters(
+                f"[{{{{tasks.{tree_name}.outputs.parameters.outputs}}}}]"
+            )
+            dag_template.dag["tasks"].append(
+                Task(
+                    name=merge_name,
+                    template=merge_name,
+                    arguments={"parameters": parameters},
+                    depends=f"{tree_name}.Succeeded",
+                )
+            )
+            return dag_template
 
         parameters = [
             Parameter(
                 name="inputs",
-                value="{{inputs.parameters.inputs}}",
+                value=self._item_inputs(),
             ),
             Parameter(
                 name="item",
-                value="{{item}}",
+                value=item,
             ),
         ]
         dag_template.dag["tasks"].append(
@@ -233,16 +624,14 @@ class Foreach(Node):
                 template=then_name,
                 arguments={"parameters": parameters},
                 withParam=with_param,
+                withSequence=with_sequence,
                 depends=f"{foreach_name}.Succeeded" if callable(self.task) else None,
             )
         )
 
-        parameters = [
-            Parameter(
-                name="inputs",
-                value=f"{{{{tasks.{then_name}.outputs.parameters.outputs}}}}",
-            )
-        ]
+        parameters = self._merge_parameters(
+            f"{{{{tasks.{then_name}.outputs.parameters.outputs}}}}"
+        )
         dag_template.dag["tasks"].append(
             Task(
                 name=merge_name,
@@ -253,3 +642,91 @@ class Foreach(Node):
         )
 
         return dag_template
+
+    def _get_tree_dag(self, block_name: str):
+        """
+        Recursive DAG merging the outputs of a nested list of items. At depth 1 it
+        runs the items, otherwise one sub-tree per group. Each level combines at most
+        `merge_group_size` outputs into a partial merge.
+        """
+        tree_name = block_name + "-tree"
+        then_name = block_name + "-" + self._then_node().argo_name
+        merge_name = block_name + "-merge-partial"
+        group_name = tree_name + "-group"
+        leaves = f"tasks['{then_name}'].outputs.parameters.outputs"
+        groups = f"tasks['{group_name}'].outputs.parameters.outputs"
+        empty = dumps(dumps({PARTIAL: {}}))
+        expression = (
+            f'tasks["{merge_name}"].status == "Succeeded" ? '
+            f'tasks["{merge_name}"].outputs.parameters.outputs : {empty}'
+        )
+        inputs = Parameter(name="inputs", value="{{inputs.parameters.inputs}}")
+        return DAGTemplate(
+            name=tree_name,
+            inputs={
+                "parameters": [
+                    Parameter(name="inputs"),
+                    Parameter(name="items"),
+                    Parameter(name="depth"),
+                ]
+            },
+            dag={
+                "tasks": [
+                    Task(
+                        name=group_name,
+                        template=tree_name,
+                        arguments={
+                            "parameters": [
+                                inputs,
+                                Parameter(name="items", value="{{item}}"),
+                                Parameter(
+                                    name="depth",
+                                    value="{{=asInt(inputs.parameters.depth) - 1}}",
+                                ),
+                            ]
+                        },
+                        withParam="{{inputs.parameters.items}}",
+                        when="{{inputs.parameters.depth}} > 1",
+                    ),
+                    Task(
+                        name=then_name,
+                        template=then_name,
+                        arguments={
+                            "parameters": [
+                                inputs,
+                                Parameter(name="item", value="{{item}}"),
+                            ]
+                        },
+                        withParam="{{inputs.parameters.items}}",
+                        when="{{inputs.parameters.depth}} == 1",
+                    ),
+                    Task(
+                        name=merge_name,
+                        template=merge_name,
+                        arguments={
+                            "parameters": [
+                                Parameter(
+                                    name="inputs",
+                                    value=f'{{{{=inputs.parameters.depth == "1" ? {leaves} : {groups}}}}}',
+                                )
+                            ]
+                        },
+                        depends=f"{then_name}.Succeeded || {group_name}.Succeeded",
+                    ),
+                ]
+            },
+            outputs={
+                "parameters": [
+                    Parameter(name="outputs", valueFrom={"expression": expression})
+                ]
+            },
+        )
+
+
+def cpu_request(resources: Resources | None) -> int | None:
+    """Whole number of CPUs requested, rounded up, e.g. 2 for `1500m`."""
+    cpu = ((resources and resources.requests) or {}).get("cpu")
+    if cpu is None:
+        return None
+    cores = int(cpu[:-1]) / 1000 if cpu.endswith("m") else float(cpu)
+    return max(1, ceil(cores))
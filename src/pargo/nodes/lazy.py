@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import ast
+import sys
+from contextlib import contextmanager
+from functools import cached_property
+from importlib import import_module
+from importlib.abc import Loader, MetaPathFinder
+from importlib.machinery import ModuleSpec, PathFinder
+from inspect import Parameter, Signature
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+
+def find_source(module: str) -> Path | None:
+    """Source file of a module, found without importing it or its parent packages."""
+    spec, search = None, None
+    parts = module.split(".")
+    for ind in range(len(parts)):
+        spec = PathFinder.find_spec(".".join(parts[: ind + 1]), search)
+        if spec is None:
+            return None
+        search = spec.submodule_search_locations
+    if spec is None or not spec.origin or not spec.origin.endswith(".py"):
+        return None
+    return Path(spec.origin)
+
+
+class LazyTask:
+    """
+    Reference to a task by module and name. The module is imported when the task
+    is called, while the name, signature and source are read from the source file.
+    Use it to define workflows without importing heavy task dependencies, e.g.
+    `LazyTask.of("mypackage.tasks:train")`.
+    """
+
+    def __init__(self, module: str, name: str):
+        self.__module__ = module
+        self.__name__ = name
+        self.__qualname__ = name
+
+    @classmethod
+    def of(cls, path: str) -> LazyTask:
+        """Task from an import path `module:name`."""
+        module, _, name = path.partition(":")
+        return cls(module, name)
+
+    def __repr__(self):
+        return f"LazyTask({self.__module__}:{self.__name__})"
+
+    def __getattr__(self, name: str) -> LazyTask:
+        # Attribute of a lazily imported module, e.g. `tasks.train`
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return LazyTask(f"{self.__module__}.{self.__name__}", name)
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def resolve(self):
+        """Import the module and return the task."""
+        return getattr(import_module(self.__module__), self.__name__)
+
+    @cached_property
+    def _lines(self) -> list[str]:
+        file = find_source(self.__module__)
+        return file.read_text().splitlines(keepends=True) if file else []
+
+    @cached_property
+    def module_tree(self) -> ast.Module | None:
+        """Syntax tree of the module."""
+        try:
+            return ast.parse("".join(self._lines))
+        except SyntaxError:
+            return None
+
+    @cached_property
+    def definition(self) -> ast.FunctionDef | ast.AsyncFunctionDef | None:
+        """Syntax tree of the task function. None when not found in the module."""
+        if self.module_tree is None:
+            return None
+        for node in self.module_tree.body:
+            if (
+                isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+                and node.name == self.__name__
+            ):
+                return node
+        return None
+
+    @cached_property
+    def source(self) -> str:
+        """Source of the task function, as returned by `inspect.getsource`."""
+        func = self.definition
+        if func is None:
+            return ""
+        start = min([func.lineno] + [d.lineno for d in func.decorator_list])
+        return "".join(self._lines[start - 1 : func.end_lineno])
+
+    @cached_property
+    def __signature__(self) -> Signature:
+        func = self.definition
+        if func is None:
+            return Signature(
+                [
+                    Parameter("args", Parameter.VAR_POSITIONAL),
+                    Parameter("kwargs", Parameter.VAR_KEYWORD),
+                ]
+            )
+        args = func.args
+        positional = args.posonlyargs + args.args
+        defaults = [Parameter.empty] * (len(positional) - len(args.defaults))
+        defaults += [...] * len(args.defaults)
+        parameters = [
+            Parameter(
+                a.arg,
+                Parameter.POSITIONAL_ONLY
+                if a in args.posonlyargs
+                else Parameter.POSITIONAL_OR_KEYWORD,
+                default=default,
+            )
+            for a, default in zip(positional, defaults)
+        ]
+        if args.vararg:
+            parameters.append(Parameter(args.vararg.arg, Parameter.VAR_POSITIONAL))
+        parameters += [
+            Parameter(
+                a.arg,
+                Parameter.KEYWORD_ONLY,
+                default=Parameter.empty if d is None else ...,
+            )
+            for a, d in zip(args.kwonlyargs, args.kw_defaults)
+        ]
+        if args.kwarg:
+            parameters.append(Parameter(args.kwarg.arg, Parameter.VAR_KEYWORD))
+        return Signature(parameters)
+
+
+class _StubModule(ModuleType):
+    """Module whose attributes are lazy references to its tasks."""
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return LazyTask(self.__name__, name)
+
+
+class _StubFinder(MetaPathFinder, Loader):
+    def __init__(self, eager: set[str]):
+        self.eager = eager
+        self.stubs: list[str] = []
+
+    def find_spec(self, fullname, path, target=None):
+        top = fullname.partition(".")[0]
+        if top in self.eager or top in sys.stdlib_module_names:
+            return None
+        return ModuleSpec(fullname, self, is_package=True)
+
+    def create_module(self, spec):
+        self.stubs.append(spec.name)
+        module = _StubModule(spec.name)
+        module.__path__ = []
+        return module
+
+    def exec_module(self, module):
+        pass
+
+
+@contextmanager
+def lazy_imports(eager: list[str] | None = None):
+    """
+    Replace imports of modules that are not yet imported, not in the standard
+    library and not in `eager` with stubs, whose attributes are LazyTasks.
+    """
+    loaded = {name.partition(".")[0] for name in sys.modules}
+    finder = _StubFinder(loaded | {"pargo", *(eager or [])})
+    sys.meta_path.insert(0, finder)
+    try:
+        yield
+    finally:
+        sys.meta_path.remove(finder)
+        for name in finder.stubs:
+            sys.modules.pop(name, None)
@@ -0,0 +1,41 @@
+from collections.abc import Callable
+from hashlib import sha256
+from inspect import getsource, unwrap
+
+from ..argo_types.workflows import Cache, Memoize
+from .lazy import LazyTask
+
+CACHE_CONFIG_MAP = "pargo-memoize-cache"
+
+DEFAULT_MAX_AGE = "8760h"
+"""Maximum age of cached results when none is given, as Argo requires one."""
+
+
+def task_hash(task: Callable, task_name: str, task_module: str) -> str:
+    """Short hash of the import path and source code of a task."""
+    if isinstance(task, LazyTask):
+        source = task.source
+    else:
+        try:
+            source = getsource(unwrap(task))
+        except (OSError, TypeError):
+            source = ""
+    digest = sha256(f"{task_module}:{task_name}\n{source}".encode())
+    return digest.hexdigest()[:16]
+
+
+def memoize(code_hash: str, max_age: str | None = None, item: bool = False) -> Memoize:
+    """
+    Argo memoization keyed by a hash of the task code and the template inputs.
+    Items of Foreach-blocks are part of the key when `item` is True. Without
+    `max_age`, results are cached for `DEFAULT_MAX_AGE`.
+    """
+    inputs = "inputs.parameters.inputs"
+    if item:
+        inputs += " + inputs.parameters.item"
+    key = f"{code_hash}-{{{{=sprig.sha256sum({inputs})}}}}"
+    return Memoize(
+        key=key,
+        maxAge=max_age or DEFAULT_MAX_AGE,
+        cache=Cache(configMap={"name": CACHE_CONFIG_MAP}),
+    )
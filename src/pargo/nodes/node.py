@@ -11,5 +11,5 @@ class Node(BaseModel):
     def get_templates(self, **kwargs) -> tuple:
         raise NotImplementedError
 
-    def run(self):
+    def run(self, data: dict[str, Any], context: Any = None) -> dict[str, Any]:
         raise NotImplementedError
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import gzip
+from base64 import b64decode, b64encode
+from json import dumps, loads
+from typing import Any, Literal
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency, pip install pargo[zstd]
+    zstandard = None
+
+Compression = Literal["gzip", "zstd"]
+
+FRAME = "pargo:"
+"""Prefix of compressed payloads, `pargo:<compression>:<base64>`."""
+
+
+def compress(raw: bytes, compression: Compression) -> bytes:
+    if compression == "gzip":
+        # Fixed mtime keeps payloads, and memoization keys derived from them, stable
+        return gzip.compress(raw, mtime=0)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd compression requires `pip install zstandard`")
+        return zstandard.ZstdCompressor().compress(raw)
+    raise ValueError(f"Unknown compression {compression!r}")
+
+
+def decompress(raw: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        return gzip.decompress(raw)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError(
+                "zstd compressed payload requires `pip install zstandard`"
+            )
+        return zstandard.ZstdDecompressor().decompress(raw)
+    raise ValueError(f"Unknown compression {compression!r}")
+
+
+def encode(data: Any, compression: Compression | None = None) -> str:
+    """
+    JSON of `data`. With `compression`, a compressed frame when it is smaller. The
+    frame is itself a JSON string, so it passes through Argo expressions and the
+    aggregated outputs of fanned out tasks unchanged.
+    """
+    text = dumps(data)
+    if compression is None:
+        return text
+    payload = b64encode(compress(text.encode(), compression)).decode()
+    framed = dumps(f"{FRAME}{compression}:{payload}")
+    return framed if len(framed) < len(text) else text
+
+
+def _unframe(value: Any) -> Any:
+    if isinstance(value, str) and value.startswith(FRAME):
+        compression, _, payload = value[len(FRAME) :].partition(":")
+        return loads(decompress(b64decode(payload), compression))
+    return value
+
+
+def decode(text: str) -> Any:
+    """
+    Inverse of `encode`. Frames among the elements of a list, like aggregated
+    outputs, or among the values of a dict, like items, are decoded as well.
+    """
+    value = _unframe(loads(text))
+    if isinstance(value, list):
+        return [_unframe(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _unframe(v) for k, v in value.items()}
+    return value
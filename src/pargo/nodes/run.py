@@ -1,14 +1,35 @@
 from __future__ import annotations
 
+import sys
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from copy import deepcopy
+from datetime import datetime, timezone
+from functools import partial
 from importlib import import_module
-from inspect import signature
+from inspect import Parameter, signature
 from json import dumps, loads
-from os import environ
+from math import ceil
+from multiprocessing import get_context
+from multiprocessing.connection import Connection, wait
+from os import cpu_count, environ, times
 from pathlib import Path
+from pickle import PicklingError
+from time import perf_counter, thread_time
 from typing import Any
+from uuid import uuid4
 
 from loguru import logger
+from pydantic import BaseModel, Field
+
+from ..tracing import set_traceparent, span, traced, traceparent
+from .payload import Compression, decode, encode
+
+try:
+    from resource import RUSAGE_CHILDREN, RUSAGE_SELF, getrusage
+except ImportError:  # Not available on Windows
+    getrusage = None
 
 
 def run(
@@ -18,18 +39,26 @@ def run(
     item: dict[str, Any] = {},
 ):
     logger.info(f"Running task {task_name} from {module_name}")
-    module = import_module(module_name)
-    func = getattr(module, task_name)
+    with span("task", task=task_name, module=module_name):
+        module = import_module(module_name)
+        func = getattr(module, task_name)
 
-    sig = signature(func)
-    inputs = {k: v for k, v in {**data, **item}.items() if k in sig.parameters}
-    result = func(**inputs)
+        sig = signature(func)
+        inputs = {k: v for k, v in {**data, **item}.items() if k in sig.parameters}
+        result = func(**inputs)
     return result
 
 
-def load_item():
-    item = loads(environ.pop("PARGO_ITEM", "{}"))
-    return {k: loads(v) for k, v in item.items()}
+def read_keys(func) -> set[str] | None:
+    """Keys of the data `func` reads, its parameters. None when it takes **kwargs."""
+    parameters = signature(func).parameters.values()
+    if any(p.kind == Parameter.VAR_KEYWORD for p in parameters):
+        return None
+    return {p.name for p in parameters}
+
+
+def load_item(env: Mapping[str, str] = environ):
+    return decode(env.get("PARGO_ITEM", "{}"))
 
 
 def pargo_path():
@@ -38,18 +67,151 @@ def pargo_path():
     return pargo_path
 
 
+def new_run_id():
+    """Sortable and unique id of a run."""
+    now = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    return f"{now}-{uuid4().hex[:8]}"
+
+
+class RunContext(BaseModel):
+    """
+    Context of a single run. Holds the state directory and, for remote execution,
+    the inputs of the task. Passed explicitly so that concurrent runs never share
+    state through the process environment.
+    """
+
+    run_id: str = Field(default_factory=new_run_id)
+    path: Path = Field(default_factory=pargo_path)
+    data: Any = None
+    item: dict[str, Any] = {}
+    items: list[Any] | None = None
+    state: dict[str, Any] | None = None
+    compression: Compression | None = None
+    step: str | None = None
+    metrics: list[dict[str, Any]] = []
+
+    @classmethod
+    def new(cls, name: str, run_id: str | None = None) -> RunContext:
+        """Create a context with its own state directory `<PARGO_DIR>/<name>/<run_id>`."""
+        run_id = run_id or new_run_id()
+        path = pargo_path() / name / run_id
+        path.mkdir(exist_ok=True, parents=True)
+        return cls(run_id=run_id, path=path)
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str] = environ) -> RunContext:
+        """Read the context of a remote task from the environment without modifying it."""
+        with span("deserialize"):
+            return cls(
+                run_id=env.get("PARGO_RUN_ID", "remote"),
+                path=Path(env.get("PARGO_DIR", Path.cwd() / ".pargo")),
+                data=decode(env["PARGO_DATA"]),
+                item=load_item(env),
+                items=loads(env["PARGO_SHARD"]) if "PARGO_SHARD" in env else None,
+                state=decode(env["PARGO_STATE"]) if "PARGO_STATE" in env else None,
+                compression=env.get("PARGO_COMPRESSION") or None,
+                step=env.get("PARGO_STEP") or None,
+            )
+
+    def for_step(self, step: str) -> RunContext:
+        """Context for a step of the run. Shares state directory and metrics."""
+        return self.model_copy(update={"step": step})
+
+    def sub(self, suffix: str) -> RunContext:
+        """Context for a part of the current step, named like its Argo template."""
+        return self.for_step(f"{self.step}-{suffix}")
+
+    def write(self, filename: str, data: Any, compress: bool = False):
+        """
+        Write JSON data to the state directory. With `compress`, the data is
+        compressed with `compression`, when set and smaller.
+        """
+        with span("serialize", file=filename):
+            text = encode(data, self.compression if compress else None)
+        with span("state.write", file=filename):
+            self.path.mkdir(exist_ok=True, parents=True)
+            (self.path / filename).write_text(text)
+
+    def read(self, filename: str):
+        """Read JSON data from the state directory."""
+        with span("state.read", file=filename):
+            text = (self.path / filename).read_text()
+        with span("deserialize", file=filename):
+            return loads(text)
+
+
+def cpu_seconds(thread: bool = False) -> float:
+    """CPU time of the process, or of the calling thread, and its waited-for children."""
+    t = times()
+    own = thread_time() if thread else t.user + t.system
+    return own + t.children_user + t.children_system
+
+
+def peak_rss(who: int | None = None) -> int | None:
+    """
+    Peak resident set size in bytes over the lifetime of the process and its
+    waited-for children, or of `who` only, e.g. `RUSAGE_CHILDREN`.
+    """
+    if getrusage is None:
+        return None
+    whos = [RUSAGE_SELF, RUSAGE_CHILDREN] if who is None else [who]
+    rss = max(getrusage(w).ru_maxrss for w in whos)
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+@contextmanager
+def measure(context: RunContext | None, name: str | None = None, process=False):
+    """
+    Record duration, CPU seconds and peak RSS of the block in `context.metrics`,
+    named after the template of `context.step`, or `name` when it is not set.
+    With `process`, for pods running a single step, the lifetime counters of the
+    process are used. Otherwise, in local runs, CPU seconds are those of the calling
+    thread and of the child processes waited for, and the peak RSS is only recorded
+    when the block raised the lifetime peak of the process or its children. Blocks
+    staying below an earlier peak have no peak RSS, and blocks running alongside
+    others, e.g. in parallel stages, may be charged with their memory.
+    """
+    if context is None:
+        yield
+        return
+    start_peaks = (
+        [peak_rss(RUSAGE_SELF), peak_rss(RUSAGE_CHILDREN)] if getrusage else []
+    )
+    start, start_cpu = perf_counter(), cpu_seconds(thread=not process)
+    yield
+    duration, cpu = perf_counter() - start, cpu_seconds(thread=not process) - start_cpu
+    if process or getrusage is None:
+        rss = peak_rss()
+    else:
+        # Lifetime peaks that grew during the block were reached in the block
+        peaks = [peak_rss(RUSAGE_SELF), peak_rss(RUSAGE_CHILDREN)]
+        rss = max((p for p, s in zip(peaks, start_peaks) if p > s), default=None)
+    context.metrics.append(
+        {
+            "name": context.step or name,
+            "duration": duration,
+            "cpu_seconds": cpu,
+            "peak_rss": rss,
+        }
+    )
+
+
+@traced
 def run_step(
     task_name: str,
     module_name: str,
     data: dict[str, Any] | None = None,
     item: dict[str, Any] = {},
+    context: RunContext | None = None,
 ):
     remote = True if data is None else False
     if remote:
-        data = loads(environ.pop("PARGO_DATA"))
-        item = load_item()
+        context = context or RunContext.from_env()
+        data = context.data
+        item = context.item
 
-    result = run(task_name, module_name, data, item)
+    with measure(context if remote else None, task_name, process=True):
+        result = run(task_name, module_name, data, item)
     result = {} if result is None else result
     if not isinstance(result, dict):
         raise ValueError(
@@ -59,16 +221,24 @@ def run_step(
     data.update(result)
     logger.info(f"Data passed to next step: {dumps(data)}")
     if remote:
-        data_path = pargo_path() / "data.json"
-        data_path.write_text(dumps(data))
+        context.write("data.json", data, compress=True)
+        context.write("metrics.json", context.metrics)
     return data
 
 
-def run_when(task_name: str, module_name: str, data: dict[str, Any] | None = None):
+@traced
+def run_when(
+    task_name: str,
+    module_name: str,
+    data: dict[str, Any] | None = None,
+    context: RunContext | None = None,
+):
     remote = True if data is None else False
     if remote:
-        data = loads(environ.pop("PARGO_DATA"))
-    result = run(task_name, module_name, data)
+        context = context or RunContext.from_env()
+        data = context.data
+    with measure(context if remote else None, task_name, process=True):
+        result = run(task_name, module_name, data)
 
     if not isinstance(result, bool):
         raise ValueError(
@@ -76,16 +246,26 @@ def run_when(task_name: str, module_name: str, data: dict[str, Any] | None = Non
         )
 
     if remote:
-        when_path = pargo_path() / "when.json"
-        when_path.write_text(dumps(result))
+        context.write("when.json", result)
+        context.write("metrics.json", context.metrics)
     return result
 
 
-def run_foreach(task_name: str, module_name: str, data: dict[str, Any] | None = None):
+@traced
+def run_foreach(
+    task_name: str,
+    module_name: str,
+    data: dict[str, Any] | None = None,
+    context: RunContext | None = None,
+    shard_size: int | None = None,
+    merge_group_size: int | None = None,
+):
     remote = True if data is None else False
     if remote:
-        data = loads(environ.pop("PARGO_DATA"))
-    result = run(task_name, module_name, data)
+        context = context or RunContext.from_env()
+        data = context.data
+    with measure(context if remote else None, task_name, process=True):
+        result = run(task_name, module_name, data)
 
     if not isinstance(result, list):
         raise ValueError(
@@ -93,27 +273,308 @@ def run_foreach(task_name: str, module_name: str, data: dict[str, Any] | None =
         )
 
     if remote:
-        result = [dumps(r) for r in result]
-        foreach_path = pargo_path() / "foreach.json"
-        foreach_path.write_text(dumps(result))
+        if shard_size:
+            result = shard(result, shard_size)
+        else:
+            result = [encode(r, context.compression) for r in result]
+        if merge_group_size:
+            depth, nested = tree(result, merge_group_size)
+            result = {"depth": depth, "items": nested}
+        context.write("foreach.json", result)
+        context.write("metrics.json", context.metrics)
     return result
 
 
-def merge_foreach(data: list[dict[str, Any]] | None = None):
+PARTIAL = "__pargo_partial__"
+
+
+def partial_merge(data: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Combine item results and earlier partial merges into a partial merge, holding
+    the values of each key in item order. Partial merges can be combined in any
+    grouping before the final merge.
+    """
+    merged: dict[str, list[Any]] = {}
+    for d in data:
+        if PARTIAL in d:
+            for k, vals in d[PARTIAL].items():
+                merged.setdefault(k, []).extend(vals)
+        else:
+            for k, v in d.items():
+                merged.setdefault(k, []).append(v)
+    return {PARTIAL: merged}
+
+
+@traced
+def merge_partial(
+    data: list[dict[str, Any]] | None = None, context: RunContext | None = None
+):
+    """Combine a group of item results or partial merges into a partial merge."""
+    remote = data is None
+    if remote:
+        context = context or RunContext.from_env()
+        data = context.data
+
+    with measure(context if remote else None, "merge", process=True):
+        merged = partial_merge(data)
+
+    if remote:
+        context.write("data.json", merged, compress=True)
+        context.write("metrics.json", context.metrics)
+    return merged
+
+
+def tree(items: list[Any], group_size: int) -> tuple[int, list[Any]]:
+    """
+    Nest items in groups of at most `group_size`, until the top level has at most
+    `group_size` entries. Returns the depth, 0 for no items, and the nested items.
+    """
+    if not items:
+        return 0, []
+    depth, nested = 1, items
+    while len(nested) > group_size:
+        depth, nested = depth + 1, shard(nested, group_size)
+    return depth, nested
+
+
+@traced
+def merge_foreach(
+    data: list[dict[str, Any]] | None = None, context: RunContext | None = None
+):
     remote = True if data is None else False
     if remote:
-        data = loads(environ.pop("PARGO_DATA"))
+        context = context or RunContext.from_env()
+        data = context.data
 
-    merged = {}
-    for d in data:
-        for k, v in d.items():
-            merged.setdefault(k, []).append(v)
+    with measure(context if remote else None, "merge", process=True):
+        merged = partial_merge(data)[PARTIAL]
+        for k, vals in merged.items():
+            if all(v == vals[0] for v in vals):
+                merged[k] = vals[0]
+        if remote and context.state is not None:
+            # Item pods received projected inputs, restore the carried state
+            merged = {**context.state, **merged}
+
+    if remote:
+        context.write("data.json", merged, compress=True)
+        context.write("metrics.json", context.metrics)
+    return merged
+
+
+@traced
+def run_steps(
+    tasks: list[tuple[str, str]],
+    data: dict[str, Any] | None = None,
+    item: dict[str, Any] | None = None,
+    context: RunContext | None = None,
+):
+    """
+    Run (task_name, module_name) tasks in sequence, keeping intermediate data in
+    memory. Remote runs record one metric for the whole chain, as for its pod.
+    """
+    remote = data is None
+    if remote:
+        context = context or RunContext.from_env()
+        data = context.data
+        item = context.item
+    item = item or {}
+
+    name = "+".join(task_name for task_name, _ in tasks)
+    with measure(context if remote else None, name, process=True):
+        for ind, (task_name, module_name) in enumerate(tasks):
+            logger.info(f"Step {ind + 1}/{len(tasks)} {task_name} started")
+            start = perf_counter()
+            data = run_step(task_name, module_name, data, item)
+            duration = perf_counter() - start
+            logger.info(
+                f"Step {ind + 1}/{len(tasks)} {task_name} finished in {duration:.3f}s"
+            )
+
+    if remote:
+        context.write("data.json", data, compress=True)
+        context.write("metrics.json", context.metrics)
+    return data
+
+
+def shard(items: list[Any], shard_size: int) -> list[list[Any]]:
+    """Split items into lists of at most `shard_size` items."""
+    return [items[i : i + shard_size] for i in range(0, len(items), shard_size)]
+
+
+def available_cpus() -> int:
+    """Number of CPUs available to the process."""
+    try:
+        from os import sched_getaffinity
+
+        return len(sched_getaffinity(0))
+    except ImportError:  # Not available on Windows and macOS
+        return cpu_count() or 1
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of `values`."""
+    values = sorted(values)
+    return values[max(0, ceil(q / 100 * len(values)) - 1)]
+
+
+def run_items(
+    tasks: list[tuple[str, str]],
+    data: dict[str, Any],
+    items: list[Any],
+    item_name: str,
+    processes: int | None = None,
+    speculative_percentile: float | None = None,
+    speculative_factor: float = 2.0,
+) -> list[dict[str, Any]]:
+    """
+    Run the tasks for each item on a pool of `processes` processes. With
+    `speculative_percentile`, slow items are re-executed, see `run_speculative`.
+    """
+    processes = min(processes or available_cpus(), len(items)) or 1
+    logger.info(f"Running {len(items)} items on {processes} processes")
+    if speculative_percentile is not None:
+        return run_speculative(
+            tasks,
+            data,
+            [{item_name: item} for item in items],
+            processes,
+            speculative_percentile,
+            speculative_factor,
+        )
+    run_item = partial(run_steps, tasks, data)
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=set_traceparent,
+        initargs=(traceparent(),),
+    ) as pool:
+        return list(pool.map(run_item, [{item_name: item} for item in items]))
+
+
+def _attempt(
+    sender: Connection,
+    tasks: list[tuple[str, str]],
+    data: dict[str, Any],
+    item: dict[str, Any],
+    parent: str | None,
+):
+    set_traceparent(parent)
+    try:
+        sender.send((True, run_steps(tasks, data, item)))
+    except Exception as e:  # noqa: BLE001 - raised again in the parent process
+        try:
+            sender.send((False, e))
+        except (PicklingError, TypeError, AttributeError):  # Unpicklable exception
+            sender.send((False, RuntimeError(repr(e))))
+    finally:
+        sender.close()
+
+
+def run_speculative(
+    tasks: list[tuple[str, str]],
+    data: dict[str, Any],
+    items: list[dict[str, Any]],
+    processes: int,
+    q: float,
+    factor: float = 2.0,
+) -> list[dict[str, Any]]:
+    """
+    Run the tasks for each item with up to `processes` attempts at a time, each in
+    its own process. Once all items started, an item running longer than `factor`
+    times the `q`-th percentile of the durations of completed items gets a second
+    attempt on a free process. The first result is kept and the other attempt is
+    terminated, so the tasks must be idempotent.
+    """
+    mp = get_context()
+    parent = traceparent()
+    results: dict[int, dict[str, Any]] = {}
+    durations: list[float] = []
+    attempts = [0] * len(items)
+    queued = list(range(len(items)))
+    running: dict[Connection, tuple[int, Any, float]] = {}
+
+    def start(index: int):
+        receiver, sender = mp.Pipe(duplex=False)
+        process = mp.Process(
+            target=_attempt, args=(sender, tasks, data, items[index], parent)
+        )
+        process.start()
+        sender.close()
+        running[receiver] = (index, process, perf_counter())
+        attempts[index] += 1
+
+    def stop(receiver: Connection):
+        _, process, _ = running.pop(receiver)
+        process.terminate()
+        process.join()
+        receiver.close()
+
+    try:
+        while len(results) < len(items):
+            while queued and len(running) < processes:
+                start(queued.pop(0))
+            if not queued and durations:
+                threshold = factor * percentile(durations, q)
+                now = perf_counter()
+                for index, _, started in list(running.values()):
+                    if len(running) >= processes:
+                        break
+                    if attempts[index] == 1 and now - started > threshold:
+                        logger.info(
+                            f"Item {index} is running for {now - started:.1f}s, over {threshold:.1f}s, starting a speculative attempt"
+                        )
+                        start(index)
+            for receiver in wait(list(running), timeout=0.05):
+                index, process, started = running.pop(receiver)
+                try:
+                    succeeded, value = receiver.recv()
+                except EOFError:
+                    succeeded, value = (
+                        False,
+                        RuntimeError(
+                            f"Process of item {index} exited with code {process.exitcode}"
+                        ),
+                    )
+                receiver.close()
+                process.join()
+                others = [r for r, (i, _, _) in running.items() if i == index]
+                if succeeded:
+                    results[index] = value
+                    durations.append(perf_counter() - started)
+                    for other in others:
+                        logger.info(f"Item {index} completed, cancelling other attempt")
+                        stop(other)
+                elif not others:
+                    raise value
+    finally:
+        for receiver in list(running):
+            stop(receiver)
+    return [results[ind] for ind in range(len(items))]
+
+
+@traced
+def run_shard(
+    tasks: list[tuple[str, str]],
+    item_name: str,
+    data: dict[str, Any] | None = None,
+    items: list[Any] | None = None,
+    context: RunContext | None = None,
+    processes: int | None = None,
+):
+    """
+    Run the tasks for a shard of items on a pool of `processes` processes, the
+    available CPUs by default, and merge the results in-pod.
+    """
+    remote = data is None
+    if remote:
+        context = context or RunContext.from_env()
+        data = context.data
+        items = context.items
 
-    for k, vals in merged.items():
-        if all(v == vals[0] for v in vals):
-            merged[k] = vals[0]
+    with measure(context if remote else None, "shard", process=True):
+        results = run_items(tasks, data, items, item_name, processes)
+        merged = partial_merge(results)
 
     if remote:
-        data_path = pargo_path() / "data.json"
-        data_path.write_text(dumps(merged))
+        context.write("data.json", merged, compress=True)
+        context.write("metrics.json", context.metrics)
     return merged
@@ -4,11 +4,12 @@ from typing import Any, Callable
 
 from pydantic import Field
 
-from ..argo_types.workflows import RetryStrategy
+from ..argo_types.workflows import Resources, RetryStrategy
 from .import_path import import_path
+from .memoize import memoize, task_hash
 from .node import Node
-from .run import run_step
-from .worker_template import worker_template
+from .run import RunContext, measure, read_keys, run_step
+from .worker_template import merge_resources, worker_template
 
 StepTask = Callable[..., None | dict]
 
@@ -29,6 +30,18 @@ class StepNode(Node):  # FIXME Rename to Step to be consitent with When, Foreach
     retry: int | RetryStrategy | None = Field(
         default=None, description="Overwrite workflow retry for the StepTask"
     )
+    resources: Resources | None = Field(
+        default=None,
+        description="Overwrite workflow resource requests and limits for the StepTask. Merged per key with the workflow defaults.",
+    )
+    cache: bool = Field(
+        default=False,
+        description="Memoize the step on Argo. The cache key is derived from the task code and inputs.",
+    )
+    cache_max_age: str | None = Field(
+        default=None,
+        description="Maximum age of cached results, e.g. '24h'. Default (None) is one year, since Argo requires a maximum age.",
+    )
 
     @property
     def task_name(self):
@@ -48,14 +61,35 @@ class StepNode(Node):  # FIXME Rename to Step to be consitent with When, Foreach
         else:
             return import_path(self.task)
 
-    def run(self, data: dict[str, Any], item: dict[str, Any] = {}):
+    @property
+    def tasks(self):
+        """List of (task_name, task_module) to run."""
+        return [(self.task_name, self.task_module)]
+
+    @property
+    def reads(self) -> set[str] | None:
+        """Keys of the data the task reads. None when it reads all."""
+        return read_keys(self.task)
+
+    @property
+    def code_hash(self):
+        """Hash of the task code."""
+        return task_hash(self.task, self.task_name, self.task_module)
+
+    def run(
+        self,
+        data: dict[str, Any],
+        item: dict[str, Any] = {},
+        context: RunContext | None = None,
+    ):
         """Run the step locally"""
-        result = run_step(
-            self.task_name,
-            self.task_module,
-            data,
-            item,
-        )
+        with measure(context):
+            result = run_step(
+                self.task_name,
+                self.task_module,
+                data,
+                item,
+            )
         return result
 
     def get_templates(
@@ -66,6 +100,7 @@ class StepNode(Node):  # FIXME Rename to Step to be consitent with When, Foreach
         default_secrets: list[str] | None,
         default_parameters: dict[str, Any],
         default_retry: int | RetryStrategy | None,
+        default_resources: Resources | None = None,
     ):
         """Returns a single item list with the configures ScriptTemplate @private"""
         template_name = f"step-{step_counter}-{self.argo_name}"
@@ -81,6 +116,8 @@ class StepNode(Node):  # FIXME Rename to Step to be consitent with When, Foreach
             parallelism=self.parallelism,
             outpath="/tmp/data.json",
             retry=self.retry or default_retry,
+            memoize=memoize(self.code_hash, self.cache_max_age) if self.cache else None,
+            resources=merge_resources(default_resources, self.resources),
         )
 
         return [template]
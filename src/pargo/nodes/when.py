@@ -6,15 +6,18 @@ from pydantic import Field
 
 from ..argo_types.workflows import (
     Parameter,
+    Resources,
     RetryStrategy,
     StepsTemplate,
     Task,
 )
+from ..tracing import span
 from .import_path import import_path
+from .memoize import memoize, task_hash
 from .node import Node
-from .run import run_when
+from .run import RunContext, measure, run_when
 from .step import StepNode, StepTask
-from .worker_template import worker_template
+from .worker_template import merge_resources, rename_template, worker_template
 
 WhenTask = Callable[..., bool]
 
@@ -34,6 +37,18 @@ class When(Node):
     retry: int | RetryStrategy | None = Field(
         default=None, description="Overwrite workflow retry for the WhenTesk"
     )
+    resources: Resources | None = Field(
+        default=None,
+        description="Overwrite workflow resource requests and limits for the WhenTask. Merged per key with the workflow defaults.",
+    )
+    cache: bool = Field(
+        default=False,
+        description="Memoize the WhenTask on Argo. The cache key is derived from the task code and inputs.",
+    )
+    cache_max_age: str | None = Field(
+        default=None,
+        description="Maximum age of cached results, e.g. '24h'. Default (None) is one year, since Argo requires a maximum age.",
+    )
     _then: StepNode | None = None
     _otherwise: StepNode | None = None
     _prev: str = "when"
@@ -59,6 +74,12 @@ class When(Node):
         else:
             return import_path(self.task)
 
+    def _memoize(self):
+        if not self.cache:
+            return None
+        code_hash = task_hash(self.task, self.task_name, self.task_module)
+        return memoize(code_hash, self.cache_max_age)
+
     def then(self, task: StepTask, **kwargs) -> When:
         """Set the task to exectue when the condition evaluates to True."""
         if self._prev != "when":
@@ -75,13 +96,23 @@ class When(Node):
         self._prev = "otherwise"
         return self
 
-    def run(self, data: dict[str, Any]):
+    def run(self, data: dict[str, Any], context: RunContext | None = None):
         """Run the When-block locally."""
-        result = run_when(self.task_name, self.task_module, data)
+        condition = self.task_name.lower().replace("_", "-")
+        with measure(context.sub(condition) if context else None):
+            result = run_when(self.task_name, self.task_module, data)
         if result is True:
-            data = self._then.run(data)
+            then = "then-" + self._then.argo_name
+            with span("branch", branch=then):
+                data = self._then.run(
+                    data, context=context.sub(then) if context else None
+                )
         if result is False and self._otherwise is not None:
-            data = self._otherwise.run(data)
+            otherwise = "otherwise-" + self._otherwise.argo_name
+            with span("branch", branch=otherwise):
+                data = self._otherwise.run(
+                    data, context=context.sub(otherwise) if context else None
+                )
         return data
 
     def get_templates(
@@ -92,6 +123,7 @@ class When(Node):
         default_secrets: list[str] | None,
         default_parameters: dict[str, Any],
         default_retry: int | RetryStrategy | None,
+        default_resources: Resources | None = None,
     ):
         """Returns a list with the configured templates (StepsTemplate and ScriptTemplates). @private"""
         block_name = f"step-{step_counter}-{self.argo_name}"
@@ -112,6 +144,8 @@ class When(Node):
             parallelism=None,
             outpath="/tmp/when.json",
             retry=self.retry or default_retry,
+            memoize=self._memoize(),
+            resources=merge_resources(default_resources, self.resources),
         )
         templates.append(template)
 
@@ -122,8 +156,9 @@ class When(Node):
             default_secrets=default_secrets,
             default_parameters=default_parameters,
             default_retry=self.retry or default_retry,
+            default_resources=default_resources,
         )
-        template[0].name = then_name
+        rename_template(template[0], then_name)
         templates.extend(template)
 
         if self._otherwise is not None:
@@ -135,8 +170,9 @@ class When(Node):
                 default_secrets=default_secrets,
                 default_parameters=default_parameters,
                 default_retry=self.retry or default_retry,
+                default_resources=default_resources,
             )
-            template[0].name = otherwise_name
+            rename_template(template[0], otherwise_name)
             templates.extend(template)
 
         return templates
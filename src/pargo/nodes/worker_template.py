@@ -1,12 +1,20 @@
 from typing import Any
 
+from ..argo_types.primitives import Resources
 from ..argo_types.workflows import (
+    Memoize,
     Parameter,
     RetryStrategy,
     Script,
     ScriptTemplate,
     SecretRef,
 )
+from ..tracing import TRACEPARENT
+
+_TRACE_ID = '{{=sprig.replace("-", "", workflow.uid)}}'
+_SPAN_ID = '{{=sprig.trunc(16, sprig.replace("-", "", workflow.uid))}}'
+WORKFLOW_TRACEPARENT = f"00-{_TRACE_ID}-{_SPAN_ID}-01"
+"""Trace context shared by all pods of an Argo workflow, derived from its uid."""
 
 
 def worker_template(
@@ -19,6 +27,8 @@ def worker_template(
     parallelism: int | None,
     outpath: str,
     retry: int | RetryStrategy | None = None,
+    memoize: Memoize | None = None,
+    resources: Resources | None = None,
 ):
     if secrets:
         secrets = [SecretRef(secretRef=Parameter(name=secret)) for secret in secrets]
@@ -42,16 +52,42 @@ def worker_template(
             env=[
                 Parameter(name="PARGO_DATA", value="{{inputs.parameters.inputs}}"),
                 Parameter(name="PARGO_DIR", value="/tmp"),
+                Parameter(name="PARGO_RUN_ID", value="{{workflow.name}}"),
+                Parameter(name="PARGO_STEP", value=template_name),
+                Parameter(name=TRACEPARENT, value=WORKFLOW_TRACEPARENT),
             ],
             envFrom=secrets,
             imagePullPolicy=image_pull_policy,
+            resources=resources,
         ),
         inputs=inputs,
         outputs={
-            "parameters": [Parameter(name="outputs", valueFrom={"path": outpath})]
+            "parameters": [
+                Parameter(name="outputs", valueFrom={"path": outpath}),
+                Parameter(
+                    name="metrics",
+                    valueFrom={"path": "/tmp/metrics.json", "default": "[]"},
+                ),
+            ]
         },
         parallelism=parallelism,
         retryStrategy=retry,
+        memoize=memoize,
     )
 
     return template
+
+
+def rename_template(template: ScriptTemplate, name: str):
+    """Rename a worker template, including the step name its pods record metrics as."""
+    template.name = name
+    for var in template.script.env:
+        if var.name == "PARGO_STEP":
+            var.value = name
+
+
+def merge_resources(default: Resources | None, override: Resources | None):
+    """Node resources overwrite the workflow defaults per key."""
+    if default is None:
+        return override
+    return default.merge(override)
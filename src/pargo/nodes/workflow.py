@@ -9,6 +9,7 @@ from ..argo_types.primitives import Metadata, TemplateRef
 from ..argo_types.workflows import (
     Parameter,
     Resource,
+    Resources,
     ResourceTemplate,
     RetryStrategy,
     StepsTemplate,
@@ -17,6 +18,7 @@ from ..argo_types.workflows import (
     WorkflowSpec,
 )
 from .node import Node
+from .run import RunContext
 
 if TYPE_CHECKING:
     from ..workflow import Workflow
@@ -28,16 +30,24 @@ class WorkflowNode(Node):
     """Class for launching other workflows."""
 
     task: WorkflowTask = Field(description="Workflow to trigger")
+    inline: bool = Field(
+        default=False,
+        description="Run the workflows one after the other as part of this workflow, by referencing their main templates, instead of creating independent Workflow resources. Each workflow receives the data and adds its outputs to it. Their WorkflowTemplates must be deployed.",
+    )
 
     @property
     def argo_name(self):
         """Name of the task."""
         return "workflow"
 
-    def run(self, data: dict[str, Any]):
-        """Run the step locally"""
+    def run(self, data: dict[str, Any], context: RunContext | None = None):
+        """Run the step locally. Child runs share the run id of the parent run."""
+        run_id = context.run_id if context else None
         for workflow in self.task:
-            workflow.run()
+            if self.inline:
+                data = {**data, **workflow.run(parameters=data, run_id=run_id)}
+            else:
+                workflow.run(run_id=run_id)
         return data
 
     def get_templates(
@@ -48,10 +58,14 @@ class WorkflowNode(Node):
         default_secrets: list[str] | None,
         default_parameters: dict[str, Any],
         default_retry: int | RetryStrategy | None,
+        default_resources: Resources | None = None,
     ):
         """Returns a list with workflow reference templates @private"""
         block_name = f"step-{step_counter}-{self.argo_name}"
 
+        if self.inline:
+            return [self._get_inline_steps(block_name, default_parameters)]
+
         templates = [self._get_steps(block_name, default_parameters)]
         for workflow in self.task:
             template_name = block_name + "-" + workflow.name
@@ -74,20 +88,29 @@ class WorkflowNode(Node):
 
         return templates
 
+    @staticmethod
+    def _default_inputs(default_parameters: dict[str, Any]) -> str:
+        default = ",".join(
+            f'"{k}": {{{{workflow.parameters.{k}}}}}' for k in default_parameters
+        )
+        return f"{{{default}}}"
+
     def _get_steps(self, block_name: str, default_parameters: dict[str, Any]):
         parallel_steps = []
         for workflow in self.task:
             name = block_name + "-" + workflow.name
             parallel_steps.append(Task(name=name, template=name))
 
-        default = ",".join(
-            f'"{k}": {{{{workflow.parameters.{k}}}}}' for k in default_parameters
-        )
-        default = f"{{{default}}}"
-
         steps = StepsTemplate(
             name=block_name,
-            inputs={"parameters": [Parameter(name="inputs", default=default)]},
+            inputs={
+                "parameters": [
+                    Parameter(
+                        name="inputs",
+                        default=self._default_inputs(default_parameters),
+                    )
+                ]
+            },
             steps=[parallel_steps],
             outputs={
                 "parameters": [
@@ -99,3 +122,45 @@ class WorkflowNode(Node):
             },
         )
         return steps
+
+    def _get_inline_steps(self, block_name: str, default_parameters: dict[str, Any]):
+        """Sequential steps running the main template of each workflow."""
+        steps = []
+        value = "{{inputs.parameters.inputs}}"
+        for workflow in self.task:
+            name = block_name + "-" + workflow.name
+            steps.append(
+                [
+                    Task(
+                        name=name,
+                        templateRef=TemplateRef(name=workflow.name, template="main"),
+                        arguments={
+                            "parameters": [Parameter(name="inputs", value=value)]
+                        },
+                    )
+                ]
+            )
+            value = f"{{{{steps.{name}.outputs.parameters.outputs}}}}"
+
+        return StepsTemplate(
+            name=block_name,
+            inputs={
+                "parameters": [
+                    Parameter(
+                        name="inputs",
+                        default=self._default_inputs(default_parameters),
+                    )
+                ]
+            },
+            steps=steps,
+            outputs={
+                "parameters": [
+                    Parameter(
+                        name="outputs",
+                        valueFrom={
+                            "expression": f"steps['{steps[-1][0].name}'].outputs.parameters.outputs"
+                        },
+                    ),
+                ]
+            },
+        )
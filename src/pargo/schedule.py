@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from datetime import datetime, timedelta
+
+from pydantic import BaseModel, Field
+
+MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+MONTHS = [
+    "jan",
+    "feb",
+    "mar",
+    "apr",
+    "may",
+    "jun",
+    "jul",
+    "aug",
+    "sep",
+    "oct",
+    "nov",
+    "dec",
+]
+WEEKDAYS = ["sun", "mon", "tue", "wed", "thu", "fri", "sat"]
+
+
+def _value(text: str, low: int, names: list[str] | None) -> int:
+    if names and text.lower() in names:
+        return names.index(text.lower()) + low
+    return int(text)
+
+
+def _field(text: str, low: int, high: int, names: list[str] | None = None) -> set[int]:
+    """Values of a cron field: lists of `*`, values and ranges with optional steps."""
+    values = set()
+    for part in text.split(","):
+        spec, _, step = part.partition("/")
+        if spec in ("*", "?"):
+            start, end = low, high
+        elif "-" in spec:
+            first, _, last = spec.partition("-")
+            start, end = _value(first, low, names), _value(last, low, names)
+        else:
+            start = _value(spec, low, names)
+            end = high if step else start
+        if not low <= start <= end <= high or (step and int(step) < 1):
+            raise ValueError(f"Invalid cron field {text!r}")
+        values.update(range(start, end + 1, int(step) if step else 1))
+    return values
+
+
+class Cron(BaseModel):
+    """Standard five field cron expression, `minute hour day month weekday`."""
+
+    minutes: set[int] = Field(description="Minutes of the hour")
+    hours: set[int] = Field(description="Hours of the day")
+    days: set[int] = Field(description="Days of the month")
+    months: set[int] = Field(description="Months of the year")
+    weekdays: set[int] = Field(description="Days of the week, Sunday being 0")
+    any_day: bool = Field(description="Day of the month is unrestricted")
+    any_weekday: bool = Field(description="Day of the week is unrestricted")
+
+    @classmethod
+    def parse(cls, expression: str) -> Cron:
+        """Parse an expression, e.g. `0 6 * * mon-fri` or `@daily`."""
+        fields = MACROS.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(
+                f"Unsupported cron expression {expression!r}, expected 5 fields"
+            )
+        minute, hour, day, month, weekday = fields
+        weekdays = _field(weekday, 0, 7, WEEKDAYS)
+        return cls(
+            minutes=_field(minute, 0, 59),
+            hours=_field(hour, 0, 23),
+            days=_field(day, 1, 31),
+            months=_field(month, 1, 12, MONTHS),
+            weekdays={d % 7 for d in weekdays},  # 7 is Sunday as well
+            any_day=day.startswith(("*", "?")),
+            any_weekday=weekday.startswith(("*", "?")),
+        )
+
+    def matches_day(self, day: datetime) -> bool:
+        if day.month not in self.months:
+            return False
+        in_days = day.day in self.days
+        in_weekdays = (day.weekday() + 1) % 7 in self.weekdays
+        # Like cron, a day matches either restricted field when both are restricted
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def ticks(self, start: datetime, end: datetime) -> Iterator[datetime]:
+        """Times matching the expression from `start`, inclusive, to `end`, exclusive."""
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day < end:
+            if self.matches_day(day):
+                for hour in sorted(self.hours):
+                    for minute in sorted(self.minutes):
+                        tick = day.replace(hour=hour, minute=minute)
+                        if start <= tick < end:
+                            yield tick
+            day += timedelta(days=1)
@@ -23,59 +23,95 @@ from .argo_types.primitives import Metadata, TemplateRef
 from .argo_types.workflows import WorkflowResource, WorkflowSpec
 
 if TYPE_CHECKING:
-    from .workflow import Condition
+    from .workflow import Condition, Workflow
+
+WORKFLOW_LABEL = "pargo/workflow"
+
+
+def sensor_spec(dependencies: list[Dependency], triggers: list[Trigger]):
+    return EventSpec(
+        eventBusName="argoevents",
+        template=EventTemplate(serviceAccountName="argo-service-account"),
+        dependencies=dependencies,
+        triggers=triggers,
+    )
 
 
 class Sensor(BaseModel):
     name: str
     trigger_on: Condition
     parameters: list[dict[str, Any]] | None = None
+    match_labels: bool = False
 
-    def argo_dependencies(self):
-        dependencies = []
-        for name in self.trigger_on.names:
-            dependencies.append(
-                Dependency(
-                    name=name,
-                    eventSourceName="argo-workflow-events",
-                    eventName="workflow-events",
-                    filters=Filters(
-                        data=[
-                            FilterData(
-                                path="body.metadata.name",
-                                type="string",
-                                value=[f"^{name}-.*"],
-                            ),
-                            FilterData(
-                                path="body.status.phase",
-                                type="string",
-                                value=["Succeeded"],
-                            ),
-                        ]
-                    ),
-                )
+    def argo_dependency(self, name: str):
+        if self.match_labels:
+            name_filter = FilterData(
+                path=f"body.metadata.labels.{WORKFLOW_LABEL}",
+                type="string",
+                value=[f"^{name}$"],
             )
-        return dependencies
+        else:
+            name_filter = FilterData(
+                path="body.metadata.name",
+                type="string",
+                value=[f"^{name}-.*"],
+            )
+        return Dependency(
+            name=name,
+            eventSourceName="argo-workflow-events",
+            eventName="workflow-events",
+            filters=Filters(
+                data=[
+                    name_filter,
+                    FilterData(
+                        path="body.status.phase",
+                        type="string",
+                        value=["Succeeded"],
+                    ),
+                ]
+            ),
+        )
+
+    def argo_dependencies(self):
+        return [self.argo_dependency(name) for name in self.trigger_on.names]
+
+    def trigger_groups(self) -> list[tuple[dict[str, Any] | None, list[list[str]]]]:
+        """
+        Parameters and OR-terms of each trigger. OR-terms sharing parameters are
+        combined into a single trigger, so that upstream workflows finishing
+        together submit the workflow once.
+        """
+        groups: dict[str, tuple[dict[str, Any] | None, list[list[str]]]] = {}
+        parameters = self.parameters or [None] * len(self.trigger_on)
+        for term, params in zip(self.trigger_on.terms, parameters):
+            key = dumps(params, sort_keys=True)
+            groups.setdefault(key, (params, []))[1].append(term)
+        return list(groups.values())
 
     def argo_triggers(self):
-        if self.parameters:
-            arguments = []
-            for parameters in self.parameters:
+        """One trigger per distinct set of parameters, see `trigger_groups`."""
+        conditions, arguments = [], []
+        for params, terms in self.trigger_groups():
+            items = [" && ".join(term) for term in terms]
+            if len(items) == 1:
+                conditions.append(items[0])
+            else:
+                conditions.append(
+                    " || ".join(f"({c})" if " && " in c else c for c in items)
+                )
+            if params:
                 arguments.append(
                     {
                         "parameters": [
-                            {"name": k, "value": dumps(v)}
-                            for k, v in parameters.items()
+                            {"name": k, "value": dumps(v)} for k, v in params.items()
                         ]
-                    },
+                    }
                 )
-        else:
-            arguments = [None] * len(self.trigger_on)
+            else:
+                arguments.append(None)
 
         triggers = []
-        for ind, (condition, argument) in enumerate(
-            zip(self.trigger_on.items, arguments)
-        ):
+        for ind, (condition, argument) in enumerate(zip(conditions, arguments)):
             triggers.append(
                 Trigger(
                     template=TriggerTemplate(
@@ -111,12 +147,7 @@ class Sensor(BaseModel):
             apiVersion="argoproj.io/v1alpha1",
             kind="Sensor",
             metadata=Metadata(name=self.name),
-            spec=EventSpec(
-                eventBusName="argoevents",
-                template=EventTemplate(serviceAccountName="argo-service-account"),
-                dependencies=self.argo_dependencies(),
-                triggers=self.argo_triggers(),
-            ),
+            spec=sensor_spec(self.argo_dependencies(), self.argo_triggers()),
         )
         return sensor
 
@@ -128,3 +159,51 @@ class Sensor(BaseModel):
             encoding="utf-8",
             newline="\n",
         )
+
+
+class SensorGroup(BaseModel):
+    """
+    A single Sensor holding the dependencies and triggers of several triggered
+    workflows. Upstream workflows are matched by label instead of name prefix.
+    """
+
+    name: str
+    sensors: list[Sensor]
+
+    @classmethod
+    def from_workflows(cls, workflows: list[Workflow]) -> list[SensorGroup]:
+        """Group the sensors of triggered workflows by their `sensor_group`."""
+        groups: dict[str, list[Sensor]] = {}
+        for workflow in workflows:
+            if workflow.trigger_on and workflow.sensor_group:
+                sensor = workflow.sensor()
+                groups.setdefault(workflow.sensor_group, []).append(sensor)
+        return [cls(name=name, sensors=sensors) for name, sensors in groups.items()]
+
+    def argo_dependencies(self):
+        dependencies = {}
+        for sensor in self.sensors:
+            for name in sensor.trigger_on.names:
+                dependencies.setdefault(name, sensor.argo_dependency(name))
+        return [dependencies[name] for name in sorted(dependencies)]
+
+    def argo_triggers(self):
+        return [t for sensor in self.sensors for t in sensor.argo_triggers()]
+
+    def to_argo(self):
+        sensor = EventSensor(
+            apiVersion="argoproj.io/v1alpha1",
+            kind="Sensor",
+            metadata=Metadata(name=self.name),
+            spec=sensor_spec(self.argo_dependencies(), self.argo_triggers()),
+        )
+        return sensor
+
+    def to_yaml(self, path=""):
+        sensor = self.to_argo()
+        yaml_str = sensor.model_dump(exclude_none=True)
+        Path(path / (self.name + "-sensors.yaml")).write_text(
+            safe_dump(yaml_str, sort_keys=False),
+            encoding="utf-8",
+            newline="\n",
+        )
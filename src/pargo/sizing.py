@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from json import JSONDecodeError, loads
+from math import ceil
+from typing import Any
+
+from .argo_types.primitives import Resources
+from .argo_types.workflows import ScriptTemplate, WorkflowResource
+from .nodes.run import pargo_path, percentile
+
+
+def load_metrics(name: str) -> dict[str, list[dict]]:
+    """Metrics of all local runs of workflow `name`, grouped by template name."""
+    metrics: dict[str, list[dict]] = {}
+    for path in sorted((pargo_path() / name).glob("*/metrics.json")):
+        try:
+            records = loads(path.read_text())
+        except JSONDecodeError:
+            continue
+        for record in records:
+            if record.get("name"):
+                metrics.setdefault(record["name"], []).append(record)
+    return metrics
+
+
+def load_argo_metrics(workflow: dict[str, Any]) -> dict[str, list[dict]]:
+    """
+    Metrics of the pods of an Argo workflow run, e.g. the JSON of
+    `argo get <name> -o json`, grouped by template name.
+    """
+    metrics: dict[str, list[dict]] = {}
+    for node in (workflow.get("status") or {}).get("nodes", {}).values():
+        parameters = (node.get("outputs") or {}).get("parameters", [])
+        value = next(
+            (p.get("value") for p in parameters if p["name"] == "metrics"), None
+        )
+        try:
+            records = loads(value) if value else []
+        except JSONDecodeError:
+            continue
+        for record in records:
+            name = record.get("name") or node.get("templateName")
+            if name:
+                metrics.setdefault(name, []).append(record)
+    return metrics
+
+
+def recommend(
+    metrics: dict[str, list[dict]], headroom: float = 1.25, q: float = 95
+) -> dict[str, Resources]:
+    """
+    Recommended resources per template from measured runs. Requests are the q-th
+    percentile of CPU cores and peak memory with headroom. The memory limit is
+    twice the largest peak with headroom. CPU is not limited to avoid throttling.
+    """
+    recommendations = {}
+    for name, records in metrics.items():
+        cores = [r["cpu_seconds"] / r["duration"] for r in records if r.get("duration")]
+        rss = [r["peak_rss"] for r in records if r.get("peak_rss")]
+
+        requests, limits = {}, {}
+        if cores:
+            requests["cpu"] = f"{max(1, ceil(percentile(cores, q) * headroom * 1000))}m"
+        if rss:
+            requests["memory"] = f"{ceil(percentile(rss, q) * headroom / 2**20)}Mi"
+            limits["memory"] = f"{ceil(max(rss) * headroom * 2 / 2**20)}Mi"
+        if requests:
+            recommendations[name] = Resources(requests=requests, limits=limits or None)
+    return recommendations
+
+
+def apply_sizing(
+    workflow: WorkflowResource, recommendations: dict[str, Resources]
+) -> WorkflowResource:
+    """Overwrite resources of the script templates with the recommendations."""
+    for template in workflow.spec.templates or []:
+        if isinstance(template, ScriptTemplate) and template.name in recommendations:
+            resources = template.script.resources or Resources()
+            template.script.resources = resources.merge(recommendations[template.name])
+    return workflow
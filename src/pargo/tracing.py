@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import atexit
+from collections.abc import Callable
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import signature
+from json import dumps
+from os import environ
+from pathlib import Path
+from secrets import token_hex
+from threading import Lock
+from time import time_ns
+from typing import Any, Protocol
+from urllib.request import Request, urlopen
+
+from loguru import logger
+from pydantic import BaseModel, Field
+
+TRACEPARENT = "TRACEPARENT"
+"""Environment variable carrying the W3C trace context into pods and subprocesses."""
+
+OTLP_ENDPOINT = "PARGO_OTLP_ENDPOINT"
+"""Environment variable with the OTLP/HTTP endpoint of a collector, e.g. `http://localhost:4318`."""
+
+TRACE_FILE = "PARGO_TRACE_FILE"
+"""Environment variable with the path of the OTLP-JSON trace file."""
+
+
+class Span(BaseModel):
+    """A timed operation of a run, in the OpenTelemetry data model."""
+
+    name: str
+    trace_id: str = Field(default_factory=lambda: token_hex(16))
+    span_id: str = Field(default_factory=lambda: token_hex(8))
+    parent_id: str | None = None
+    start: int = Field(default_factory=time_ns)
+    end: int | None = None
+    attributes: dict[str, Any] = {}
+    error: str | None = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> dict[str, Any]:
+        """OTLP-JSON representation of the span."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": [
+                {"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()
+            ],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: list[Span]) -> dict[str, Any]:
+    """OTLP-JSON export request holding `spans`."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": "pargo"}}
+                    ]
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "pargo"},
+                        "spans": [span.to_otlp() for span in spans],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class Exporter(Protocol):
+    def export(self, spans: list[Span]) -> None: ...
+
+
+class FileExporter:
+    """Append spans as OTLP-JSON lines to a file, the format of the collector file exporter."""
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+
+    def export(self, spans: list[Span]):
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        with self.path.open("a") as f:
+            f.write(dumps(otlp_payload(spans)) + "\n")
+
+
+class HttpExporter:
+    """Send spans to an OTLP/HTTP collector, e.g. a local OpenTelemetry Collector or Jaeger."""
+
+    def __init__(self, endpoint: str = "http://localhost:4318", timeout: float = 2.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.timeout = timeout
+
+    def export(self, spans: list[Span]):
+        request = Request(
+            self.url,
+            data=dumps(otlp_payload(spans)).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            urlopen(request, timeout=self.timeout).close()
+        except OSError as e:  # Tracing must never fail a run
+            logger.warning(f"Failed to export spans to {self.url}: {e}")
+
+
+_exporter: Exporter | None = None
+_default: tuple[tuple[Any, ...], Exporter] | None = None
+_buffer: list[Span] = []
+_lock = Lock()
+_current: ContextVar[Span | None] = ContextVar("pargo_span", default=None)
+
+
+def set_exporter(exporter: Exporter | None):
+    """Set the exporter of all spans. None restores the default."""
+    global _exporter
+    flush()
+    _exporter = exporter
+
+
+def get_exporter() -> Exporter:
+    """
+    The configured exporter. Defaults to a collector at `PARGO_OTLP_ENDPOINT` when set,
+    and otherwise the file `PARGO_TRACE_FILE` or `<PARGO_DIR>/traces.jsonl`.
+    """
+    global _default
+    if _exporter is not None:
+        return _exporter
+    key = (
+        environ.get(OTLP_ENDPOINT),
+        environ.get(TRACE_FILE),
+        environ.get("PARGO_DIR"),
+        Path.cwd(),
+    )
+    if _default is None or _default[0] != key:
+        if OTLP_ENDPOINT in environ:
+            exporter: Exporter = HttpExporter(environ[OTLP_ENDPOINT])
+        else:
+            default = Path(environ.get("PARGO_DIR", Path.cwd() / ".pargo"))
+            exporter = FileExporter(environ.get(TRACE_FILE, default / "traces.jsonl"))
+        _default = (key, exporter)
+    return _default[1]
+
+
+def flush():
+    """Export the buffered spans."""
+    with _lock:
+        spans = _buffer[:]
+        _buffer.clear()
+    if spans:
+        get_exporter().export(spans)
+
+
+atexit.register(flush)
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str] | None:
+    """(trace_id, parent span_id) of a W3C traceparent header."""
+    parts = (value or "").split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+def traceparent() -> str | None:
+    """Traceparent of the current span, to propagate to subprocesses."""
+    current = _current.get()
+    return current.traceparent if current else environ.get(TRACEPARENT)
+
+
+def set_traceparent(value: str | None):
+    """Continue the trace `value` in this process, e.g. in a pool worker."""
+    if value:
+        environ[TRACEPARENT] = value
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """
+    Record the block as a span, child of the current span or of the `TRACEPARENT`
+    of the process. Spans are buffered and exported together when the root span
+    of the process exits.
+    """
+    parent = _current.get()
+    if parent is not None:
+        s = Span(
+            name=name,
+            trace_id=parent.trace_id,
+            parent_id=parent.span_id,
+            attributes=attributes,
+        )
+    elif remote := parse_traceparent(environ.get(TRACEPARENT)):
+        s = Span(
+            name=name, trace_id=remote[0], parent_id=remote[1], attributes=attributes
+        )
+    else:
+        s = Span(name=name, attributes=attributes)
+
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        s.end = time_ns()
+        with _lock:
+            _buffer.append(s)
+        if parent is None:
+            flush()
+
+
+def traced(func: Callable) -> Callable:
+    """Record calls of `func` as spans named after it, with its string arguments as attributes."""
+    sig = signature(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        arguments = sig.bind_partial(*args, **kwargs).arguments
+        attributes = {k: v for k, v in arguments.items() if isinstance(v, str)}
+        with span(func.__name__, **attributes):
+            return func(*args, **kwargs)
+
+    return wrapper
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from functools import cached_property
+from itertools import product
+from typing import TYPE_CHECKING, Any, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, model_validator
 
 if TYPE_CHECKING:
     from .workflow import Workflow
@@ -10,37 +12,90 @@ if TYPE_CHECKING:
 
 class Condition(BaseModel):
     """
-    Class when combining workflows for conditional execution.
+    Class when combining workflows for conditional execution. Workflows combined
+    with `&` (AND) and `|` (OR) form an expression tree with arbitrary nesting,
+    e.g. `(A | B) & C`, which is normalized to a minimal disjunctive normal form.
+    Conditions can also be given as OR-terms of Argo Events expressions, e.g.
+    `Condition(items=["A && C", "B && C"])`.
     """
 
-    items: list[str]
+    model_config = ConfigDict(extra="forbid")
 
-    def __and__(self, other):
-        from .workflow import Workflow
+    op: Literal["name", "and", "or"] = "name"
+    name: str | None = None
+    args: list[Condition] = []
 
-        if len(self.items) > 1:
-            raise ValueError("Invalid: cannot do (A | B) & C")
+    @model_validator(mode="before")
+    @classmethod
+    def _from_items(cls, values: Any) -> Any:
+        if not isinstance(values, dict) or "items" not in values:
+            return values
+        values = dict(values)
+        terms = [
+            {"op": "and", "args": [{"name": n.strip()} for n in item.split("&&")]}
+            for item in values.pop("items")
+        ]
+        return {"op": "or", "args": terms, **values}
 
-        if isinstance(other, Workflow):
-            return Condition(items=[self.items[0] + " && " + other.name])
-        else:
-            if len(other.items) > 1:
-                raise ValueError("Invalid: cannot do (A | B) & (C | D)")
-            return Condition(items=[self.items[0] + " && " + other.items[0]])
+    @model_validator(mode="after")
+    def _check(self) -> Condition:
+        if self.op == "name" and not self.name:
+            raise ValueError("Condition requires a workflow name")
+        if self.op != "name" and not self.args:
+            raise ValueError(f"Condition {self.op!r} requires arguments")
+        return self
+
+    @classmethod
+    def of(cls, other: Workflow | Condition) -> Condition:
+        """Condition of a workflow or an existing condition."""
+        if isinstance(other, Condition):
+            return other
+        return cls(name=other.name)
+
+    def __and__(self, other):
+        return Condition(op="and", args=[self, Condition.of(other)])
 
     def __or__(self, other):
-        if isinstance(other, Workflow):
-            return Condition(items=self.items + [other.name])
+        return Condition(op="or", args=[self, Condition.of(other)])
+
+    @cached_property
+    def terms(self) -> list[list[str]]:
+        """
+        OR-terms of AND-ed workflow names in disjunctive normal form. Duplicated
+        names and terms are removed, and terms that contain all the names of
+        another term are absorbed. The order of first appearance is kept, so
+        `trigger_on_parameters` pair with the remaining terms in that order.
+        """
+        if self.op == "name":
+            terms = [[self.name]]
+        elif self.op == "or":
+            terms = [term for arg in self.args for term in arg.terms]
         else:
-            return Condition(items=self.items + other.items)
+            terms = [
+                [name for part in parts for name in part]
+                for parts in product(*(arg.terms for arg in self.args))
+            ]
+
+        minimal: list[list[str]] = []
+        sets = [set(term) for term in terms]
+        for ind, term in enumerate(terms):
+            absorbed = any(
+                other < sets[ind] or (other == sets[ind] and i < ind)
+                for i, other in enumerate(sets)
+            )
+            if not absorbed:
+                minimal.append(list(dict.fromkeys(term)))
+        return minimal
 
     @property
-    def names(self):
-        seen = set()
-        for item in self.items:
-            for part in item.split(" && "):
-                seen.add(part)
-        return sorted(list(seen))
+    def items(self) -> list[str]:
+        """OR-terms as Argo Events condition expressions."""
+        return [" && ".join(term) for term in self.terms]
+
+    @cached_property
+    def names(self) -> list[str]:
+        """Sorted names of all workflows in the condition."""
+        return sorted({name for term in self.terms for name in term})
 
     def __iter__(self):
         return iter(self.items)
@@ -48,5 +103,8 @@ class Condition(BaseModel):
     def __repr__(self):
         return str(self.items)
 
+    def __str__(self):
+        return self.__repr__()
+
     def __len__(self):
-        return len(self.items)
+        return len(self.terms)
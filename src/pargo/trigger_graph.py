@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from time import monotonic
+from typing import Any
+
+from loguru import logger
+from pydantic import BaseModel, Field
+
+from .nodes.run import new_run_id
+from .workflow import Workflow
+
+
+class Trigger(BaseModel):
+    """Trigger of a workflow: fires when all workflows of one of its terms succeeded."""
+
+    workflow: str = Field(description="Name of the triggered workflow")
+    parameters: dict[str, Any] | None = Field(
+        default=None, description="Parameters of the triggered runs"
+    )
+    terms: list[list[str]] = Field(description="OR-terms of AND-ed workflow names")
+    succeeded: set[str] = Field(
+        default=set(), description="Upstream workflows that succeeded since it fired"
+    )
+
+    def notify(self, name: str) -> bool:
+        """Record that `name` succeeded. True when the trigger fires."""
+        if not any(name in term for term in self.terms):
+            return False
+        self.succeeded.add(name)
+        if any(self.succeeded.issuperset(term) for term in self.terms):
+            # Like Argo Events, the dependencies are reset once the trigger fired
+            self.succeeded = set()
+            return True
+        return False
+
+
+class TriggerGraph(BaseModel):
+    """
+    Workflows connected by their `trigger_on` conditions, run locally the way the
+    sensors run them on Argo: every successful run is an event that fires the
+    triggers of downstream workflows with their `trigger_on_parameters`.
+    """
+
+    workflows: dict[str, Workflow] = Field(description="Workflows by name")
+
+    @classmethod
+    def of(cls, workflows: list[Workflow]) -> TriggerGraph:
+        graph = cls(workflows={w.name: w for w in workflows})
+        graph.check()
+        return graph
+
+    def triggers(self) -> list[Trigger]:
+        """Triggers of all triggered workflows, with their initial state."""
+        return [
+            Trigger(workflow=workflow.name, parameters=parameters, terms=terms)
+            for workflow in self.workflows.values()
+            if workflow.trigger_on
+            for parameters, terms in workflow.sensor().trigger_groups()
+        ]
+
+    def downstream(self, name: str) -> list[str]:
+        """Names of the workflows triggered by `name`."""
+        return sorted(
+            {
+                w.name
+                for w in self.workflows.values()
+                if w.trigger_on and name in w.trigger_on.names
+            }
+        )
+
+    def roots(self) -> list[str]:
+        """Names of the workflows that trigger others without being triggered."""
+        return [
+            name
+            for name, workflow in self.workflows.items()
+            if not workflow.trigger_on and self.downstream(name)
+        ]
+
+    def check(self):
+        """Raise a ValueError for cycles, which would trigger runs endlessly."""
+        visiting: list[str] = []
+        done: set[str] = set()
+
+        def visit(name: str):
+            if name in visiting:
+                cycle = visiting[visiting.index(name) :] + [name]
+                raise ValueError(f"Trigger cycle {' -> '.join(cycle)}")
+            if name in done:
+                return
+            visiting.append(name)
+            for child in self.downstream(name):
+                visit(child)
+            visiting.pop()
+            done.add(name)
+
+        for name in self.workflows:
+            visit(name)
+        for workflow in self.workflows.values():
+            missing = set(workflow.trigger_on.names if workflow.trigger_on else [])
+            missing -= self.workflows.keys()
+            if missing:
+                logger.warning(
+                    f"{workflow.name} is triggered by {sorted(missing)}, which are not in the graph"
+                )
+
+    def run(
+        self, roots: list[str] | None = None, workers: int | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        Run the root workflows, `roots()` by default, and the workflows they trigger,
+        on up to `workers` threads. Returns the workflow, run id, parameters,
+        status, duration and error of each run, in the order they were started.
+        """
+        roots = self.roots() if roots is None else roots
+        for name in roots:
+            if name not in self.workflows:
+                raise ValueError(f"No workflow named '{name}' in the graph")
+        triggers = self.triggers()
+        report: list[dict[str, Any]] = []
+        with ThreadPoolExecutor(workers) as pool:
+            pending: dict[Future, dict[str, Any]] = {}
+
+            def submit(name: str, parameters: dict[str, Any] | None):
+                entry = {"workflow": name, "run_id": new_run_id()}
+                if parameters:
+                    entry["parameters"] = parameters
+                logger.info(f"Starting {name} with run id {entry['run_id']}")
+                future = pool.submit(
+                    copy_context().run, self._run, name, parameters, entry["run_id"]
+                )
+                pending[future] = entry
+                report.append(entry)
+
+            for name in roots:
+                submit(name, None)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    entry = pending.pop(future)
+                    entry["status"], entry["seconds"], error = future.result()
+                    if error:
+                        entry["error"] = error
+                        logger.error(f"{entry['workflow']} failed: {error}")
+                        continue
+                    for trigger in triggers:
+                        if trigger.notify(entry["workflow"]):
+                            submit(trigger.workflow, trigger.parameters)
+        return report
+
+    def _run(
+        self, name: str, parameters: dict[str, Any] | None, run_id: str
+    ) -> tuple[str, float, str | None]:
+        start = monotonic()
+        try:
+            self.workflows[name].run(parameters, run_id=run_id)
+        except Exception as e:  # noqa: BLE001 - failed runs are reported, not raised
+            return "Failed", round(monotonic() - start, 3), f"{type(e).__name__}: {e}"
+        return "Succeeded", round(monotonic() - start, 3), None
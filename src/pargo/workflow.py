@@ -1,14 +1,19 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from copy import deepcopy
+from datetime import datetime
 from json import dumps
+from os import cpu_count
 from pathlib import Path
 from typing import Any, Callable, Literal
 
 from loguru import logger
 from pydantic import BaseModel, Field
-from yaml import safe_dump
+from yaml import safe_dump, safe_dump_all
 
+from .argo_types.config_map import ConfigMap
 from .argo_types.cron import (
     CronWorkflow,
     CronWorkflowSpec,
@@ -18,21 +23,31 @@ from .argo_types.primitives import (
     Parameter,
     PodGC,
     PodMetadata,
+    Resources,
     RetryStrategy,
     TemplateRef,
     TTLStrategy,
 )
 from .argo_types.workflows import (
+    ScriptTemplate,
     StepsTemplate,
     Task,
     WorkflowResource,
     WorkflowSpec,
 )
+from .cache import RunCache
+from .dataflow import combine, node_reads, node_writes, stages, validate_dataflow
+from .nodes.chain import fuse_steps
+from .nodes.foreach import Foreach, Sequence
 from .nodes.node import Node
-from .nodes.run import pargo_path
+from .nodes.payload import Compression
+from .nodes.run import RunContext, pargo_path
 from .nodes.step import StepNode
 from .nodes.workflow import WorkflowNode
-from .sensor import Sensor
+from .schedule import Cron
+from .sensor import WORKFLOW_LABEL, Sensor, SensorGroup
+from .sizing import apply_sizing, load_argo_metrics, load_metrics, recommend
+from .tracing import span
 from .trigger_condition import Condition
 
 
@@ -65,6 +80,10 @@ class Workflow(BaseModel):
         default=None,
         description="Input parameters to the workflow when triggered by schedules. Applied to all schedules runs. If None, `parameters` is applied.",
     )
+    scheduled_time_parameter: str | None = Field(
+        default=None,
+        description="Parameter set to the scheduled time, as an ISO 8601 string, in runs triggered by schedules and in backfills. Must be one of `parameters`.",
+    )
     secrets: list[str] | None = Field(default=None, description="")
     trigger_on: Workflow | Condition | None = Field(
         default=None,
@@ -72,7 +91,11 @@ class Workflow(BaseModel):
     )
     trigger_on_parameters: list[dict[str, Any]] | None = Field(
         default=None,
-        description="Input parameters to the workflow when triggered by upstream workflows. Must match the length of `trigger_on`",
+        description="Input parameters to the workflow when triggered by upstream workflows, one per OR-term of `trigger_on`. The terms are those of `trigger_on.terms`, the minimal disjunctive normal form, in their order of first appearance.",
+    )
+    sensor_group: str | None = Field(
+        default=None,
+        description="Name of a shared sensor for triggered execution. Workflows with the same `sensor_group` share one sensor, written by `Workflow.to_yaml_sensor_groups`, that matches upstream workflows by label.",
     )
     parallelism: int | None = Field(
         default=None,
@@ -82,6 +105,26 @@ class Workflow(BaseModel):
     retry: int | RetryStrategy | None = Field(
         default=2, description="Set the number of retries or the full retry strategy."
     )
+    resources: Resources | None = Field(
+        default=None,
+        description="Default resource requests and limits of the containers, e.g. `Resources(requests={'cpu': '1', 'memory': '1Gi'})`. Default (None) uses the namespace defaults.",
+    )
+    fuse: bool = Field(
+        default=False,
+        description="Fuse consecutive steps sharing image, secrets, parallelism and retry into a single pod. Applies to both `run` and `to_argo`.",
+    )
+    auto_parallel: bool = Field(
+        default=False,
+        description="Run consecutive nodes in parallel when none reads or writes keys another writes. Reads are inferred from task signatures, writes from TypedDict return annotations or returned dict literals. Applies to both `run` and `to_argo`.",
+    )
+    compression: Compression | None = Field(
+        default=None,
+        description="Compress the data passed between pods on Argo when smaller, with 'gzip' or 'zstd' (requires `zstandard`). Disables the projection of Foreach item inputs, which needs plain JSON, and cannot be combined with parallel stages of `auto_parallel` or sequences counted by a parameter.",
+    )
+    strict_dataflow: bool = Field(
+        default=False,
+        description="Raise a DataflowError from `to_argo` when task inputs are not satisfied by the parameters or earlier steps. Default (False) logs a warning, since parameters may also be passed on submission.",
+    )
     _nodes: list[Node] = []
 
     _annotations = __annotations__
@@ -95,67 +138,263 @@ class Workflow(BaseModel):
 
     def model_post_init(self, __context):
         if isinstance(self.trigger_on, Workflow):
-            self.trigger_on = Condition(items=[self.trigger_on.name])
+            self.trigger_on = Condition.of(self.trigger_on)
 
         if self.trigger_on_parameters:
-            if len(self.trigger_on_parameters) != len(self.trigger_on):
+            terms = self.trigger_on.terms if self.trigger_on else []
+            if len(self.trigger_on_parameters) != len(terms):
                 raise ValueError(
-                    "trigger_on_parameters must be same length as number of OR statements when defined."
+                    f"trigger_on_parameters must be same length as number of OR statements when defined. The OR statements of trigger_on are {terms}."
                 )
 
-    @property
-    def data_path(self):
-        data_path = pargo_path() / self.name
-        data_path.mkdir(exist_ok=True, parents=True)
-        return data_path / "data.json"
+        if (
+            self.scheduled_time_parameter
+            and self.scheduled_time_parameter not in self.parameters
+        ):
+            raise ValueError(
+                f"scheduled_time_parameter {self.scheduled_time_parameter!r} must be one of the parameters."
+            )
 
     def next(self, node: Node | Callable, **kwargs) -> Workflow:
         """Add tasks or Nodes to the workflow. Callable tasks are converted to StepNodes."""
         if callable(node):
             node = StepNode(task=node, **kwargs)
         elif isinstance(node, Workflow):
-            node = WorkflowNode(task=[node])
+            node = WorkflowNode(task=[node], **kwargs)
         elif isinstance(node, list) and all(isinstance(w, Workflow) for w in node):
-            node = WorkflowNode(task=node)
+            node = WorkflowNode(task=node, **kwargs)
         self._nodes.append(node)
         return self
 
-    def run(self, parameters: dict[str, Any] | None = None):
-        """Run the workflow locally."""
-        logger.info(f"Workflow {self.name} started")
+    def plan(self) -> list[Node]:
+        """Nodes to execute, after optional step fusion."""
+        if self.fuse:
+            return fuse_steps(self._nodes)
+        return list(self._nodes)
+
+    def stages(self, nodes: list[Node] | None = None) -> list[list[int]]:
+        """Indices of the planned nodes per stage. Nodes of a stage run in parallel."""
+        nodes = self.plan() if nodes is None else nodes
+        if self.auto_parallel:
+            return stages(nodes)
+        return [[ind] for ind in range(len(nodes))]
+
+    def explain(self) -> str:
+        """Schedule of the workflow, with the keys each node reads and writes."""
+
+        def fmt(keys: set[str] | None) -> str:
+            return "*" if keys is None else ",".join(sorted(keys)) or "-"
+
+        nodes = self.plan()
+        lines = [f"{'stage':6} {'node':40} {'reads':24} writes"]
+        for level, stage in enumerate(self.stages(nodes)):
+            for ind in stage:
+                node = nodes[ind]
+                name = f"step-{ind}-{node.argo_name}"
+                reads, writes = fmt(node_reads(node)), fmt(node_writes(node))
+                lines.append(f"{level:<6} {name:40} {reads:24} {writes}")
+        return "\n".join(lines)
+
+    def ticks(self, start: datetime, end: datetime) -> list[datetime]:
+        """Scheduled times of the workflow from `start`, inclusive, to `end`, exclusive."""
+        if not self.schedules:
+            raise ValueError(f"Workflow {self.name} has no schedules")
+        return sorted(
+            {tick for s in self.schedules for tick in Cron.parse(s).ticks(start, end)}
+        )
+
+    def scheduled_parameters(self, tick: datetime) -> dict[str, Any]:
+        """Parameters of the run scheduled at `tick`."""
+        parameters = dict(self.schedules_parameters or {})
+        if self.scheduled_time_parameter:
+            parameters[self.scheduled_time_parameter] = tick.isoformat()
+        return parameters
+
+    def run_path(self, run_id: str) -> Path:
+        """State directory of the run with id `run_id`."""
+        return pargo_path() / self.name / run_id
+
+    def run(
+        self,
+        parameters: dict[str, Any] | None = None,
+        run_id: str | None = None,
+        cache: RunCache | None = None,
+    ) -> dict[str, Any]:
+        """
+        Run the workflow locally and return the final data. Each run gets its own
+        state directory `<PARGO_DIR>/<name>/<run_id>`, so runs of the same workflow
+        can execute concurrently. A new run id is generated when not provided.
+        Nodes whose code and inputs are unchanged since a run with the same `cache`
+        reuse the cached result.
+        """
+        context = RunContext.new(self.name, run_id)
+        logger.info(f"Workflow {self.name} started with run id {context.run_id}")
 
         data = deepcopy(self.parameters)
         if parameters:  # Override default parameters
             data.update((k, parameters[k]) for k in data.keys() & parameters.keys())
 
-        self.data_path.write_text(dumps(data))
-        for step in self._nodes:
-            data = step.run(data)
-            self.data_path.write_text(dumps(data))
-        logger.info("Workflow ended")
+        with span("workflow", workflow=self.name, run_id=context.run_id):
+            context.write("status.json", "Running")
+            context.write("data.json", data)
+            try:
+                nodes = self.plan()
+                for stage in self.stages(nodes):
+                    if len(stage) == 1:
+                        data = self._run_node(nodes, stage[0], data, context, cache)
+                    else:
+                        with ThreadPoolExecutor(
+                            max_workers=min(len(stage), cpu_count() or 1)
+                        ) as pool:
+                            futures = [
+                                pool.submit(
+                                    copy_context().run,
+                                    self._run_node,
+                                    nodes,
+                                    ind,
+                                    deepcopy(data),
+                                    context,
+                                    cache,
+                                )
+                                for ind in stage
+                            ]
+                            outputs = [f.result() for f in futures]
+                        data = combine(outputs, [node_writes(nodes[i]) for i in stage])
+                    context.write("data.json", data)
+            except Exception:
+                context.write("status.json", "Failed")
+                raise
+            finally:
+                context.write("metrics.json", context.metrics)
+            context.write("status.json", "Succeeded")
+        logger.info(f"Workflow ended. State written to {context.path}")
+        return data
+
+    @staticmethod
+    def _run_node(
+        nodes: list[Node],
+        ind: int,
+        data: dict[str, Any],
+        context: RunContext,
+        cache: RunCache | None = None,
+    ) -> dict[str, Any]:
+        node = nodes[ind]
+        step_context = context.for_step(f"step-{ind}-{node.argo_name}")
+        key = cache.key(node, data) if cache else None
+        if key and (cached := cache.get(key)) is not None:
+            logger.info(f"{step_context.step} is unchanged, using cached result")
+            cache.hits.append(step_context.step)
+            return cached
+        with span("node", node=step_context.step):
+            data = node.run(data, context=step_context)
+        if key:
+            cache.put(key, data)
+            cache.misses.append(step_context.step)
+        return data
+
+    def recommend_resources(
+        self, headroom: float = 1.25, argo_runs: list[dict[str, Any]] | None = None
+    ) -> dict[str, Resources]:
+        """
+        Recommended resources per template, based on the metrics of local runs and
+        of the pods of `argo_runs`, Argo workflows as JSON, e.g. from `argo get -o json`.
+        Runs labelled as another workflow are ignored.
+        """
+        metrics = load_metrics(self.name)
+        for run in argo_runs or []:
+            labels = (run.get("metadata") or {}).get("labels") or {}
+            if labels.get(WORKFLOW_LABEL, self.name) != self.name:
+                continue
+            for name, records in load_argo_metrics(run).items():
+                metrics.setdefault(name, []).extend(records)
+        return recommend(metrics, headroom=headroom)
 
-    def to_argo(self):
-        """Generate a pydantic model of the workflow."""
-        steps = StepsTemplate(name="main", steps=[])
-        arguments = None
+    def to_argo(self, sizing: dict[str, Resources] | None = None):
+        """
+        Generate a pydantic model of the workflow. Resources in `sizing` overwrite
+        the resources of the templates with matching names.
+        """
+        nodes = self.plan()
+        validate_dataflow(self.parameters, nodes, strict=self.strict_dataflow)
+        if self.compression:
+            if any(len(stage) > 1 for stage in self.stages(nodes)):
+                raise ValueError(
+                    "Parallel stages of auto_parallel are combined by expressions on plain JSON and cannot be used with compression."
+                )
+            if any(
+                isinstance(n, Foreach)
+                and isinstance(n.task, Sequence)
+                and isinstance(n.task.count, str)
+                for n in nodes
+            ):
+                raise ValueError(
+                    "Sequences counted by a parameter read it from the plain JSON inputs and cannot be used with compression."
+                )
+            nodes = [
+                n.model_copy(update={"project_inputs": False})
+                if isinstance(n, Foreach)
+                else n
+                for n in nodes
+            ]
+        # The data enters main as its input, defaulting to the workflow parameters,
+        # so that main can also be referenced from other workflows
+        default = WorkflowNode._default_inputs(self.parameters)
+        steps = StepsTemplate(
+            name="main",
+            inputs={"parameters": [Parameter(name="inputs", default=default)]},
+            steps=[],
+        )
+        arguments = {
+            "parameters": [
+                Parameter(name="inputs", value="{{inputs.parameters.inputs}}")
+            ]
+        }
         templates = []
-        for ind, node in enumerate(self._nodes):
-            t = node.get_templates(
-                step_counter=ind,
-                default_image=self.image,
-                image_pull_policy=self.image_pull_policy,
-                default_secrets=self.secrets,
-                default_parameters=self.parameters,
-                default_retry=self.retry,
-            )
-            s = Task(
-                name=f"step-{ind}-{node.argo_name}",
-                template=f"step-{ind}-{node.argo_name}",
-                arguments=arguments,
+        for stage in self.stages(nodes):
+            group = []
+            for ind in stage:
+                node = nodes[ind]
+                t = node.get_templates(
+                    step_counter=ind,
+                    default_image=self.image,
+                    image_pull_policy=self.image_pull_policy,
+                    default_secrets=self.secrets,
+                    default_parameters=self.parameters,
+                    default_retry=self.retry,
+                    default_resources=self.resources,
+                )
+                group.append(
+                    Task(
+                        name=f"step-{ind}-{node.argo_name}",
+                        template=f"step-{ind}-{node.argo_name}",
+                        arguments=arguments,
+                    )
+                )
+                templates.extend(t)
+            steps.steps.append(group)
+            arguments = self._next_argument(stage, nodes)
+
+        if self.compression:
+            for template in templates:
+                if isinstance(template, ScriptTemplate):
+                    template.script.env.append(
+                        Parameter(name="PARGO_COMPRESSION", value=self.compression)
+                    )
+
+        if not steps.steps:
+            expression = "inputs.parameters.inputs"
+        elif len(steps.steps[-1]) > 1:
+            # The data after a parallel stage only exists as an expression
+            expression = self._stage_expression(self.stages(nodes)[-1], nodes)
+        else:
+            expression = (
+                f"steps['{steps.steps[-1][0].name}'].outputs.parameters.outputs"
             )
-            steps.steps.append([s])
-            templates.extend(t)
-            arguments = self._next_argument(ind, node.argo_name)
+        steps.outputs = {
+            "parameters": [
+                Parameter(name="outputs", valueFrom={"expression": expression})
+            ]
+        }
 
         spec = WorkflowSpec(
             entrypoint="main",
@@ -170,20 +409,25 @@ class Workflow(BaseModel):
             podGC=PodGC(),
             parallelism=self.parallelism,
             podMetadata=self.pod_metadata,
+            workflowMetadata={"labels": {WORKFLOW_LABEL: self.name}},
         )
 
         wf = WorkflowResource(
             kind="WorkflowTemplate",
-            metadata=Metadata(name=self.name),
+            metadata=Metadata(name=self.name, labels={WORKFLOW_LABEL: self.name}),
             spec=spec,
         )
+        if sizing:
+            apply_sizing(wf, sizing)
         return wf
 
-    def to_yaml(self, path: Path | str = ""):  # FIXME write/dump ?
+    def to_yaml(
+        self, path: Path | str = "", sizing: dict[str, Resources] | None = None
+    ):  # FIXME write/dump ?
         """Write manifest(s) to run the workflow on Argo Workflows."""
         if isinstance(path, str):
             path = Path(path)
-        wf = self.to_argo()
+        wf = self.to_argo(sizing=sizing)
         yaml_str = wf.model_dump(exclude_none=True)
         Path(path / (self.name + ".yaml")).write_text(
             safe_dump(yaml_str, sort_keys=False),
@@ -191,28 +435,63 @@ class Workflow(BaseModel):
             newline="\n",
         )
 
+        config_maps = self.config_maps()
+        if config_maps:
+            Path(path / (self.name + "-configmaps.yaml")).write_text(
+                safe_dump_all(
+                    [c.model_dump(exclude_none=True) for c in config_maps],
+                    sort_keys=False,
+                ),
+                encoding="utf-8",
+                newline="\n",
+            )
+
         if self.schedules:
             self.to_yaml_cron(path=path)
 
-        if self.trigger_on:
-            sensor = Sensor(
-                name=self.name,
-                trigger_on=self.trigger_on,
-                parameters=self.trigger_on_parameters,
+        if self.trigger_on and self.sensor_group:
+            logger.info(
+                f"Sensor of {self.name} is part of sensor group {self.sensor_group}, see Workflow.to_yaml_sensor_groups"
             )
-            sensor.to_yaml(path=path)
+        elif self.trigger_on:
+            self.sensor().to_yaml(path=path)
+
+    def config_maps(self) -> list[ConfigMap]:
+        """ConfigMaps holding the Foreach lists offloaded from the manifest."""
+        maps = [n.config_map() for n in self.plan() if isinstance(n, Foreach)]
+        return [m for m in maps if m is not None]
+
+    def sensor(self) -> Sensor:
+        """Sensor for triggered execution. Matches upstream workflows by label when in a sensor group."""
+        return Sensor(
+            name=self.name,
+            trigger_on=self.trigger_on,
+            parameters=self.trigger_on_parameters,
+            match_labels=self.sensor_group is not None,
+        )
+
+    @staticmethod
+    def to_yaml_sensor_groups(workflows: list[Workflow], path: Path | str = ""):
+        """Write one shared sensor manifest per `sensor_group` of the workflows."""
+        if isinstance(path, str):
+            path = Path(path)
+        for group in SensorGroup.from_workflows(workflows):
+            group.to_yaml(path=path)
 
     def to_yaml_cron(self, path):  # FIXME write_cron_yaml/manifest?
         """Write manifest for scheduled execution on Argo Workflows."""
-        if self.schedules_parameters:
-            arguments = {
-                "parameters": [
-                    {"name": k, "value": dumps(v)}
-                    for k, v in self.schedules_parameters.items()
-                ]
-            }
-        else:
-            arguments = None
+        parameters = [
+            {"name": k, "value": dumps(v)}
+            for k, v in (self.schedules_parameters or {}).items()
+        ]
+        if self.scheduled_time_parameter:
+            parameters.append(
+                {
+                    "name": self.scheduled_time_parameter,
+                    "value": '"{{workflow.scheduledTime}}"',
+                }
+            )
+        arguments = {"parameters": parameters} if parameters else None
 
         wf = CronWorkflow(
             metadata=Metadata(name=self.name),
@@ -231,32 +510,35 @@ class Workflow(BaseModel):
         )
 
     @staticmethod
-    def _next_argument(ind: int, name: str):
-        parameters = [
-            Parameter(
-                name="inputs",
-                value=f"{{{{steps.step-{ind}-{name}.outputs.parameters.outputs}}}}",
-            )
+    def _stage_expression(stage: list[int], nodes: list[Node]) -> str:
+        """Expression combining the outputs of a parallel stage, like `combine`."""
+        outputs = [
+            f"fromJSON(steps['step-{ind}-{nodes[ind].argo_name}'].outputs.parameters.outputs)"
+            for ind in stage
         ]
-        return {"parameters": parameters}
+        writes = [sorted(node_writes(nodes[ind])) for ind in stage]
+        others = sorted(set().union(*writes[1:]))
+        omitted = "".join(f', "{k}"' for k in others)
+        parts = [f"sprig.omit({outputs[0]}{omitted})"]
+        for output, keys in zip(outputs[1:], writes[1:]):
+            picked = "".join(f', "{k}"' for k in keys)
+            parts.append(f"sprig.pick({output}{picked})")
+        return f"toJSON(sprig.mergeOverwrite({', '.join(parts)}))"
 
-    def __and__(self, other):
-        if isinstance(other, Workflow):
-            if self.name == other.name:
-                return Condition(items=[self.name])
-            return Condition(items=[f"{self.name} && {other.name}"])
+    @classmethod
+    def _next_argument(cls, stage: list[int], nodes: list[Node]):
+        if len(stage) == 1:
+            name = f"step-{stage[0]}-{nodes[stage[0]].argo_name}"
+            value = f"{{{{steps.{name}.outputs.parameters.outputs}}}}"
         else:
-            if len(other.items) > 1:
-                raise ValueError("Invalid: cannot do (A | B) & C")
-            return Condition(items=[f"{self.name} && {other.items[0]}"])
+            value = f"{{{{={cls._stage_expression(stage, nodes)}}}}}"
+        return {"parameters": [Parameter(name="inputs", value=value)]}
+
+    def __and__(self, other):
+        return Condition.of(self) & other
 
     def __or__(self, other):
-        if isinstance(other, Workflow):
-            if self.name == other.name:
-                return Condition(items=[self.name])
-            return Condition(items=[self.name, other.name])
-        else:
-            return Condition(items=[self.name] + other.items)
+        return Condition.of(self) | other
 
     def __repr__(self):
         return f"{self.__class__.__name__}<name={self.name}>"
@@ -275,4 +557,5 @@ class Workflow(BaseModel):
 # Rebuilding the pydantic model after Workflow is defined
 Condition.model_rebuild()
 Sensor.model_rebuild()
+SensorGroup.model_rebuild()
 WorkflowNode.model_rebuild()
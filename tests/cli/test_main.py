@@ -1,11 +1,18 @@
 import sys
+from datetime import datetime, timezone
 from json import dumps, loads
-from os import environ
+from os import environ, utime
 from pathlib import Path
+from threading import Thread
+from time import sleep, time
 
 from pytest import raises
 
-from pargo.cli.main import cli
+from pargo.cli.main import backfill, cli, watch
+
+
+def _utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
 
 
 def write_workflow_file(tmp_path):
@@ -33,10 +40,10 @@ def test_cli_run(monkeypatch, tmp_path):
 
     wf_path = write_workflow_file(tmp_path)
 
-    monkeypatch.setattr(sys, "argv", ["pargo", "run", str(wf_path)])
+    monkeypatch.setattr(sys, "argv", ["pargo", "run", str(wf_path), "--run-id", "test"])
     cli()
 
-    data_path = Path(environ["PARGO_DIR"]) / "testflow" / "data.json"
+    data_path = Path(environ["PARGO_DIR"]) / "testflow" / "test" / "data.json"
     data = loads(data_path.read_text())
     assert data["x"] == 2
 
@@ -45,10 +52,10 @@ def test_cli_run_with_defaults(monkeypatch, tmp_path):
     """Test that defaults are set correctly."""
 
     wf_path = write_workflow_file(tmp_path)
-    monkeypatch.setattr(sys, "argv", ["pargo", "run", str(wf_path)])
+    monkeypatch.setattr(sys, "argv", ["pargo", "run", str(wf_path), "--run-id", "test"])
     cli()
 
-    data_path = Path(environ["PARGO_DIR"]) / "testflow" / "data.json"
+    data_path = Path(environ["PARGO_DIR"]) / "testflow" / "test" / "data.json"
     data = loads(data_path.read_text())
     assert data["x"] == 2
     assert data["int_param"] == 5
@@ -69,6 +76,8 @@ def test_cli_run_with_params(monkeypatch, tmp_path):
             "pargo",
             "run",
             str(wf_path),
+            "--run-id",
+            "test",
             "--param",
             "x=5",
             "--param",
@@ -85,7 +94,7 @@ def test_cli_run_with_params(monkeypatch, tmp_path):
     )
     cli()
 
-    data_path = Path(environ["PARGO_DIR"]) / "testflow" / "data.json"
+    data_path = Path(environ["PARGO_DIR"]) / "testflow" / "test" / "data.json"
     data = loads(data_path.read_text())
     assert data["x"] == 10
     assert data["int_param"] == 10
@@ -115,14 +124,18 @@ def test_cli_run_with_name(monkeypatch, tmp_path):
         "wf2 = Workflow.new(name='second', parameters={'x': 2}).next(double)\n"
     )
 
-    monkeypatch.setattr(sys, "argv", ["pargo", "run", str(wf_path)])
+    monkeypatch.setattr(sys, "argv", ["pargo", "run", str(wf_path), "--run-id", "test"])
     cli()
-    data_path = Path(environ["PARGO_DIR"]) / "second" / "data.json"
+    data_path = Path(environ["PARGO_DIR"]) / "second" / "test" / "data.json"
     data = loads(data_path.read_text())
     assert data["x"] == 4
 
-    data_path = Path(environ["PARGO_DIR"]) / "first" / "data.json"
-    monkeypatch.setattr(sys, "argv", ["pargo", "run", str(wf_path), "--name", "first"])
+    data_path = Path(environ["PARGO_DIR"]) / "first" / "test" / "data.json"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["pargo", "run", str(wf_path), "--name", "first", "--run-id", "test"],
+    )
     cli()
     data = loads(data_path.read_text())
     assert data["x"] == 2
@@ -187,3 +200,246 @@ def test_cli_generate_with_name(monkeypatch, tmp_path):
 
     out_file = outdir / "first.yaml"
     assert out_file.exists()
+
+
+def test_cli_generate_apply_sizing(monkeypatch, tmp_path):
+    """Test that measured resources are applied using --apply-sizing."""
+    wf_path = write_workflow_file(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["pargo", "run", str(wf_path)])
+    cli()
+
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["pargo", "generate", str(wf_path), "--outdir", str(outdir), "--apply-sizing"],
+    )
+    cli()
+
+    content = (outdir / "testflow.yaml").read_text()
+    assert "resources:" in content
+    assert "cpu:" in content
+
+
+def test_cli_sizing_argo_run(monkeypatch, tmp_path, capsys):
+    """Test that pod metrics of Argo runs are used with --argo-run."""
+    wf_path = write_workflow_file(tmp_path)
+    metrics = [{"name": "step-0-double", "duration": 1.0, "cpu_seconds": 0.5}]
+    run = {
+        "status": {
+            "nodes": {
+                "testflow-abc": {
+                    "templateName": "step-0-double",
+                    "outputs": {
+                        "parameters": [{"name": "metrics", "value": dumps(metrics)}]
+                    },
+                }
+            }
+        }
+    }
+    run_path = tmp_path / "run.json"
+    run_path.write_text(dumps(run))
+    monkeypatch.setattr(
+        sys, "argv", ["pargo", "sizing", str(wf_path), "--argo-run", str(run_path)]
+    )
+    cli()
+    assert '"cpu":"625m"' in capsys.readouterr().out
+
+
+def test_cli_generate_all(monkeypatch, tmp_path):
+    """Test that all manifests and sensor groups are generated using --all."""
+    wf_path = tmp_path / "wf.py"
+    wf_path.write_text(
+        "from pargo import Workflow\n"
+        "wf1 = Workflow.new(name='first')\n"
+        "wf2 = Workflow.new(name='second', trigger_on=wf1, sensor_group='group')\n"
+    )
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["pargo", "generate", str(wf_path), "--all", "--outdir", str(tmp_path)],
+    )
+    cli()
+
+    assert (tmp_path / "first.yaml").exists()
+    assert (tmp_path / "second.yaml").exists()
+    assert (tmp_path / "group-sensors.yaml").exists()
+
+
+def test_cli_estimate(monkeypatch, tmp_path, capsys):
+    """Test that pargo estimate prints the pod count."""
+    wf_path = write_workflow_file(tmp_path)
+
+    monkeypatch.setattr(sys, "argv", ["pargo", "estimate", str(wf_path)])
+    cli()
+
+    output = capsys.readouterr().out
+    assert "step-0-double" in output
+    assert output.splitlines()[-1].split()[:2] == ["total", "1"]
+
+
+def test_cli_explain(monkeypatch, tmp_path, capsys):
+    """Test that pargo explain prints the stage, reads and writes of each node."""
+    wf_path = write_workflow_file(tmp_path)
+
+    monkeypatch.setattr(sys, "argv", ["pargo", "explain", str(wf_path)])
+    cli()
+
+    assert capsys.readouterr().out.splitlines()[-1].split() == [
+        "0",
+        "step-0-double",
+        "x",
+        "x",
+    ]
+
+
+def test_cli_emulate(monkeypatch, tmp_path, capsys):
+    """Test that pargo emulate runs the generated manifest and prints the result."""
+    wf_path = write_workflow_file(tmp_path)
+
+    monkeypatch.setattr(
+        sys, "argv", ["pargo", "emulate", str(wf_path), "--param", "x=4"]
+    )
+    cli()
+
+    assert loads(capsys.readouterr().out.splitlines()[-1])["x"] == 8
+
+
+def test_cli_watch(monkeypatch, tmp_path):
+    """Test that watch reruns on changes of task modules, reusing unchanged steps."""
+    monkeypatch.syspath_prepend(str(tmp_path))
+    tasks_path = tmp_path / "watched_tasks.py"
+    tasks_path.write_text("def add(x: int):\n    return {'x': x + 1}\n")
+    wf_path = tmp_path / "wf.py"
+    wf_path.write_text(
+        "from pargo import Workflow\n"
+        "from pargo.utils import double\n"
+        "from watched_tasks import add\n"
+        "wf = Workflow.new(name='watchflow', parameters={'x': 1}).next(double).next(add)\n"
+    )
+    runs = Path(environ["PARGO_DIR"]) / "watchflow"
+
+    def results():
+        files = sorted(runs.glob("*/data.json"), key=lambda f: f.stat().st_mtime)
+        statuses = [loads(f.with_name("status.json").read_text()) for f in files]
+        return [loads(f.read_text()) for f, s in zip(files, statuses) if s != "Running"]
+
+    thread = Thread(
+        target=watch, args=(wf_path,), kwargs={"interval": 0.05, "max_runs": 2}
+    )
+    thread.start()
+    while not results():
+        sleep(0.05)
+    tasks_path.write_text("def add(x: int):\n    return {'x': x + 10}\n")
+    utime(tasks_path, (time() + 10, time() + 10))
+    thread.join(timeout=30)
+
+    assert [r["x"] for r in results()] == [3, 12]
+    cached = list((runs / "cache").glob("*.json"))
+    assert len(cached) == 3
+
+
+def test_cli_generate_lazy(monkeypatch, tmp_path):
+    """Test that generate --lazy gives the same manifest without importing tasks."""
+    monkeypatch.syspath_prepend(str(tmp_path))
+    (tmp_path / "heavy_tasks.py").write_text(
+        "from typing import TypedDict\n"
+        "class Y(TypedDict):\n"
+        "    y: int\n"
+        "def make_y(x: int) -> Y:\n"
+        "    return {'y': x}\n"
+    )
+    wf_path = tmp_path / "wf.py"
+    wf_path.write_text(
+        "from pargo import Foreach, Workflow\n"
+        "from pargo.utils import double, add_item\n"
+        "from heavy_tasks import make_y\n"
+        "wf = Workflow.new(name='lazyflow', parameters={'x': 1}, auto_parallel=True)"
+        ".next(double, cache=True).next(make_y).next(Foreach([1]).then(add_item))\n"
+    )
+    for outdir, flags in (("lazy", ["--lazy"]), ("eager", [])):
+        (tmp_path / outdir).mkdir()
+        argv = ["pargo", "generate", str(wf_path), "--outdir", str(tmp_path / outdir)]
+        monkeypatch.setattr(sys, "argv", argv + flags)
+        cli()
+        assert ("heavy_tasks" in sys.modules) == (outdir == "eager")
+
+    lazy = (tmp_path / "lazy" / "lazyflow.yaml").read_text()
+    assert lazy == (tmp_path / "eager" / "lazyflow.yaml").read_text()
+    monkeypatch.delitem(sys.modules, "heavy_tasks")
+
+
+def test_cli_backfill(monkeypatch, tmp_path, capsys):
+    """Test that backfill runs every scheduled time once and resumes failed runs."""
+    monkeypatch.syspath_prepend(str(tmp_path))
+    tasks_path = tmp_path / "backfill_tasks.py"
+    tasks_path.write_text(
+        "def stamp(day: str):\n"
+        "    if day.startswith('2024-01-02'):\n"
+        "        raise ValueError('bad day')\n"
+        "    return {'stamped': day}\n"
+    )
+    wf_path = tmp_path / "wf.py"
+    wf_path.write_text(
+        "from pargo import Workflow\n"
+        "from backfill_tasks import stamp\n"
+        "wf = Workflow.new(name='dailyflow', parameters={'day': ''},\n"
+        "    schedules=['0 6 * * *'], scheduled_time_parameter='day').next(stamp)\n"
+    )
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "pargo",
+            "backfill",
+            str(wf_path),
+            "--from",
+            "2024-01-01",
+            "--to",
+            "2024-01-04",
+        ],
+    )
+    with raises(SystemExit):
+        cli()
+    assert (
+        capsys.readouterr().out.splitlines()[-1] == "2 succeeded, 1 failed, 0 skipped"
+    )
+
+    runs = Path(environ["PARGO_DIR"]) / "dailyflow"
+    data = loads((runs / "backfill-20240101T060000" / "data.json").read_text())
+    assert data["stamped"] == "2024-01-01T06:00:00+00:00"
+
+    tasks_path.write_text("def stamp(day: str):\n    return {'stamped': day}\n")
+    report = backfill(wf_path, _utc(2024, 1, 1), _utc(2024, 1, 4), workers=2)
+    assert [e["status"] for e in report] == ["Skipped", "Succeeded", "Skipped"]
+
+
+def test_cli_run_graph(monkeypatch, tmp_path, capsys):
+    """Test that run-graph runs workflows triggered across files."""
+    (tmp_path / "upstream.py").write_text(
+        "from pargo import Workflow\n"
+        "from pargo.utils import double\n"
+        "up = Workflow.new(name='upflow', parameters={'x': 1}).next(double)\n"
+    )
+    (tmp_path / "downstream.py").write_text(
+        "from pargo import Condition, Workflow\n"
+        "from pargo.utils import double\n"
+        "down = Workflow.new(name='downflow', parameters={'x': 1},\n"
+        "    trigger_on=Condition(name='upflow'), trigger_on_parameters=[{'x': 5}]).next(double)\n"
+    )
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "pargo",
+            "run-graph",
+            str(tmp_path / "upstream.py"),
+            str(tmp_path / "downstream.py"),
+        ],
+    )
+    cli()
+
+    assert capsys.readouterr().out.splitlines()[-1] == "2 succeeded, 0 failed"
+    runs = list((Path(environ["PARGO_DIR"]) / "downflow").glob("*/data.json"))
+    assert [loads(r.read_text())["x"] for r in runs] == [10]
@@ -0,0 +1,43 @@
+from pargo.nodes.chain import StepChain, fuse_steps
+from pargo.nodes.step import StepNode
+from pargo.nodes.when import When
+from pargo.utils import choice, double, triple
+
+
+def test_stepchain_run():
+    """Test that StepChain.run runs the steps in sequence."""
+    node = StepChain(task=[StepNode(task=double), StepNode(task=triple)])
+    result = node.run({"x": 1})
+    assert result["x"] == 6
+
+
+def test_stepchain_get_templates():
+    """Test that StepChain.get_templates gives a single template."""
+    node = StepChain(task=[StepNode(task=double), StepNode(task=triple)])
+    templates = node.get_templates(
+        step_counter=0,
+        default_image="image",
+        image_pull_policy="Always",
+        default_secrets=None,
+        default_parameters=[],
+        default_retry=None,
+    )
+    assert len(templates) == 1
+    assert templates[0].name == "step-0-double-triple"
+    assert "run_steps" in templates[0].script.source
+
+
+def test_fuse_steps():
+    """Test that only consecutive compatible steps are fused."""
+    nodes = [
+        StepNode(task=double),
+        StepNode(task=triple),
+        When(choice).then(double),
+        StepNode(task=double),
+        StepNode(task=triple, image="other"),
+        StepNode(task=double, image="other"),
+    ]
+    fused = fuse_steps(nodes)
+    assert [type(n) for n in fused] == [StepChain, When, StepNode, StepChain]
+    assert fused[0].argo_name == "double-triple"
+    assert fused[3].image == "other"
@@ -1,6 +1,8 @@
+from json import loads
+
 import pytest
 
-from pargo import Foreach
+from pargo import Foreach, Resources
 from pargo.utils import add_item, add_y, double, get_items, triple
 
 
@@ -99,8 +101,224 @@ def test_foreach_get_templates_list():
     assert templates[2].name == "step-1-foreach-merge"
 
 
-def test_foreach_then_twice_raises():
-    """Test that wrong order fails."""
-    node = Foreach(get_items).then(double)
-    with pytest.raises(RuntimeError, match="must follow Foreach"):
-        node.then(triple)
+def test_foreach_without_then_raises():
+    """Test that a Foreach without tasks fails."""
+    with pytest.raises(RuntimeError, match="must be followed by"):
+        Foreach(get_items).run({"x": 1})
+
+
+def test_foreach_chain():
+    """Test that chained tasks run in sequence for each item."""
+    data = {"x": 1}
+
+    node = Foreach([1, 2]).then(double).then(add_item).then(triple)
+    result = node.run(data)
+
+    assert result["x"] == 6
+    assert sorted(result["y"]) == [3, 4]
+
+
+def test_foreach_chain_get_templates():
+    """Test that chained tasks are rendered as a single template."""
+    node = Foreach([1, 2]).then(double).then(triple)
+    templates = node.get_templates(
+        step_counter=1,
+        default_image="image",
+        image_pull_policy="Always",
+        default_secrets=None,
+        default_parameters=[],
+        default_retry=None,
+    )
+
+    assert len(templates) == 3
+    assert templates[1].name == "step-1-foreach-double-triple"
+    assert "run_steps" in templates[1].script.source
+    assert templates[1].script.env[-1].name == "PARGO_ITEM"
+
+
+def test_foreach_chain_incompatible_image():
+    """Test that tasks with different images cannot be chained."""
+    node = Foreach([1, 2]).then(double).then(triple, image="other")
+    with pytest.raises(ValueError, match="must share image"):
+        node.get_templates(
+            step_counter=1,
+            default_image="image",
+            image_pull_policy="Always",
+            default_secrets=None,
+            default_parameters=[],
+            default_retry=None,
+        )
+
+
+def test_foreach_cache():
+    """Test that producer and item templates are memoized, with the item in the key."""
+    node = Foreach(get_items, cache=True).then(double, cache=True)
+    templates = node.get_templates(
+        step_counter=1,
+        default_image="image",
+        image_pull_policy="Always",
+        default_secrets=None,
+        default_parameters=[],
+        default_retry=None,
+    )
+
+    assert templates[1].memoize is not None
+    assert "inputs.parameters.item" not in templates[1].memoize.key
+    assert "inputs.parameters.item" in templates[2].memoize.key
+    assert templates[3].memoize is None
+
+
+def test_foreach_processes():
+    """Test that Foreach runs items on a process pool locally."""
+    node = Foreach([1, 2, 3], processes=2).then(add_item)
+    result = node.run({"x": 5})
+
+    assert result["y"] == [6, 7, 8]
+
+
+def test_foreach_item_timeout():
+    """Test that item pods get a deadline and a retry for idempotent tasks only."""
+    with pytest.raises(ValueError, match="require idempotent=True"):
+        Foreach([1, 2], item_timeout=60)
+
+    node = Foreach([1, 2], idempotent=True, item_timeout=60).then(add_item)
+    template = node.get_templates(0, "python:3.11", "Always", None, {"x": 1}, None)[1]
+    assert template.activeDeadlineSeconds == 60
+    assert template.retryStrategy.limit == 1
+
+    node = Foreach([1, 2], idempotent=True, speculative_percentile=90).then(add_item)
+    assert node.run({"x": 5})["y"] == [6, 7]
+
+
+def test_foreach_shard_get_templates():
+    """Test that sharded Foreach runs shards on a process pool with /dev/shm."""
+    node = Foreach([1, 2, 3], shard_size=2).then(add_item)
+    templates = node.get_templates(
+        step_counter=1,
+        default_image="image",
+        image_pull_policy="Always",
+        default_secrets=None,
+        default_parameters=[],
+        default_retry=None,
+        default_resources=Resources(requests={"cpu": "3500m"}),
+    )
+
+    task = templates[0].dag["tasks"][0]
+    assert loads(task.withParam) == [[1, 2], [3]]
+    shard = templates[1]
+    assert 'run_shard([("add_item", "pargo.utils")], "item", processes=4)' in (
+        shard.script.source
+    )
+    env = {e.name: e.value for e in shard.script.env}
+    assert env["PARGO_SHARD"] == "{{inputs.parameters.item}}"
+    assert shard.volumes[0].emptyDir.medium == "Memory"
+    assert shard.script.volumeMounts[0].mountPath == "/dev/shm"
+
+
+def test_foreach_offload():
+    """Test that large literal lists are referenced from a ConfigMap."""
+    items = list(range(100))
+    node = Foreach(items, offload_size=100).then(add_item)
+    config_map = node.config_map()
+    dag = node.get_templates(
+        step_counter=1,
+        default_image="image",
+        image_pull_policy="Always",
+        default_secrets=None,
+        default_parameters={"x": 1},
+        default_retry=None,
+    )[0]
+
+    assert [loads(item) for item in loads(config_map.data["items"])] == items
+    ref = dag.inputs["parameters"][1].valueFrom["configMapKeyRef"]
+    assert ref == {"name": config_map.metadata.name, "key": "items"}
+    assert dag.dag["tasks"][0].withParam == "{{inputs.parameters.items}}"
+    assert Foreach(items).then(add_item).config_map() is None
+    assert node.run({"x": 1})["y"] == [i + 1 for i in items]
+
+
+def test_foreach_offload_limit():
+    """Test that lists too large for a ConfigMap are rejected."""
+    node = Foreach(["x" * 1024] * 1100).then(add_item)
+    with pytest.raises(ValueError, match="ConfigMap limit"):
+        node.config_map()
+
+
+def test_foreach_tree_get_templates():
+    """Test that a tree merge adds a recursive DAG merging groups of outputs."""
+    node = Foreach(list(range(5)), merge_group_size=2).then(add_item)
+    templates = node.get_templates(
+        step_counter=1,
+        default_image="image",
+        image_pull_policy="Always",
+        default_secrets=None,
+        default_parameters={"x": 1},
+        default_retry=None,
+    )
+    names = [t.name for t in templates]
+    assert "step-1-foreach-tree" in names and "step-1-foreach-merge-partial" in names
+
+    tasks = templates[0].dag["tasks"]
+    assert tasks[0].template == "step-1-foreach-tree"
+    assert tasks[0].arguments["parameters"][2].value == "3"
+    assert loads(tasks[0].arguments["parameters"][1].value) == [
+        [["0", "1"], ["2", "3"]],
+        [["4"]],
+    ]
+    assert tasks[1].depends == "step-1-foreach-tree.Succeeded"
+
+    group = templates[names.index("step-1-foreach-tree")].dag["tasks"][0]
+    assert group.template == "step-1-foreach-tree"
+    assert node.run({"x": 1})["y"] == [1, 2, 3, 4, 5]
+
+
+def test_foreach_project_inputs():
+    """Test that item pods only get the keys their tasks read."""
+    node = Foreach([1, 2]).then(add_item)
+    templates = node.get_templates(
+        step_counter=1,
+        default_image="image",
+        image_pull_policy="Always",
+        default_secrets=None,
+        default_parameters={"x": 1, "big": 2},
+        default_retry=None,
+    )
+    then, merge = templates[0].dag["tasks"]
+    inputs = then.arguments["parameters"][0].value
+    assert inputs == '{{=toJSON(sprig.pick(fromJSON(inputs.parameters.inputs), "x"))}}'
+    assert merge.arguments["parameters"][1].value == "{{inputs.parameters.inputs}}"
+    env = {e.name: e.value for e in templates[-1].script.env}
+    assert env["PARGO_STATE"] == "{{inputs.parameters.state}}"
+
+    node = Foreach([1, 2], project_inputs=False).then(add_item)
+    then = node._get_dag("block", {"x": 1}).dag["tasks"][0]
+    assert then.arguments["parameters"][0].value == "{{inputs.parameters.inputs}}"
+
+
+def test_foreach_range():
+    """Test that Foreach iterates ranges and sequences counted by a parameter."""
+    assert Foreach(range(1, 6, 2)).then(add_item).run({"x": 0})["y"] == [1, 3, 5]
+
+    node = Foreach.sequence(count="n", start=1).then(add_item)
+    assert node.run({"x": 0, "n": 3})["y"] == [1, 2, 3]
+
+
+def test_foreach_range_get_templates():
+    """Test that ranges render to withSequence, independent of their length."""
+    node = Foreach(range(5, 5 + 2 * 10**6, 2)).then(add_item)
+    dag = node.get_templates(
+        step_counter=1,
+        default_image="image",
+        image_pull_policy="Always",
+        default_secrets=None,
+        default_parameters={"x": 1},
+        default_retry=None,
+    )[0]
+
+    task = dag.dag["tasks"][0]
+    assert task.withParam is None
+    assert task.withSequence == {"count": "1000000", "start": "0"}
+    assert task.arguments["parameters"][1].value == "{{=asInt(item) * 2 + 5}}"
+
+    dag = Foreach.sequence(count="n").then(add_item)._get_dag("block", {"x": 1})
+    assert "$.n" in dag.dag["tasks"][0].withSequence["count"]
@@ -0,0 +1,59 @@
+import sys
+from inspect import getsource, signature
+
+from pargo import LazyTask, Workflow
+from pargo.dataflow import produced_keys
+from pargo.nodes.lazy import lazy_imports
+from pargo.nodes.memoize import task_hash
+from pargo.utils import add_item, double
+
+TASKS = """from typing import TypedDict
+
+import not_installed_dependency
+
+
+class Total(TypedDict):
+    total: int
+
+
+def total(x: int, scale: int = 1, *, offset=0) -> Total:
+    return {"total": x * scale + offset}
+
+
+def double(x):
+    return {"x": 2 * x}
+"""
+
+
+def test_lazy_task_matches_import():
+    """Test that name, signature, source and outputs are read without importing."""
+    lazy = LazyTask.of("pargo.utils:add_item")
+    assert (lazy.__module__, lazy.__name__) == ("pargo.utils", "add_item")
+    assert lazy.source == getsource(add_item)
+    assert list(signature(lazy).parameters) == ["item", "x"]
+    assert task_hash(lazy, "add_item", "pargo.utils") == task_hash(
+        add_item, "add_item", "pargo.utils"
+    )
+    assert produced_keys(lazy) == produced_keys(add_item) == {"y"}
+    assert lazy(item=1, x=2) == {"y": 3}
+
+
+def test_lazy_imports(tmp_path, monkeypatch):
+    """Test that modules imported under lazy_imports are stubbed."""
+    monkeypatch.syspath_prepend(str(tmp_path))
+    (tmp_path / "lazy_tasks.py").write_text(TASKS)
+    with lazy_imports():
+        import lazy_tasks
+        from lazy_tasks import total
+    assert "lazy_tasks" not in sys.modules
+    assert isinstance(total, LazyTask) and lazy_tasks.double.__name__ == "double"
+    assert produced_keys(total) == {"total"}
+    assert produced_keys(lazy_tasks.double) == {"x"}
+    assert [p.default is p.empty for p in signature(total).parameters.values()] == [
+        True,
+        False,
+        False,
+    ]
+
+    testflow = Workflow.new("testflow", parameters={"x": 1}).next(total).next(double)
+    testflow.to_argo()
@@ -0,0 +1,30 @@
+from json import dumps
+
+import pytest
+
+from pargo.nodes.payload import FRAME, decode, encode
+
+
+def test_encode_gzip():
+    """Test that payloads are compressed when smaller, and decode transparently."""
+    data = {"x": 1, "values": list(range(1000))}
+    framed = encode(data, "gzip")
+    assert framed.startswith(f'"{FRAME}gzip:') and len(framed) < len(dumps(data))
+    assert framed == encode(data, "gzip"), "Payloads must be deterministic"
+    assert decode(framed) == data
+    assert encode({"x": 1}, "gzip") == dumps({"x": 1})
+
+
+def test_decode_aggregated():
+    """Test that frames in aggregated outputs and items are decoded."""
+    data = {"values": list(range(1000))}
+    framed = encode(data, "gzip")
+    assert decode(f"[{framed}, {dumps({'x': 1})}]") == [data, {"x": 1}]
+    assert decode(f'{{"item": {framed}}}') == {"item": data}
+
+
+def test_encode_zstd():
+    """Test that zstd payloads roundtrip when zstandard is installed."""
+    pytest.importorskip("zstandard")
+    data = {"values": list(range(1000))}
+    assert decode(encode(data, "zstd")) == data
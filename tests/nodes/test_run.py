@@ -1,14 +1,21 @@
 from json import dumps, loads
 from os import environ
+from time import perf_counter
 
 import pytest
 
 from pargo import utils as utils
 from pargo.nodes.run import (
+    RunContext,
     merge_foreach,
+    merge_partial,
     run_foreach,
+    run_shard,
+    run_speculative,
     run_step,
+    run_steps,
     run_when,
+    tree,
 )
 
 
@@ -19,6 +26,32 @@ def test_run_step(tmp_path):
 
     result = run_step("double", utils.__name__)
     assert "x" in result and result["x"] == 6
+    assert environ["PARGO_DATA"] == dumps({"x": 3}), "Environment must not change"
+
+
+def test_run_step_with_context(tmp_path):
+    """Test that run_step reads inputs from and writes outputs to an explicit context."""
+    context = RunContext(path=tmp_path / "run", data={"x": 3}, item={"item": 1})
+    result = run_step("add_item", utils.__name__, context=context)
+    assert result == {"x": 3, "y": 4}
+    assert loads((tmp_path / "run" / "data.json").read_text()) == {"x": 3, "y": 4}
+    metrics = loads((tmp_path / "run" / "metrics.json").read_text())
+    assert metrics[0]["name"] == "add_item"
+
+
+def test_run_context_from_env(tmp_path):
+    """Test that the remote context is read from the environment."""
+    env = {
+        "PARGO_DATA": dumps({"x": 1}),
+        "PARGO_ITEM": dumps({"item": 2}),
+        "PARGO_DIR": str(tmp_path),
+        "PARGO_RUN_ID": "run",
+    }
+    context = RunContext.from_env(env)
+    assert context.data == {"x": 1}
+    assert context.item == {"item": 2}
+    assert context.path == tmp_path
+    assert context.run_id == "run"
 
 
 @pytest.mark.parametrize("task", ["choice", "get_items"])
@@ -31,6 +64,17 @@ def test_run_step_task_with_invalid_return_type(tmp_path, task):
         run_step(task, utils.__name__)
 
 
+def test_run_steps(tmp_path):
+    """Test that run_steps runs the tasks in sequence and writes the final data."""
+    context = RunContext(path=tmp_path, data={"x": 1}, item={"item": 2})
+    tasks = [("double", utils.__name__), ("add_item", utils.__name__)]
+    result = run_steps(tasks, context=context)
+    assert result == {"x": 2, "y": 4}
+    assert loads((tmp_path / "data.json").read_text()) == result
+    metrics = loads((tmp_path / "metrics.json").read_text())
+    assert [m["name"] for m in metrics] == ["double+add_item"]
+
+
 def test_run_when(tmp_path):
     """Test that run_when produces boolean output."""
     data = {"x": 3}
@@ -70,6 +114,60 @@ def test_merge_foreach(tmp_path):
     assert sorted(merged["y"]) == [2, 3]
 
 
+def test_merge_foreach_state(tmp_path, monkeypatch):
+    """Test that merge_foreach restores the state not passed to projected items."""
+    monkeypatch.setenv("PARGO_DATA", dumps([{"x": 1, "y": 2}, {"x": 1, "y": 3}]))
+    monkeypatch.setenv("PARGO_STATE", dumps({"x": 1, "big": [0] * 10}))
+    merged = merge_foreach()
+    assert merged == {"x": 1, "big": [0] * 10, "y": [2, 3]}
+
+
+def test_run_foreach_sharded(tmp_path):
+    """Test that run_foreach emits shards of items when given a shard size."""
+    environ["PARGO_DATA"] = dumps({})
+    res = run_foreach("get_items", utils.__name__, shard_size=2)
+    assert res == [[1, 2], [3]]
+
+
+def test_run_shard(tmp_path, monkeypatch):
+    """Test that run_shard runs all items of the shard and merges them in-pod."""
+    monkeypatch.setenv("PARGO_DATA", dumps({"x": 5}))
+    monkeypatch.setenv("PARGO_SHARD", dumps([1, 2, 3]))
+    run_shard([("add_item", utils.__name__)], "item", processes=2)
+    partial = loads((tmp_path / ".pargo" / "data.json").read_text())
+
+    merged = merge_foreach([partial, {"x": 5, "y": 9}])
+    assert merged["x"] == 5
+    assert merged["y"] == [6, 7, 8, 9]
+
+
+def test_tree():
+    """Test that items are nested in groups until the top level fits in a group."""
+    assert tree([], 2) == (0, [])
+    assert tree([1, 2], 2) == (1, [1, 2])
+    assert tree([1, 2, 3, 4, 5], 2) == (3, [[[1, 2], [3, 4]], [[5]]])
+
+
+def test_run_foreach_tree(tmp_path):
+    """Test that run_foreach emits a nested list with its depth for a tree merge."""
+    environ["PARGO_DATA"] = dumps({})
+    res = run_foreach("get_items", utils.__name__, merge_group_size=2)
+    assert res == {"depth": 2, "items": [["1", "2"], ["3"]]}
+
+
+def test_merge_partial(tmp_path):
+    """Test that partial merges of groups combine to the merge of all items."""
+    items = [{"x": 1, "y": 2}, {"x": 1, "y": 3}, {"x": 1, "y": 4}]
+    partials = [merge_partial(items[:2]), merge_partial(items[2:])]
+    assert merge_foreach([merge_partial(partials)]) == merge_foreach(items)
+
+
+def test_merge_spans():
+    """Test that merge_foreach and merge_partial are each traced once."""
+    assert not hasattr(merge_partial.__wrapped__, "__wrapped__")
+    assert hasattr(merge_foreach, "__wrapped__")
+
+
 @pytest.mark.parametrize("task", ["double", "triple", "choice"])
 def test_run_foreach_task_with_invalid_return_type(tmp_path, task):
     """run_foreach should return a list. Test that it fails for invalid return types (dict, dict, bool)."""
@@ -78,3 +176,16 @@ def test_run_foreach_task_with_invalid_return_type(tmp_path, task):
 
     with pytest.raises(ValueError):
         run_foreach(task, utils.__name__)
+
+
+def test_run_speculative(tmp_path):
+    """Test that a straggling item is re-executed and the first result is kept."""
+    data = {"marker": str(tmp_path / "attempted")}
+    items = [{"item": i} for i in range(6)]
+    start = perf_counter()
+    results = run_speculative([("straggle", "tests.utils")], data, items, 3, 50)
+    assert perf_counter() - start < 30
+    assert [r["y"] for r in results] == list(range(6))
+
+    with pytest.raises(ValueError, match="must return a dict"):
+        run_speculative([("choice", "pargo.utils")], {"x": 1}, [{}], 1, 50)
@@ -1,5 +1,5 @@
 from pargo.nodes.step import StepNode
-from pargo.utils import double
+from pargo.utils import double, triple
 
 
 def test_stepnode_run(tmp_path):
@@ -26,3 +26,48 @@ def test_stepnode_get_templates():
 
     assert templates[0].name == "step-2-double"
     assert "python" in templates[0].script.command
+
+
+def test_stepnode_cache():
+    """Test that StepNode(cache=True) adds a memoize block keyed by code and inputs."""
+    node = StepNode(task=double, cache=True, cache_max_age="1h")
+    template = node.get_templates(
+        step_counter=0,
+        default_image="image",
+        image_pull_policy="Always",
+        default_secrets=None,
+        default_parameters=[],
+        default_retry=None,
+    )[0]
+
+    assert template.memoize is not None
+    assert template.memoize.maxAge == "1h"
+    assert template.memoize.key.startswith(node.code_hash)
+    assert "inputs.parameters.inputs" in template.memoize.key
+    assert StepNode(task=triple).code_hash != node.code_hash
+    assert (
+        StepNode(task=double)
+        .get_templates(
+            step_counter=0,
+            default_image="image",
+            image_pull_policy="Always",
+            default_secrets=None,
+            default_parameters=[],
+            default_retry=None,
+        )[0]
+        .memoize
+        is None
+    )
+
+
+def test_stepnode_cache_default_max_age():
+    """Test that memoize always has the maxAge Argo requires."""
+    template = StepNode(task=double, cache=True).get_templates(
+        step_counter=0,
+        default_image="image",
+        image_pull_policy="Always",
+        default_secrets=None,
+        default_parameters=[],
+        default_retry=None,
+    )[0]
+    assert template.model_dump(exclude_none=True)["memoize"]["maxAge"] == "8760h"
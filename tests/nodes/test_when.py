@@ -73,3 +73,19 @@ def test_when_otherwise_twice_raises():
     node = When(choice).then(double).otherwise(triple)
     with pytest.raises(RuntimeError, match="must follow then"):
         node.otherwise(double)
+
+
+def test_when_cache():
+    """Test that the condition template is memoized."""
+    node = When(choice, cache=True).then(double)
+    templates = node.get_templates(
+        step_counter=1,
+        default_image="image",
+        image_pull_policy="Always",
+        default_secrets=None,
+        default_parameters=[],
+        default_retry=None,
+    )
+
+    assert templates[1].memoize is not None
+    assert templates[2].memoize is None
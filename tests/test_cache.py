@@ -0,0 +1,32 @@
+from pargo import Foreach, Workflow
+from pargo.cache import RunCache, node_hash
+from pargo.nodes.step import StepNode
+from pargo.nodes.workflow import WorkflowNode
+from pargo.utils import add_item, double, triple
+
+
+def test_node_hash():
+    """Test that node hashes change with the code and configuration of the node."""
+    assert node_hash(StepNode(task=double)) == node_hash(StepNode(task=double))
+    assert node_hash(StepNode(task=double)) != node_hash(StepNode(task=triple))
+    assert node_hash(Foreach([1, 2]).then(add_item)) != node_hash(
+        Foreach([1, 3]).then(add_item)
+    )
+    assert node_hash(WorkflowNode(task=[Workflow.new("child")])) is None
+
+
+def test_workflow_run_cache(tmp_path):
+    """Test that only nodes with changed code or inputs run again."""
+    cache = RunCache(path=tmp_path / "cache")
+    testflow = Workflow.new("testflow", parameters={"x": 1}).next(double).next(triple)
+    assert testflow.run(cache=cache) == {"x": 6}
+    assert cache.misses == ["step-0-double", "step-1-triple"]
+
+    cache.misses.clear()
+    changed = Workflow.new("testflow", parameters={"x": 1}).next(double).next(double)
+    assert changed.run(cache=cache) == {"x": 4}
+    assert (cache.hits, cache.misses) == (["step-0-double"], ["step-1-double"])
+
+    disk = RunCache(path=tmp_path / "cache")
+    assert testflow.run({"x": 1}, cache=disk) == {"x": 6}
+    assert disk.misses == []
@@ -0,0 +1,171 @@
+from typing import TypedDict
+
+import pytest
+from loguru import logger
+
+from pargo import Foreach, When, Workflow
+from pargo.dataflow import (
+    DataflowError,
+    combine,
+    produced_keys,
+    required_inputs,
+    stages,
+)
+from pargo.emulator import Emulator
+from pargo.utils import add_item, add_y, choice, double, get_items, triple
+
+
+class Total(TypedDict):
+    total: int
+
+
+def total(x: int) -> Total:
+    return {"total": x}
+
+
+def opaque(x: int) -> dict:
+    return {f"key{x}": x}
+
+
+def use_total(total: int, scale: int = 1):
+    return {"x": total * scale}
+
+
+def square(x: int):
+    return {"square": x * x}
+
+
+def add_totals(total: int, square: int):
+    return {"sum": total + square}
+
+
+def test_produced_keys():
+    """Test that output keys come from TypedDict annotations or dict literals."""
+    assert produced_keys(total) == {"total"}
+    assert produced_keys(double) == {"x"}
+    assert produced_keys(opaque) is None
+    assert required_inputs(use_total) == {"total"}
+
+
+def test_dataflow_missing_parameter():
+    """Test that to_argo fails before generating anything for missing inputs."""
+    testflow = Workflow.new("testflow", strict_dataflow=True).next(double).next(triple)
+    with pytest.raises(DataflowError, match="step-0-double: `double` requires"):
+        testflow.to_argo()
+
+
+def test_dataflow_warning():
+    """Test that unsatisfied inputs only log a warning unless the check is strict."""
+    messages = []
+    handler = logger.add(messages.append, level="WARNING")
+    try:
+        Workflow.new("testflow").next(double).to_argo()
+    finally:
+        logger.remove(handler)
+    assert "step-0-double: `double` requires ['x']" in "".join(messages)
+
+
+def test_dataflow_produced_keys():
+    """Test that keys produced by earlier steps satisfy later steps."""
+    Workflow.new("testflow", parameters={"x": 1}).next(total).next(use_total).to_argo()
+
+    with pytest.raises(DataflowError, match="use-total"):
+        Workflow.new("testflow", parameters={"x": 1}, strict_dataflow=True).next(
+            use_total
+        ).to_argo()
+
+
+def test_dataflow_foreach_and_when():
+    """Test that the Foreach item is available to its tasks only."""
+    Workflow.new("testflow", parameters={"x": 1}).next(
+        Foreach(get_items).then(add_item)
+    ).next(When(choice).then(add_y)).to_argo()
+
+    testflow = (
+        Workflow.new("testflow", parameters={"x": 1}, strict_dataflow=True)
+        .next(Foreach(get_items).then(double))
+        .next(add_item)
+    )
+    with pytest.raises(
+        DataflowError, match="step-1-add-item: `add_item` requires \\['item'\\]"
+    ):
+        testflow.to_argo()
+
+
+def test_dataflow_unknown_outputs():
+    """Test that checking stops after steps with unknown output keys."""
+    Workflow.new("testflow", parameters={"x": 1}).next(opaque).next(use_total).to_argo()
+
+
+def test_dataflow_sequence_count():
+    """Test that the count parameter of a sequence must be available."""
+    testflow = Workflow.new("testflow", parameters={"x": 1}, strict_dataflow=True).next(
+        Foreach.sequence(count="n").then(add_item)
+    )
+    with pytest.raises(DataflowError, match="sequence count `n`"):
+        testflow.to_argo()
+
+
+def test_stages():
+    """Test that nodes writing disjoint keys the others do not read share a stage."""
+    nodes = (
+        Workflow.new("testflow", parameters={"x": 1})
+        .next(double)
+        .next(total)
+        .next(square)
+        .next(add_totals)
+        .next(opaque)
+        .next(square)
+        .plan()
+    )
+    assert stages(nodes) == [[0], [1, 2], [3], [4], [5]]
+    assert combine(
+        [{"x": 1, "total": 1}, {"x": 1, "total": 0, "square": 1}],
+        [{"total"}, {"square"}],
+    ) == {"x": 1, "total": 1, "square": 1}
+
+
+def produce_w(x: int):
+    return {"w": x + 1}
+
+
+def use_w(w: int, y: int):
+    return {"z": w + y}
+
+
+def reset_y():
+    return {"y": 100}
+
+
+def test_stages_keep_order():
+    """Test that a node writing a key an earlier node reads runs after it."""
+    testflow = (
+        Workflow.new("testflow", parameters={"x": 1, "y": 1})
+        .next(produce_w)
+        .next(use_w)
+        .next(reset_y)
+    )
+    assert stages(testflow.plan()) == [[0], [1], [2]]
+    expected = testflow.run()
+    assert expected["z"] == 3
+    assert testflow.model_copy(update={"auto_parallel": True}).run() == expected
+
+
+def test_auto_parallel():
+    """Test that parallel stages give the same data locally and on Argo."""
+    testflow = (
+        Workflow.new("testflow", parameters={"x": 3}, auto_parallel=True)
+        .next(double)
+        .next(total)
+        .next(square)
+    )
+    steps = testflow.to_argo().spec.templates[0]
+    assert [[s.name for s in group] for group in steps.steps] == [
+        ["step-0-double"],
+        ["step-1-total", "step-2-square"],
+    ]
+    assert "sprig.pick" in steps.outputs["parameters"][0].valueFrom["expression"]
+
+    expected = {"x": 6, "total": 6, "square": 36}
+    assert testflow.run() == Emulator(testflow.to_argo()).run() == expected
+    assert "1      step-2-square" in testflow.explain()
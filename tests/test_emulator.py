@@ -0,0 +1,120 @@
+import pytest
+
+from pargo import Foreach, When, Workflow
+from pargo.emulator import EmulationError, Emulator, evaluate, render
+from pargo.utils import add_item, choice, double, echo_item, get_items, triple
+from tests.utils import straggle
+
+
+def test_evaluate():
+    """Test the expression subset used by the generated templates."""
+    scope = {
+        "steps": {"when": {"outputs": {"parameters": {"outputs": "true"}}}},
+        "inputs": {"parameters": {"inputs": '{"x": 1}'}},
+    }
+    expression = 'steps["when"].outputs.parameters.outputs == "true" ? "then" : missing'
+    assert evaluate(expression, scope) == "then"
+    assert evaluate('sprig.trunc(4, sprig.replace("-", "", "ab-cd-ef"))', {}) == "abcd"
+    assert evaluate("!(1 + 1 == 2) || 3 > 2 && true", {}) is True
+    assert render('{"x": {{inputs.parameters.inputs}}}', scope) == '{"x": {"x": 1}}'
+    with pytest.raises(EmulationError):
+        render("{{inputs.parameters.missing}}", scope)
+
+
+def test_emulator_matches_run():
+    """Test that emulating the manifest gives the same result as a local run."""
+    testflow = (
+        Workflow.new("testflow", parameters={"x": 3}, parallelism=2)
+        .next(double)
+        .next(When(choice).then(double).otherwise(triple))
+        .next(Foreach(get_items).then(add_item))
+        .next(Foreach([]).then(add_item))
+    )
+    emulator = Emulator(testflow.to_argo(), workers=4)
+
+    assert emulator.run() == testflow.run() == {"x": 12, "y": [13, 14, 15]}
+    phases = {n.name.split(".")[-1]: n.phase for n in emulator.nodes}
+    assert phases["step-2-foreach-merge"] == "Succeeded"
+    assert "step-1-when-otherwise-triple" not in phases
+
+
+def test_emulator_string_items():
+    """Test that string items reach the pods as valid JSON."""
+    testflow = Workflow.new("testflow").next(Foreach(["a", 'b"c']).then(echo_item))
+    assert Emulator(testflow.to_argo()).run() == {}
+
+
+def test_emulator_failure():
+    """Test that failing pods fail the emulated workflow after retries."""
+    testflow = Workflow.new("testflow", parameters={"x": "a"}, retry=0).next(choice)
+    with pytest.raises(EmulationError, match="TypeError"):
+        Emulator(testflow.to_argo()).run()
+
+
+def test_emulator_project_inputs():
+    """Test that projected item inputs give the same result as a local run."""
+    testflow = Workflow.new(
+        "testflow", parameters={"x": 3, "big": list(range(100))}
+    ).next(Foreach([1, 2], merge_group_size=2, shard_size=1).then(add_item))
+    assert Emulator(testflow.to_argo()).run() == testflow.run()
+
+
+def test_emulator_compression():
+    """Test that compressed payloads between pods give the same result."""
+    testflow = (
+        Workflow.new(
+            "testflow", parameters={"x": 3, "big": [0] * 1000}, compression="gzip"
+        )
+        .next(When(choice).then(double).otherwise(triple))
+        .next(Foreach(get_items, merge_group_size=2).then(add_item))
+    )
+    emulator = Emulator(testflow.to_argo())
+    assert emulator.run() == testflow.run()
+    outputs = [n.outputs.get("outputs", "") for n in emulator.nodes]
+    assert any(o.startswith('"pargo:gzip:') for o in outputs)
+
+
+def test_emulator_tree_merge():
+    """Test that a tree merge gives the same result as a flat merge."""
+    testflow = Workflow.new("testflow", parameters={"x": 3}).next(
+        Foreach(get_items, merge_group_size=2).then(add_item)
+    )
+    assert Emulator(testflow.to_argo(), workers=4).run() == testflow.run()
+
+
+def test_emulator_sequence():
+    """Test that withSequence counted by a parameter matches a local run."""
+    testflow = Workflow.new("testflow", parameters={"x": 0, "n": 3}).next(
+        Foreach.sequence(count="n", start=1, step=2).then(add_item)
+    )
+    assert Emulator(testflow.to_argo()).run() == testflow.run()
+
+
+def test_emulator_inline_workflows():
+    """Test that inline workflows run through template references like locally."""
+    child1 = Workflow.new("child1", parameters={"x": 0}).next(double)
+    child2 = Workflow.new("child2", parameters={"x": 0}).next(
+        When(choice).then(double).otherwise(triple)
+    )
+    testflow = (
+        Workflow.new("testflow", parameters={"x": 3, "y": 1})
+        .next(double)
+        .next([child1, child2], inline=True)
+        .next(triple)
+    )
+    emulator = Emulator(
+        testflow.to_argo(),
+        workflow_templates={w.name: w.to_argo() for w in (child1, child2)},
+    )
+    assert emulator.run() == testflow.run() == {"x": 72, "y": 1}
+    names = [n.name.split(".")[-1] for n in emulator.nodes]
+    assert "step-1-workflow-child2" in names
+    assert "step-0-when-then-double" in names
+
+
+def test_emulator_item_timeout(tmp_path):
+    """Test that item pods past their deadline are stopped and retried."""
+    testflow = Workflow.new(
+        "testflow", parameters={"marker": str(tmp_path / "attempted")}, retry=0
+    ).next(Foreach([0, 1], idempotent=True, item_timeout=3).then(straggle))
+    assert Emulator(testflow.to_argo()).run()["y"] == [0, 1]
@@ -0,0 +1,52 @@
+from pargo import Foreach, When, Workflow
+from pargo.estimate import MAX_FANOUT, estimate
+from pargo.utils import add_item, choice, double, get_items
+
+
+def test_estimate_static():
+    """Test that pods and concurrency are estimated without executing tasks."""
+    testflow = (
+        Workflow.new("testflow", parameters={"x": 1}, parallelism=2)
+        .next(double)
+        .next(When(choice).then(double))
+        .next(Foreach(list(range(10))).then(add_item))
+    )
+    result = estimate(testflow)
+
+    assert [n.pods for n in result.nodes] == [1, 2, 11]
+    assert result.pods == 14
+    assert result.max_concurrent == 2
+    assert result.nodes[2].output_bytes == 10 * len('{"x": 1}')
+    assert result.seconds is None
+    assert not result.warnings
+
+
+def test_estimate_unknown_producer():
+    """Test that Foreach producers are only executed on request."""
+    testflow = Workflow.new("testflow", parameters={"x": 1}).next(
+        Foreach(get_items).then(add_item)
+    )
+    result = estimate(testflow)
+    assert result.pods is None
+    assert "unknown" in result.warnings[0]
+
+    result = estimate(testflow, execute=True, sample=2)
+    assert result.nodes[0].items == 3
+    assert result.pods == 5
+    assert result.seconds is not None
+
+
+def test_estimate_fanout_warning():
+    """Test that large fan-outs are flagged, and sharding reduces them."""
+    items = list(range(MAX_FANOUT + 1))
+    testflow = Workflow.new("testflow", parameters={"x": 1}).next(
+        Foreach(items).then(add_item)
+    )
+    assert any("fan-out" in w for w in estimate(testflow).warnings)
+
+    testflow = Workflow.new("testflow", parameters={"x": 1}).next(
+        Foreach(items, shard_size=100).then(add_item)
+    )
+    result = estimate(testflow)
+    assert not any("fan-out" in w for w in result.warnings)
+    assert result.pods == 51 + 1
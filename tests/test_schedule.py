@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from pargo import Workflow
+from pargo.schedule import Cron
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_cron_ticks():
+    """Test that ticks follow cron fields, names, steps and macros."""
+    start, end = utc(2024, 1, 1), utc(2024, 1, 8)
+    weekdays = list(Cron.parse("30 6 * * mon-fri").ticks(start, end))
+    assert weekdays[0] == utc(2024, 1, 1, 6, 30)
+    assert len(weekdays) == 5
+    assert len(list(Cron.parse("*/15 0-1 * * *").ticks(start, end))) == 8 * 7
+    assert list(Cron.parse("@weekly").ticks(start, end)) == [utc(2024, 1, 7)]
+    assert list(Cron.parse("0 0 1 jan,feb 7").ticks(start, utc(2024, 3, 1))) == [
+        utc(2024, 1, 1),
+        utc(2024, 1, 7),
+        utc(2024, 1, 14),
+        utc(2024, 1, 21),
+        utc(2024, 1, 28),
+        utc(2024, 2, 1),
+        utc(2024, 2, 4),
+        utc(2024, 2, 11),
+        utc(2024, 2, 18),
+        utc(2024, 2, 25),
+    ]
+    with pytest.raises(ValueError, match="Invalid cron field"):
+        Cron.parse("0 0 0 * *")
+    with pytest.raises(ValueError, match="expected 5 fields"):
+        Cron.parse("@every 1h")
+
+
+def test_workflow_ticks(tmp_path):
+    """Test that the ticks of all schedules are merged with scheduled parameters."""
+    testflow = Workflow.new(
+        "testflow",
+        parameters={"x": 1, "time": ""},
+        schedules=["0 0 * * *", "0 0,12 * * *"],
+        schedules_parameters={"x": 2},
+        scheduled_time_parameter="time",
+    )
+    ticks = testflow.ticks(utc(2024, 1, 1), utc(2024, 1, 2))
+    assert ticks == [utc(2024, 1, 1), utc(2024, 1, 1, 12)]
+    assert testflow.scheduled_parameters(ticks[1]) == {
+        "x": 2,
+        "time": "2024-01-01T12:00:00+00:00",
+    }
+    testflow.to_yaml_cron(tmp_path)
+    assert (
+        "'\"{{workflow.scheduledTime}}\"'"
+        in (tmp_path / "testflow-cron.yaml").read_text()
+    )
+
+    with pytest.raises(ValueError, match="must be one of the parameters"):
+        Workflow.new("testflow", scheduled_time_parameter="time")
@@ -0,0 +1,50 @@
+from yaml import safe_load
+
+from pargo import Workflow
+from pargo.sensor import WORKFLOW_LABEL
+from pargo.utils import double
+
+
+def test_workflow_labels():
+    """Test that workflows and the workflows they spawn are labeled with the name."""
+    testflow = Workflow.new("testflow", parameters={"x": 1}).next(double)
+    argo_testflow = testflow.to_argo()
+    assert argo_testflow.metadata.labels == {WORKFLOW_LABEL: "testflow"}
+    assert argo_testflow.spec.workflowMetadata["labels"] == {WORKFLOW_LABEL: "testflow"}
+
+
+def test_sensor_group(tmp_path):
+    """Test that workflows in a sensor group share one label-matching sensor."""
+    upstream1 = Workflow.new("upstream1").next(double)
+    upstream2 = Workflow.new("upstream2").next(double)
+    downstream1 = Workflow.new(
+        "downstream1", trigger_on=upstream1, sensor_group="etl"
+    ).next(double)
+    downstream2 = Workflow.new(
+        "downstream2", trigger_on=upstream1 & upstream2, sensor_group="etl"
+    ).next(double)
+    workflows = [upstream1, upstream2, downstream1, downstream2]
+
+    for workflow in workflows:
+        workflow.to_yaml(path=tmp_path)
+    Workflow.to_yaml_sensor_groups(workflows, path=tmp_path)
+
+    assert not (tmp_path / "downstream1-sensor.yaml").exists()
+    sensor = safe_load((tmp_path / "etl-sensors.yaml").read_text())
+    dependencies = sensor["spec"]["dependencies"]
+    assert [d["name"] for d in dependencies] == ["upstream1", "upstream2"]
+    name_filter = dependencies[0]["filters"]["data"][0]
+    assert name_filter["path"] == f"body.metadata.labels.{WORKFLOW_LABEL}"
+    assert name_filter["value"] == ["^upstream1$"]
+
+    triggers = sensor["spec"]["triggers"]
+    assert [t["template"]["name"] for t in triggers] == ["downstream10", "downstream20"]
+    assert triggers[1]["template"]["conditions"] == "upstream1 && upstream2"
+
+
+def test_sensor_name_prefix(tmp_path):
+    """Test that single sensors match upstream workflows by name prefix."""
+    upstream = Workflow.new("upstream").next(double)
+    downstream = Workflow.new("downstream", trigger_on=upstream).next(double)
+    name_filter = downstream.sensor().argo_dependencies()[0].filters.data[0]
+    assert name_filter.path == "body.metadata.name"
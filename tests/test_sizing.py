@@ -0,0 +1,129 @@
+from json import loads
+from threading import Thread
+from time import perf_counter, sleep
+
+from pargo import Foreach, Resources, When, Workflow
+from pargo.emulator import Emulator
+from pargo.nodes.run import RunContext, measure
+from pargo.sizing import load_argo_metrics, percentile, recommend
+from pargo.utils import add_item, choice, double, get_items
+
+
+def test_run_writes_metrics():
+    """Test that local runs record metrics named like the Argo templates."""
+    testflow = (
+        Workflow.new("testflow", parameters={"x": 3})
+        .next(double)
+        .next(When(choice).then(double))
+        .next(Foreach(get_items).then(add_item))
+    )
+    testflow.run(run_id="test")
+
+    metrics = loads((testflow.run_path("test") / "metrics.json").read_text())
+    names = [m["name"] for m in metrics]
+    assert names[:3] == [
+        "step-0-double",
+        "step-1-when-choice",
+        "step-1-when-then-double",
+    ]
+    assert names.count("step-2-foreach-add-item") == 3
+    assert "step-2-foreach-get-items" in names
+    assert "step-2-foreach-merge" in names
+
+    template_names = {t.name for t in testflow.to_argo().spec.templates}
+    assert set(names) <= template_names
+    for m in metrics:
+        assert m["duration"] >= 0 and m["cpu_seconds"] >= 0
+
+
+def test_measure_isolates_steps():
+    """Test that local metrics are not charged with earlier peaks or other threads."""
+    context = RunContext.new("testflow", "test")
+    with measure(context, "big"):
+        data = bytearray(256 * 2**20)
+        del data
+
+    def burn():
+        end = perf_counter() + 0.3
+        while perf_counter() < end:
+            pass
+
+    thread = Thread(target=burn)
+    with measure(context, "small"):
+        thread.start()
+        sleep(0.3)
+        thread.join()
+
+    big, small = context.metrics
+    assert big["peak_rss"] >= 256 * 2**20
+    assert small["cpu_seconds"] < 0.15
+    assert small["peak_rss"] is None
+
+
+def test_recommend():
+    """Test that recommendations use percentiles with headroom."""
+    metrics = {
+        "step-0-double": [
+            {"duration": 2.0, "cpu_seconds": 1.0, "peak_rss": 100 * 2**20},
+            {"duration": 1.0, "cpu_seconds": 1.0, "peak_rss": 200 * 2**20},
+        ]
+    }
+    resources = recommend(metrics, headroom=1.5)["step-0-double"]
+    assert resources.requests == {"cpu": "1500m", "memory": "300Mi"}
+    assert resources.limits == {"memory": "600Mi"}
+    assert percentile([3, 1, 2], 50) == 2
+
+
+def test_apply_sizing():
+    """Test that recommendations overwrite template resources on generation."""
+    testflow = (
+        Workflow.new(
+            "testflow",
+            parameters={"x": 3},
+            resources=Resources(requests={"cpu": "2"}, limits={"cpu": "4"}),
+        )
+        .next(double)
+        .next(double)
+    )
+    testflow.run()
+    sizing = testflow.recommend_resources()
+    assert set(sizing) == {"step-0-double", "step-1-double"}
+
+    resources = testflow.to_argo(sizing=sizing).spec.templates[1].script.resources
+    assert resources.requests == sizing["step-0-double"].requests
+    assert resources.limits["cpu"] == "4"
+
+
+def test_argo_metrics():
+    """Test that pod metrics are named like their templates and used for sizing."""
+    testflow = (
+        Workflow.new("testflow", parameters={"x": 3})
+        .next(double)
+        .next(Foreach(get_items).then(add_item))
+    )
+    emulator = Emulator(testflow.to_argo())
+    emulator.run()
+    run = {
+        "metadata": {"labels": {"pargo/workflow": "testflow"}},
+        "status": {
+            "nodes": {
+                node.name: {
+                    "templateName": node.template,
+                    "outputs": {
+                        "parameters": [
+                            {"name": k, "value": v} for k, v in node.outputs.items()
+                        ]
+                    },
+                }
+                for node in emulator.nodes
+            }
+        },
+    }
+    metrics = load_argo_metrics(run)
+    assert len(metrics["step-1-foreach-add-item"]) == 3
+    assert set(metrics) <= {t.name for t in testflow.to_argo().spec.templates}
+
+    sizing = testflow.recommend_resources(argo_runs=[run])
+    assert "step-0-double" in sizing
+    other = {**run, "metadata": {"labels": {"pargo/workflow": "other"}}}
+    assert testflow.recommend_resources(argo_runs=[other]) == {}
@@ -0,0 +1,123 @@
+from json import loads
+
+import pytest
+
+from pargo import Foreach, Workflow
+from pargo.nodes.step import StepNode
+from pargo.tracing import (
+    TRACE_FILE,
+    TRACEPARENT,
+    get_exporter,
+    parse_traceparent,
+    set_exporter,
+    span,
+)
+from pargo.utils import add_item, double, get_items
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+        self.exports = 0
+
+    def export(self, spans):
+        self.spans.extend(spans)
+        self.exports += 1
+
+
+@pytest.fixture
+def exporter():
+    exporter = ListExporter()
+    set_exporter(exporter)
+    yield exporter
+    set_exporter(None)
+
+
+def test_span_nesting(exporter):
+    """Test that nested spans share the trace and link to their parent."""
+    with span("outer") as outer, span("inner") as inner:
+        pass
+
+    assert [s.name for s in exporter.spans] == ["inner", "outer"]
+    assert inner.trace_id == outer.trace_id
+    assert inner.parent_id == outer.span_id
+    assert outer.parent_id is None
+    assert outer.end >= inner.end
+
+
+def test_span_buffering(exporter):
+    """Test that spans are exported in one batch when the root span exits."""
+    with span("outer"):
+        for i in range(3):
+            with span("inner", i=i):
+                pass
+        assert exporter.spans == []
+
+    assert exporter.exports == 1
+    assert [s.name for s in exporter.spans] == ["inner"] * 3 + ["outer"]
+
+
+def test_default_exporter_cached(monkeypatch, tmp_path):
+    """Test that the default exporter is reused until its configuration changes."""
+    monkeypatch.setenv(TRACE_FILE, str(tmp_path / "a.jsonl"))
+    assert get_exporter() is get_exporter()
+    first = get_exporter()
+    monkeypatch.setenv(TRACE_FILE, str(tmp_path / "b.jsonl"))
+    assert get_exporter() is not first
+    assert get_exporter().path == tmp_path / "b.jsonl"
+
+
+def test_span_traceparent(exporter, monkeypatch):
+    """Test that spans continue the trace in TRACEPARENT, as set in pods."""
+    monkeypatch.setenv(TRACEPARENT, f"00-{'a' * 32}-{'b' * 16}-01")
+    with span("remote") as s:
+        pass
+    assert (s.trace_id, s.parent_id) == ("a" * 32, "b" * 16)
+
+
+def test_span_error(exporter):
+    """Test that failing spans are exported with an error status."""
+    with pytest.raises(ValueError), span("failing"):
+        raise ValueError("boom")
+    assert exporter.spans[0].to_otlp()["status"] == {
+        "code": 2,
+        "message": "ValueError: boom",
+    }
+
+
+def test_workflow_run_traces(tmp_path):
+    """Test that local runs write workflow, node, item and task spans as OTLP-JSON."""
+    testflow = (
+        Workflow.new("testflow", parameters={"x": 3})
+        .next(double)
+        .next(Foreach(get_items).then(add_item))
+    )
+    testflow.run(run_id="test")
+
+    lines = (tmp_path / ".pargo" / "traces.jsonl").read_text().splitlines()
+    spans = [
+        s
+        for line in lines
+        for s in loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    ]
+    names = [s["name"] for s in spans]
+    assert names.count("workflow") == 1
+    assert names.count("node") == 2
+    assert names.count("item") == 3
+    assert "task" in names and "state.write" in names and "serialize" in names
+    assert len({s["traceId"] for s in spans}) == 1
+
+
+def test_worker_template_traceparent():
+    """Test that pods get a traceparent derived from the workflow uid."""
+    template = StepNode(task=double).get_templates(
+        step_counter=0,
+        default_image="image",
+        image_pull_policy="Always",
+        default_secrets=None,
+        default_parameters={},
+        default_retry=None,
+    )[0]
+    env = {e.name: e.value for e in template.script.env}
+    assert "workflow.uid" in env[TRACEPARENT]
+    assert parse_traceparent(f"00-{'a' * 32}-{'b' * 16}-01") == ("a" * 32, "b" * 16)
@@ -0,0 +1,59 @@
+import pytest
+
+from pargo import Condition, Workflow
+from pargo.trigger_graph import TriggerGraph
+from pargo.utils import double
+
+
+def increment(x: int):
+    return {"x": x + 1}
+
+
+def test_trigger_graph_run():
+    """Test that downstream workflows run once per fired trigger with its parameters."""
+    upstream1 = Workflow.new("upstream1", parameters={"x": 1}).next(double)
+    upstream2 = Workflow.new("upstream2", parameters={"x": 1}).next(double)
+    joined = Workflow.new(
+        "joined", parameters={"x": 1}, trigger_on=upstream1 & upstream2
+    ).next(double)
+    either = Workflow.new(
+        "either",
+        parameters={"x": 1},
+        trigger_on=upstream1 | joined,
+        trigger_on_parameters=[{"x": 2}, {"x": "a"}],
+    ).next(increment)
+    after_failure = Workflow.new(
+        "after-failure", parameters={"x": 1}, trigger_on=either
+    ).next(double)
+    unrelated = Workflow.new("unrelated").next(double)
+
+    graph = TriggerGraph.of(
+        [upstream1, upstream2, joined, either, after_failure, unrelated]
+    )
+    assert graph.roots() == ["upstream1", "upstream2"]
+    assert graph.downstream("upstream1") == ["either", "joined"]
+
+    report = graph.run(workers=2)
+    runs = [(e["workflow"], e.get("parameters"), e["status"]) for e in report]
+    assert sorted(runs, key=str) == sorted(
+        [
+            ("upstream1", None, "Succeeded"),
+            ("upstream2", None, "Succeeded"),
+            ("joined", None, "Succeeded"),
+            ("either", {"x": 2}, "Succeeded"),
+            ("either", {"x": "a"}, "Failed"),
+            ("after-failure", None, "Succeeded"),
+        ],
+        key=str,
+    )
+    assert "TypeError" in next(e["error"] for e in report if e["status"] == "Failed")
+
+
+def test_trigger_graph_cycle():
+    """Test that cycles of triggers are rejected."""
+    first = Workflow.new("first")
+    second = Workflow.new("second", trigger_on=first)
+    third = Workflow.new("third", trigger_on=second)
+    first.trigger_on = Condition.of(third)
+    with pytest.raises(ValueError, match="Trigger cycle"):
+        TriggerGraph.of([first, second, third])
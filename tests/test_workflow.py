@@ -1,6 +1,7 @@
 import inspect
 import pathlib
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from json import dumps, loads
 from os import environ
 from pathlib import Path
@@ -8,9 +9,12 @@ from shutil import which
 
 import pytest
 from pydantic_core._pydantic_core import ValidationError
+from yaml import safe_load
 
 import tests.utils as test_utils
-from pargo import Foreach, When, Workflow
+from pargo import Condition, Foreach, Resources, When, Workflow
+from pargo.dataflow import DataflowError
+from pargo.emulator import Emulator
 from pargo.nodes.import_path import import_path
 from pargo.utils import add_item, choice, double, get_items, triple, void
 
@@ -29,18 +33,42 @@ def lint_yaml(tmp_path):
 def test_workflow_run(tmp_path):
     """Test that Workflow.run runs without error and produce expected output."""
     testflow = Workflow.new("testflow", parameters={"x": 2}).next(double).next(triple)
-    testflow.run()
+    testflow.run(run_id="test")
 
-    data_path = tmp_path / ".pargo" / "testflow" / "data.json"
+    data_path = tmp_path / ".pargo" / "testflow" / "test" / "data.json"
     data = loads(data_path.read_text())
     assert data["x"] == 12
+    status_path = tmp_path / ".pargo" / "testflow" / "test" / "status.json"
+    assert loads(status_path.read_text()) == "Succeeded"
+
+
+def test_workflow_run_returns_data():
+    """Test that Workflow.run returns the final data and isolates runs."""
+    testflow = Workflow.new("testflow", parameters={"x": 2}).next(double)
+    assert testflow.run()["x"] == 4
+    assert testflow.run({"x": 3})["x"] == 6
+
+    run_paths = list((Path(environ["PARGO_DIR"]) / "testflow").iterdir())
+    assert len(run_paths) == 2
+
+
+def test_workflow_run_concurrent():
+    """Test that concurrent runs of the same workflow do not clobber each other."""
+    testflow = Workflow.new("testflow", parameters={"x": 1}).next(double).next(triple)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = {x: pool.submit(testflow.run, {"x": x}, f"run-{x}") for x in range(8)}
+    for x, future in futures.items():
+        assert future.result()["x"] == 6 * x
+        data = loads((testflow.run_path(f"run-{x}") / "data.json").read_text())
+        assert data["x"] == 6 * x
 
 
 def test_workflow_missing_parameter():
     """Test that Workflow.run fails for missing parameter."""
     testflow = Workflow.new("testflow").next(double).next(triple)
     with pytest.raises(TypeError):
-        testflow.run()
+        testflow.run(run_id="test")
+    assert loads((testflow.run_path("test") / "status.json").read_text()) == "Failed"
 
 
 def test_workflow_yaml(tmp_path):
@@ -131,12 +159,30 @@ def test_workflow_duplicate_templates():
     assert argo_testflow.spec.templates[2].name == "step-1-double"
     assert argo_testflow.spec.templates[3].name == "step-2-double"
 
-    testflow.run()
-    data_path = Path(environ["PARGO_DIR"]) / "testflow" / "data.json"
+    testflow.run(run_id="test")
+    data_path = Path(environ["PARGO_DIR"]) / "testflow" / "test" / "data.json"
     result = loads(data_path.read_text())
     assert result["x"] == 8
 
 
+def test_workflow_fuse():
+    """Test that fused steps give fewer templates and the same result."""
+    testflow = (
+        Workflow.new("testflow", parameters={"x": 1}, fuse=True)
+        .next(double)
+        .next(triple)
+        .next(When(choice).then(double))
+        .next(double)
+    )
+    argo_testflow = testflow.to_argo()
+    assert [t.name for t in argo_testflow.spec.templates[:2]] == [
+        "main",
+        "step-0-double-triple",
+    ]
+    assert len(argo_testflow.spec.templates[0].steps) == 3
+    assert testflow.run()["x"] == 24
+
+
 def test_workflow_schedule(tmp_path):
     """Test that Workflow.to_yaml produces an additional cron-yaml"""
     testflow = Workflow.new("testflow", schedules=["0 0 0 * *"]).next(double)
@@ -205,19 +251,34 @@ def test_workflow_trigger_on_multiple(tmp_path):
         lint_yaml(tmp_path)
 
 
-def test_workflow_trigger_on_multiple_error():
-    """Test that Workflow.to_yaml fails for incorrect triggering syntax."""
+def test_workflow_trigger_on_nested():
+    """Test that nested conditions are normalized to a minimal set of OR-terms."""
     testflow1 = Workflow.new("testflow1").next(double)
     testflow2 = Workflow.new("testflow2").next(double)
-    with pytest.raises(ValueError):
-        Workflow.new(
-            "triggeredflow", trigger_on=testflow1 & (testflow1 | testflow2)
-        ).next(double)
+    testflow3 = Workflow.new("testflow3").next(double)
 
-    with pytest.raises(ValueError):
-        Workflow.new(
-            "triggeredflow", trigger_on=(testflow1 | testflow2) & testflow2
-        ).next(double)
+    condition = testflow1 & (testflow1 | testflow2)
+    assert condition.items == ["testflow1"]
+
+    condition = (testflow1 | testflow2) & testflow2
+    assert condition.items == ["testflow2"]
+
+    condition = (testflow1 | testflow2) & testflow3
+    assert condition.items == ["testflow1 && testflow3", "testflow2 && testflow3"]
+    assert condition.names == ["testflow1", "testflow2", "testflow3"]
+
+    condition = (testflow1 & testflow2) | (testflow2 & testflow1) | testflow1
+    assert condition.items == ["testflow1"]
+
+    triggeredflow = Workflow.new(
+        "triggeredflow", trigger_on=(testflow1 | testflow2) & testflow3
+    ).next(double)
+    triggers = triggeredflow.sensor().argo_triggers()
+    assert len(triggers) == 1
+    assert triggers[0].template.conditions == (
+        "(testflow1 && testflow3) || (testflow2 && testflow3)"
+    )
+    assert len(triggeredflow.sensor().argo_dependencies()) == 3
 
 
 def test_workflow_trigger_on_params(tmp_path):
@@ -236,6 +297,7 @@ def test_workflow_trigger_on_params(tmp_path):
     data = yaml_path.read_text()
     assert "Sensor" in data
     assert "parameters" in data
+    assert len(triggeredflow.sensor().argo_triggers()) == 2
     if which("argo"):
         lint_yaml(tmp_path)
 
@@ -261,6 +323,26 @@ def test_workflow_trigger_on_params_error():
         )
 
 
+def test_condition_items():
+    """Test that conditions given as OR-terms are parsed, and invalid ones rejected."""
+    condition = Condition(items=["testflow1 && testflow2", "testflow3"])
+    assert condition.terms == [["testflow1", "testflow2"], ["testflow3"]]
+    assert condition.names == ["testflow1", "testflow2", "testflow3"]
+
+    with pytest.raises(ValidationError):
+        Condition(item=["testflow1"])
+    with pytest.raises(ValidationError, match="requires a workflow name"):
+        Condition()
+
+    # Absorbed terms leave a single OR-term to pair parameters with
+    with pytest.raises(ValidationError, match="\\[\\['testflow1'\\]\\]"):
+        Workflow.new(
+            "triggeredflow",
+            trigger_on=Condition(items=["testflow1", "testflow1 && testflow2"]),
+            trigger_on_parameters=[{"x": 1}, {"x": 2}],
+        )
+
+
 def test_workflow_complex(tmp_path):
     """Test run and to_yaml for a complex workflow."""
     testflow = (
@@ -282,8 +364,8 @@ def test_workflow_complex(tmp_path):
         .next(Foreach([1, 5, 3], item_name="item").then(add_item))
     )
 
-    testflow.run()
-    data_path = Path(environ["PARGO_DIR"]) / "testflow" / "data.json"
+    testflow.run(run_id="test")
+    data_path = Path(environ["PARGO_DIR"]) / "testflow" / "test" / "data.json"
     result = loads(data_path.read_text())
     assert result["x"] == 12
     assert sorted(result["y"]) == [13, 15, 17]
@@ -306,15 +388,15 @@ def test_workflow_group_run(tmp_path):
         .next([testflow1, testflow2])
         .next([testflow2])
     )
-    groupflow.run()
+    groupflow.run(run_id="test")
 
-    data_path = tmp_path / ".pargo" / "testflow1" / "data.json"
+    data_path = tmp_path / ".pargo" / "testflow1" / "test" / "data.json"
     data = loads(data_path.read_text())
     assert data["x"] == 1
-    data_path = tmp_path / ".pargo" / "testflow2" / "data.json"
+    data_path = tmp_path / ".pargo" / "testflow2" / "test" / "data.json"
     data = loads(data_path.read_text())
     assert data["x"] == 2
-    data_path = tmp_path / ".pargo" / "groupflow" / "data.json"
+    data_path = tmp_path / ".pargo" / "groupflow" / "test" / "data.json"
     data = loads(data_path.read_text())
     assert data["x"] == 3
 
@@ -347,9 +429,9 @@ def test_workflow_group_run_mixed(tmp_path):
         .next([testflow1, testflow2])
         .next(double)
     )
-    groupflow.run()
+    groupflow.run(run_id="test")
 
-    data_path = tmp_path / ".pargo" / "groupflow" / "data.json"
+    data_path = tmp_path / ".pargo" / "groupflow" / "test" / "data.json"
     data = loads(data_path.read_text())
     assert data["x"] == 4
 
@@ -387,3 +469,122 @@ def test_nested_wrapped():
     # import_path will be this file's path
     path = import_path(bar)
     assert path == "tests.test_workflow"
+
+
+def test_workflow_resources():
+    """Test that workflow resources are defaults that nodes overwrite per key."""
+    testflow = (
+        Workflow.new(
+            "testflow",
+            parameters={"x": 1},
+            resources=Resources(
+                requests={"cpu": "1", "memory": "1Gi"}, limits={"memory": "2Gi"}
+            ),
+        )
+        .next(double)
+        .next(double, resources=Resources(requests={"memory": "4Gi"}))
+        .next(
+            Foreach(get_items, resources=Resources(requests={"cpu": "100m"})).then(
+                add_item, resources=Resources(limits={"ephemeral-storage": "1Gi"})
+            )
+        )
+    )
+    templates = {t.name: t for t in testflow.to_argo().spec.templates}
+
+    resources = templates["step-0-double"].script.resources
+    assert resources.requests == {"cpu": "1", "memory": "1Gi"}
+    assert resources.limits == {"memory": "2Gi"}
+
+    resources = templates["step-1-double"].script.resources
+    assert resources.requests == {"cpu": "1", "memory": "4Gi"}
+
+    resources = templates["step-2-foreach-get-items"].script.resources
+    assert resources.requests == {"cpu": "100m", "memory": "1Gi"}
+
+    resources = templates["step-2-foreach-add-item"].script.resources
+    assert resources.limits == {"memory": "2Gi", "ephemeral-storage": "1Gi"}
+
+
+def test_workflow_no_resources():
+    """Test that resources are not rendered by default."""
+    testflow = Workflow.new("testflow", parameters={"x": 1}).next(double)
+    script = testflow.to_argo().spec.templates[1].script
+    assert "resources" not in script.model_dump(exclude_none=True)
+
+
+def test_workflow_yaml_config_maps(tmp_path):
+    """Test that offloaded Foreach lists are written as ConfigMaps next to the workflow."""
+    testflow = Workflow.new("testflow", parameters={"x": 1}).next(
+        Foreach(list(range(5)), offload_size=10).then(add_item)
+    )
+    testflow.to_yaml(tmp_path)
+
+    config_map = safe_load((tmp_path / "testflow-configmaps.yaml").read_text())
+    assert config_map["kind"] == "ConfigMap"
+    assert "pargo-items-" in (tmp_path / "testflow.yaml").read_text()
+    assert Emulator(testflow.to_argo(), config_maps=testflow.config_maps()).run()[
+        "y"
+    ] == [i + 1 for i in range(5)]
+
+
+def test_workflow_compression():
+    """Test that compression is passed to pods and disables input projection."""
+    testflow = (
+        Workflow.new("testflow", parameters={"x": 1}, compression="gzip")
+        .next(double)
+        .next(Foreach([1, 2]).then(add_item))
+    )
+    templates = testflow.to_argo().spec.templates
+    env = {e.name: e.value for e in templates[1].script.env}
+    assert env["PARGO_COMPRESSION"] == "gzip"
+    then = templates[2].dag["tasks"][0]
+    assert then.arguments["parameters"][0].value == "{{inputs.parameters.inputs}}"
+
+    with pytest.raises(ValueError, match="compression"):
+        Workflow.new(
+            "testflow", parameters={"x": 1}, compression="gzip", auto_parallel=True
+        ).next(make_a).next(make_b).to_argo()
+
+    with pytest.raises(ValueError, match="compression"):
+        Workflow.new("testflow", parameters={"n": 2}, compression="gzip").next(
+            Foreach.sequence(count="n").then(add_item)
+        ).to_argo()
+
+
+def make_a(x: int):
+    return {"a": x}
+
+
+def make_b(x: int):
+    return {"b": x}
+
+
+def test_workflow_inline_templates():
+    """Test that inline workflows reference the main templates of their WorkflowTemplates."""
+    child1 = Workflow.new("child1", parameters={"x": 0}).next(double)
+    child2 = Workflow.new("child2", parameters={"x": 0}).next(triple)
+    groupflow = (
+        Workflow.new("groupflow", parameters={"x": 1})
+        .next([child1, child2], inline=True)
+        .next(double)
+    )
+    templates = groupflow.to_argo().spec.templates
+    assert [t.name for t in templates] == ["main", "step-0-workflow", "step-1-double"]
+    steps = templates[1].steps
+    assert [s[0].templateRef.model_dump() for s in steps] == [
+        {"name": "child1", "template": "main"},
+        {"name": "child2", "template": "main"},
+    ]
+    assert steps[1][0].arguments["parameters"][0].value == (
+        "{{steps.step-0-workflow-child1.outputs.parameters.outputs}}"
+    )
+    main = child1.to_argo().spec.templates[0]
+    assert main.inputs["parameters"][0].default == '{"x": {{workflow.parameters.x}}}'
+    assert "step-0-double" in main.outputs["parameters"][0].valueFrom["expression"]
+
+    assert groupflow.run() == {"x": 12}
+
+    with pytest.raises(DataflowError, match="workflow `child3` requires \\['y'\\]"):
+        Workflow.new("groupflow", parameters={"x": 1}, strict_dataflow=True).next(
+            Workflow.new("child3", parameters={"y": 0}), inline=True
+        ).to_argo()